@@ -1,37 +1,167 @@
 import os
 import json
-from openai import OpenAI
-from typing import Dict, List, Optional
+import hashlib
+from typing import Dict, Iterator, List, Optional
+
+from .cache_decisoes import DecisionCache, normalizar_consulta
+from .cliente_llm import ETAPA_DECISAO, ETAPA_FORMATACAO, HedgedClient, criar_cliente_openai
+from .coalescencia import SingleFlight
+from .formatador import MODO_AUTO, MODO_LLM, MODO_TEMPLATE, TemplateFormatter
+from .metricas import MetricsRegistry, TurnTrace
+from .payload_formatacao import FORMATO_COMPACTO, ORCAMENTO_PADRAO, serializar_resultado
+from .selecao_tags import TagRetriever
+from .sessao import LIMITE_CANDIDATOS, LIMITE_RESULTADOS, SessionState, SessionStore, combinar_filtros
+from .parser_intencao import MAPEAMENTO_TAGS, TagsCatalogo, interpretar_mensagem, interpretar_refinamento
+from .tools.procura_catalogo import (repositorio, items_at, search_positions, get_cheapest_item, get_most_expensive_item, get_price_range,
+                                     get_cheapest_item_by_tags, get_most_expensive_item_by_tags, get_price_range_by_tags,
+                                     search_process_stats)
+
+# Ações respondidas pelos agregados por tag, com a ação equivalente sem tags
+ACOES_POR_TAGS = {
+    "get_cheapest_item_by_tags": "get_cheapest_item",
+    "get_most_expensive_item_by_tags": "get_most_expensive_item",
+    "get_price_range_by_tags": "get_price_range",
+}
+
+# Prefixo fixo do system prompt da decisão. Fica sempre igual e no início, para
+# aproveitar o cache de prefixo do provedor; as tags vêm depois dele.
+PROMPT_DECISAO = """
+Assistente de recomendação de refeições. Responda EXATAMENTE no formato JSON.
+
+AÇÕES:
+- "mais barato" → "get_cheapest_item"
+- "mais caro" → "get_most_expensive_item"  
+- "faixa de preço" → "get_price_range"
+- "mais barato/mais caro/faixa de preço" só com tags ("prato vegano mais barato") →
+  "get_cheapest_item_by_tags" / "get_most_expensive_item_by_tags" / "get_price_range_by_tags",
+  com as tags em incluir_tags
+- Qualquer busca → "search_catalog"
+
+MAPEAMENTO TAGS:
+- "sem lactose" → ["sem lactose"]
+- "vegano" → ["vegano"]
+- "picante/apimentado" → ["picante"]
+- "sem gluten" → ["sem gluten"]
+- "sem açúcar" → ["sem açucar"]
+
+INGREDIENTES:
+- "proteína" → ["frango", "carne", "peixe", "ovo", "tofu", "camarão"]
+- "arroz" → ["arroz"]
+- "legumes" → ["legumes", "brócolis", "cenoura"]
+
+FORMATO:
+{
+  "action_taken": "search_catalog",
+  "search_params": {
+    "budget": null,
+    "incluir_tags": [],
+    "excluir_tags": [],
+    "ingredientes_obrigatorios": []
+  },
+  "reasoning": "explicação breve",
+  "user_intent": "intenção do usuário"
+}
+
+IMPORTANTE: SEMPRE inclua search_params com TODOS os campos, mesmo vazios.
+Use em incluir_tags e excluir_tags somente as tags listadas abaixo.
+"""
+
+class ErroRespostaEstruturada(Exception):
+    """A resposta estruturada da primeira chamada ao LLM não pôde ser interpretada."""
 
-from .tools.procura_catalogo import search_catalog, get_cheapest_item, get_most_expensive_item, get_price_range
-from .tools.extrai_filtro import extrai_tags
 
 class MealRecommendationAgent:
     """
     Agente de recomendação de refeições usando GPT-4o com Responses API
     """
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, cache_decisoes: DecisionCache = None, limiar_parser_local: float = None,
+                 modo_formatacao: str = None, formatador: TemplateFormatter = None, client=None,
+                 metricas: MetricsRegistry = None, formato_payload: str = None, orcamento_payload: int = None,
+                 limite_tags_prompt: int = None, tags_por_consulta: int = None, sessoes: SessionStore = None,
+                 coalescencia: SingleFlight = None, llm: HedgedClient = None):
         """
         Inicializa o agente com a API da OpenAI
         
         Args:
             api_key (str): Chave da API da OpenAI. Se não fornecida, busca na variável de ambiente.
+            cache_decisoes (DecisionCache): Cache das decisões da primeira chamada. Se não
+                fornecido, usa um cache em memória (e SQLite se CACHE_DECISOES_SQLITE estiver definido).
+            limiar_parser_local (float): Confiança mínima para usar a decisão do parser local
+                no lugar da primeira chamada ao LLM. Padrão: PARSER_LOCAL_LIMIAR ou 0.8; use
+                um valor acima de 1 para desativar.
+            modo_formatacao (str): "llm" (sempre formata com o LLM), "template" (sempre com
+                templates locais) ou "auto" (templates quando a decisão veio do parser local).
+                Padrão: FORMATACAO_MODO ou "auto".
+            formatador (TemplateFormatter): Formatador local com templates personalizados
+            client: Backend do LLM com a interface `chat.completions.create` (ex.: StubLLMClient).
+                Se não fornecido, usa o cliente da OpenAI (que respeita OPENAI_BASE_URL).
+            metricas (MetricsRegistry): Registro onde os rastros dos turnos são agregados
+            formato_payload (str): Como o resultado vai para o prompt de formatação: "compacto"
+                (tabela dentro de um orçamento de tokens) ou "json" (JSON indentado completo).
+                Padrão: PAYLOAD_FORMATO ou "compacto".
+            orcamento_payload (int): Orçamento de tokens do formato compacto.
+                Padrão: PAYLOAD_ORCAMENTO_TOKENS ou 400.
+            limite_tags_prompt (int): Máximo de tags listadas no system prompt. Catálogos com
+                mais tags recebem, a cada mensagem, só as relevantes para ela.
+                Padrão: PROMPT_LIMITE_TAGS ou 150.
+            tags_por_consulta (int): Máximo de tags relevantes por mensagem.
+                Padrão: PROMPT_TAGS_POR_CONSULTA ou 30.
+            sessoes (SessionStore): Estado das conversas, usado quando o chamador informa
+                `sessao_id`. Padrão: em memória, com SESSOES_MAX (10000) sessões que expiram
+                após SESSOES_TTL (1800) segundos sem uso.
+            coalescencia (SingleFlight): Junta chamadas idênticas e simultâneas ao LLM (mesma
+                mensagem normalizada e mesma versão do catálogo) numa só. Padrão: espera de até
+                COALESCENCIA_TIMEOUT (30) segundos pela chamada em andamento.
+            llm (HedgedClient): Política das chamadas ao LLM. Padrão: prazo de LLM_TIMEOUT_DECISAO (15)
+                e LLM_TIMEOUT_FORMATACAO (30) segundos; cópia da requisição após LLM_HEDGE_DECISAO e
+                LLM_HEDGE_FORMATACAO segundos (0, padrão, desativa), em até LLM_HEDGE_TAXA_MAX (0.05)
+                das chamadas.
         """
         self.api_key = api_key or os.getenv('OPENAI_API_KEY')
-        if not self.api_key:
-            raise ValueError("API key da OpenAI não encontrada. Configure OPENAI_API_KEY ou passe como parâmetro.")
         
-        self.client = OpenAI(api_key=self.api_key)
+        timeouts = {
+            ETAPA_DECISAO: float(os.getenv('LLM_TIMEOUT_DECISAO', '15')),
+            ETAPA_FORMATACAO: float(os.getenv('LLM_TIMEOUT_FORMATACAO', '30')),
+        }
+        # O pool HTTP (LLM_CONEXOES, LLM_CONEXOES_OCIOSAS, LLM_KEEPALIVE) cobre as cópias dos hedges
+        self.client = client if client is not None else self._criar_cliente(max(timeouts.values()))
+        self.llm = llm or HedgedClient(
+            self.client,
+            timeouts=timeouts,
+            atrasos_hedge={
+                ETAPA_DECISAO: float(os.getenv('LLM_HEDGE_DECISAO', '0')),
+                ETAPA_FORMATACAO: float(os.getenv('LLM_HEDGE_FORMATACAO', '0')),
+            },
+            taxa_hedge=float(os.getenv('LLM_HEDGE_TAXA_MAX', '0.05')),
+            max_paralelas=int(os.getenv('LLM_CONEXOES', '100'))
+        )
         self.model = "gpt-4o"
-        
-        # Carrega as tags únicas do catálogo
-        try:
-            catalogo_path = os.path.join(os.path.dirname(__file__), '..', 'catalogo.json')
-            self.tags_disponiveis = list(extrai_tags(catalogo_path))
-        except Exception as e:
-            print(f"Aviso: Não foi possível carregar tags do catálogo: {e}")
-            self.tags_disponiveis = []
+        self.cache_decisoes = cache_decisoes or DecisionCache(
+            ttl=float(os.getenv('CACHE_DECISOES_TTL', '3600')),
+            caminho_sqlite=os.getenv('CACHE_DECISOES_SQLITE')
+        )
+        if limiar_parser_local is None:
+            limiar_parser_local = float(os.getenv('PARSER_LOCAL_LIMIAR', '0.8'))
+        self.limiar_parser_local = limiar_parser_local
+        self.modo_formatacao = modo_formatacao or os.getenv('FORMATACAO_MODO', MODO_AUTO)
+        self.formatador = formatador or TemplateFormatter()
+        self.formato_payload = formato_payload or os.getenv('PAYLOAD_FORMATO', FORMATO_COMPACTO)
+        self.orcamento_payload = orcamento_payload or int(os.getenv('PAYLOAD_ORCAMENTO_TOKENS', str(ORCAMENTO_PADRAO)))
+        self.limite_tags_prompt = limite_tags_prompt or int(os.getenv('PROMPT_LIMITE_TAGS', '150'))
+        self.tags_por_consulta = tags_por_consulta or int(os.getenv('PROMPT_TAGS_POR_CONSULTA', '30'))
+        self.sessoes = sessoes or SessionStore(
+            max_sessoes=int(os.getenv('SESSOES_MAX', '10000')),
+            ttl=float(os.getenv('SESSOES_TTL', '1800'))
+        )
+        self.metricas = metricas or MetricsRegistry()
+        self.metricas.adicionar_fonte("cache_decisoes", self.cache_decisoes.estatisticas)
+        self.coalescencia = coalescencia or SingleFlight(timeout=float(os.getenv('COALESCENCIA_TIMEOUT', '30')))
+        self.metricas.adicionar_fonte("sessoes", self.sessoes.estatisticas)
+        self.metricas.adicionar_fonte("coalescencia", self.coalescencia.estatisticas)
+        self.metricas.adicionar_fonte("cache_resultados", repositorio.cache_resultados.estatisticas)
+        self.metricas.adicionar_fonte("catalogo_particionado", search_process_stats)
+        self.metricas.adicionar_fonte("llm", self.llm.estatisticas)
         
         self.response_schema = {
             "type": "json_schema",
@@ -43,7 +173,8 @@ class MealRecommendationAgent:
                     "properties": {
                         "action_taken": {
                             "type": "string",
-                            "enum": ["search_catalog", "get_cheapest_item", "get_most_expensive_item", "get_price_range"],
+                            "enum": ["search_catalog", "get_cheapest_item", "get_most_expensive_item", "get_price_range",
+                                     *ACOES_POR_TAGS],
                             "description": "Ação que será executada baseada na solicitação do usuário"
                         },                        "search_params": {
                             "type": "object",
@@ -78,73 +209,108 @@ class MealRecommendationAgent:
                     "additionalProperties": False
                 }            }        }
         
-        self.system_prompt = f"""
-Assistente de recomendação de refeições. Responda EXATAMENTE no formato JSON.
+        # Tags e system prompt derivam da versão atual do catálogo
+        self._estado_catalogo = None
+        self._sincronizar_catalogo()
 
-TAGS DISPONÍVEIS: {', '.join(self.tags_disponiveis)}
+    def _criar_cliente(self, timeout: float):
+        """
+        Cliente síncrono padrão (OpenAI), usado quando nenhum `client` é informado
+        
+        Args:
+            timeout (float): Tempo máximo de cada requisição HTTP, em segundos
+            
+        Returns:
+            OpenAI: Cliente com o pool de conexões configurado
+        """
+        if not self.api_key:
+            raise ValueError("API key da OpenAI não encontrada. Configure OPENAI_API_KEY ou passe como parâmetro.")
+        return criar_cliente_openai(self.api_key, timeout=timeout)
 
-AÇÕES:
-- "mais barato" → "get_cheapest_item"
-- "mais caro" → "get_most_expensive_item"  
-- "faixa de preço" → "get_price_range"
-- Qualquer busca → "search_catalog"
+    def _montar_system_prompt(self, tags_disponiveis: List[str]) -> str:
+        """
+        Monta o system prompt base da decisão: o prefixo fixo e, se couberem, as tags
+        
+        Args:
+            tags_disponiveis (List[str]): Tags únicas do catálogo, ordenadas
+            
+        Returns:
+            str: System prompt
+        """
+        if len(tags_disponiveis) > self.limite_tags_prompt:
+            # Vocabulário grande: cada mensagem recebe só as tags relevantes para ela
+            return PROMPT_DECISAO
+        return PROMPT_DECISAO + self._bloco_tags("TAGS DISPONÍVEIS", tags_disponiveis)
 
-MAPEAMENTO TAGS:
-- "sem lactose" → ["sem lactose"]
-- "vegano" → ["vegano"]
-- "picante/apimentado" → ["picante"]
-- "sem gluten" → ["sem gluten"]
-- "sem açúcar" → ["sem açucar"]
+    @staticmethod
+    def _bloco_tags(titulo: str, tags: List[str]) -> str:
+        return f"\n{titulo}: {', '.join(tags) if tags else 'nenhuma'}\n"
 
-INGREDIENTES:
-- "proteína" → ["frango", "carne", "peixe", "ovo", "tofu", "camarão"]
-- "arroz" → ["arroz"]
-- "legumes" → ["legumes", "brócolis", "cenoura"]
+    def _sincronizar_catalogo(self, user_message: str = None) -> tuple:
+        """
+        Atualiza tags e system prompt se o catálogo mudou de versão
+        
+        Args:
+            user_message (str): Mensagem do turno. Com vocabulários maiores que
+                limite_tags_prompt, as tags relevantes para ela entram no system prompt.
+        
+        Returns:
+            tuple: (snapshot, tags_disponiveis, system_prompt) da versão atual
+        """
+        snapshot = repositorio.snapshot
+        estado = self._estado_catalogo
+        if estado is None or estado[0] is not snapshot:
+            # Ordenadas: o prompt é o mesmo em todo processo, o que mantém o cache de prefixo do provedor
+            # TagsCatalogo: o parser local compila os padrões das tags uma vez por versão
+            tags = TagsCatalogo(sorted(snapshot.tags))
+            seletor = TagRetriever(tags) if len(tags) > self.limite_tags_prompt else None
+            estado = (snapshot, tags, self._montar_system_prompt(tags), seletor)
+            self._estado_catalogo = estado
+        
+        snapshot, tags, system_prompt, seletor = estado
+        if user_message is not None and seletor is not None:
+            relevantes = seletor.relevantes(user_message, self.tags_por_consulta)
+            system_prompt += self._bloco_tags("TAGS DISPONÍVEIS PARA ESTA MENSAGEM", relevantes)
+        return snapshot, tags, system_prompt
 
-FORMATO:
-{{
-  "action_taken": "search_catalog",
-  "search_params": {{
-    "budget": null,
-    "incluir_tags": [],
-    "excluir_tags": [],
-    "ingredientes_obrigatorios": []
-  }},
-  "reasoning": "explicação breve",
-  "user_intent": "intenção do usuário"
-}}
+    @property
+    def tags_disponiveis(self) -> List[str]:
+        return self._sincronizar_catalogo()[1]
 
-IMPORTANTE: SEMPRE inclua search_params com TODOS os campos, mesmo vazios.
-"""
+    @property
+    def system_prompt(self) -> str:
+        return self._sincronizar_catalogo()[2]
 
-    def _execute_function(self, function_name: str, arguments: dict):
+    def _execute_function(self, function_name: str, arguments: dict, snapshot=None, limite: int = LIMITE_RESULTADOS):
         """
         Executa uma função baseada na resposta estruturada da Responses API
         
         Args:
             function_name (str): Nome da função
             arguments (dict): Argumentos da função
+            snapshot (CatalogSnapshot): Versão do catálogo usada no turno
+            limite (int): Máximo de resultados de search_catalog
             
         Returns:
             dict: Resultado da execução da função
         """
         if function_name == "search_catalog":
+            return self._buscar_catalogo(arguments, snapshot, limite)[0]
+        elif function_name == "get_cheapest_item":
             try:
-                results = search_catalog(arguments)
+                result = get_cheapest_item(snapshot)
                 return {
                     "success": True,
-                    "results": results,
-                    "count": len(results)
+                    "result": result
                 }
             except Exception as e:
                 return {
                     "success": False,
-                    "error": str(e),
-                    "count": 0
+                    "error": str(e)
                 }
-        elif function_name == "get_cheapest_item":
+        elif function_name == "get_most_expensive_item":
             try:
-                result = get_cheapest_item()
+                result = get_most_expensive_item(snapshot)
                 return {
                     "success": True,
                     "result": result
@@ -154,9 +320,9 @@ IMPORTANTE: SEMPRE inclua search_params com TODOS os campos, mesmo vazios.
                     "success": False,
                     "error": str(e)
                 }
-        elif function_name == "get_most_expensive_item":
+        elif function_name == "get_price_range":
             try:
-                result = get_most_expensive_item()
+                result = get_price_range(snapshot)
                 return {
                     "success": True,
                     "result": result
@@ -166,12 +332,19 @@ IMPORTANTE: SEMPRE inclua search_params com TODOS os campos, mesmo vazios.
                     "success": False,
                     "error": str(e)
                 }
-        elif function_name == "get_price_range":
+        elif function_name in ACOES_POR_TAGS:
+            funcoes = {
+                "get_cheapest_item_by_tags": get_cheapest_item_by_tags,
+                "get_most_expensive_item_by_tags": get_most_expensive_item_by_tags,
+                "get_price_range_by_tags": get_price_range_by_tags,
+            }
             try:
-                result = get_price_range()
+                tags = arguments.get("incluir_tags") or []
+                result = funcoes[function_name](tags, snapshot)
                 return {
                     "success": True,
-                    "result": result
+                    "result": result,
+                    "tags": tags
                 }
             except Exception as e:
                 return {
@@ -184,77 +357,73 @@ IMPORTANTE: SEMPRE inclua search_params com TODOS os campos, mesmo vazios.
                 "error": f"Função '{function_name}' não encontrada"
             }
 
-    def _relax_search_filters(self, original_args: dict) -> dict:
+    def _buscar_catalogo(self, arguments: dict, snapshot=None, limite: int = LIMITE_RESULTADOS) -> tuple:
         """
-        Relaxa os filtros de busca para tentar encontrar resultados
+        Executa search_catalog e devolve também as posições dos itens no motor
         
         Args:
-            original_args (dict): Argumentos originais
+            arguments (dict): Filtros de search_catalog
+            snapshot (CatalogSnapshot): Versão do catálogo usada no turno
+            limite (int): Máximo de resultados
             
         Returns:
-            dict: Argumentos relaxados
+            tuple: (resultado no formato de _execute_function, posições dos itens ou [] em caso de erro)
         """
-        relaxed = original_args.copy()
-        
-        if "ingredientes_obrigatorios" in relaxed and len(relaxed["ingredientes_obrigatorios"]) > 1:
-            relaxed["ingredientes_obrigatorios"] = relaxed["ingredientes_obrigatorios"][:1]
-        
-        if "excluir_tags" in relaxed:
-            del relaxed["excluir_tags"]
-            
-        if "budget" in relaxed:
-            relaxed["budget"] = relaxed["budget"] * 1.2
-        
-        return relaxed
+        try:
+            # Sem resultado exato, a mesma busca já devolve os itens mais próximos
+            posicoes, exatos = search_positions(arguments, snapshot, aproximados=True, limite=limite)
+            results = items_at(posicoes, exatos, arguments, snapshot)
+            return {
+                "success": True,
+                "results": results,
+                "count": len(results),
+                "aproximados": not exatos and bool(results)
+            }, posicoes
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "count": 0
+            }, []
 
-    def _map_user_text_to_tags(self, user_text: str) -> List[str]:
+    def _map_user_text_to_tags(self, user_text: str, tags_disponiveis: List[str] = None) -> List[str]:
         """
         Mapeia o texto do usuário para as tags disponíveis no catálogo
         
         Args:
             user_text (str): Texto do usuário
+            tags_disponiveis (List[str]): Tags do catálogo (padrão: versão atual)
             
         Returns:
             List[str]: Lista de tags encontradas
         """
+        if tags_disponiveis is None:
+            tags_disponiveis = self.tags_disponiveis
         user_text_lower = user_text.lower()
         tags_encontradas = []
         
-        # Mapeamento de termos comuns para tags
-        mapeamentos = {
-            'sem lactose': ['sem lactose'],
-            'intolerante a lactose': ['sem lactose'],
-            'lactose': ['sem lactose'],
-            'vegano': ['vegano'],
-            'vegan': ['vegano'],
-            'apimentado': ['picante'],
-            'picante': ['picante'],
-            'sem gluten': ['sem gluten'],
-            'sem açucar': ['sem açucar'],
-            'sem açúcar': ['sem açucar'],
-        }
-        
         # Busca por mapeamentos diretos
-        for termo, tags in mapeamentos.items():
+        for termo, tags in MAPEAMENTO_TAGS.items():
             if termo in user_text_lower:
                 for tag in tags:
-                    if tag in self.tags_disponiveis:
+                    if tag in tags_disponiveis:
                         tags_encontradas.append(tag)
         
         # Busca direta nas tags disponíveis
-        for tag in self.tags_disponiveis:
+        for tag in tags_disponiveis:
             if tag.lower() in user_text_lower:
                 tags_encontradas.append(tag)
         
         return list(set(tags_encontradas))  # Remove duplicatas
 
-    def _optimize_search_params(self, user_text: str, search_params: dict) -> dict:
+    def _optimize_search_params(self, user_text: str, search_params: dict, tags_disponiveis: List[str] = None) -> dict:
         """
         Otimiza os parâmetros de busca usando as tags reais do catálogo
         
         Args:
             user_text (str): Texto original do usuário
             search_params (dict): Parâmetros originais
+            tags_disponiveis (List[str]): Tags do catálogo (padrão: versão atual)
             
         Returns:
             dict: Parâmetros otimizados
@@ -262,88 +431,554 @@ IMPORTANTE: SEMPRE inclua search_params com TODOS os campos, mesmo vazios.
         optimized_params = search_params.copy()
         
         # Mapeia o texto do usuário para tags reais
-        tags_encontradas = self._map_user_text_to_tags(user_text)
+        tags_encontradas = self._map_user_text_to_tags(user_text, tags_disponiveis)
         
         # Se encontrou tags específicas, use-as
         if tags_encontradas:
             current_tags = set(optimized_params.get('incluir_tags', []))
-            current_tags.update(tags_encontradas)
+            # Não reinclui tags que a decisão mandou excluir ("nada picante")
+            current_tags.update(set(tags_encontradas) - set(optimized_params.get('excluir_tags') or []))
             optimized_params['incluir_tags'] = list(current_tags)
         
         return optimized_params
 
-    def chat(self, user_message: str) -> str:
+    def _decisao_sem_llm(self, user_message: str, tags_disponiveis: List[str], system_prompt: str, snapshot,
+                         trace: TurnTrace) -> tuple:
         """
-        Processa uma mensagem do usuário usando Responses API
+        Tenta decidir a ação do turno sem chamar o LLM: parser local e cache de decisões
         
         Args:
             user_message (str): Mensagem do usuário
+            tags_disponiveis (List[str]): Tags do catálogo do turno
+            system_prompt (str): System prompt do turno
+            snapshot (CatalogSnapshot): Versão do catálogo do turno
+            trace (TurnTrace): Rastro do turno
             
         Returns:
-            str: Resposta do agente
+            tuple: (decisão ou None, origem: "parser" ou "cache", chave do cache de decisões)
+        """
+        # Mensagens que as regras locais entendem com confiança dispensam o LLM
+        with trace.etapa("parser"):
+            decision_json, confianca = interpretar_mensagem(user_message, tags_disponiveis)
+        if confianca >= self.limiar_parser_local:
+            return decision_json, "parser", None
+
+        with trace.etapa("cache"):
+            chave_cache = self.cache_decisoes.chave(user_message, system_prompt, snapshot)
+            decision_json = self.cache_decisoes.get(chave_cache)
+        trace.cache_decisao = "miss" if decision_json is None else "hit"
+        return decision_json, "cache", chave_cache
+
+    def _requisicao_decisao(self, user_message: str, system_prompt: str) -> dict:
+        """
+        Argumentos da primeira chamada ao LLM (decisão estruturada)
+        
+        Args:
+            user_message (str): Mensagem do usuário
+            system_prompt (str): System prompt do turno
+            
+        Returns:
+            dict: Argumentos para chat.completions.create
+        """
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_message}
+            ],
+            "response_format": self.response_schema
+        }
+
+    def _ler_decisao(self, response, chave_cache: str) -> dict:
+        """
+        Interpreta a resposta estruturada do LLM e guarda a decisão no cache
+        
+        Args:
+            response: Resposta de chat.completions.create
+            chave_cache (str): Chave do cache de decisões
+            
+        Returns:
+            dict: Decisão no formato de response_schema
         """
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                response_format=self.response_schema
+            response_content = response.choices[0].message.content
+            if isinstance(response_content, str):
+                decision_json = json.loads(response_content)
+            else:
+                decision_json = json.loads(str(response_content))
+        except (json.JSONDecodeError, AttributeError) as e:
+            raise ErroRespostaEstruturada(str(e)) from e
+        campos = self.response_schema["json_schema"]["schema"]["required"]
+        if all(campo in decision_json for campo in campos):
+            self.cache_decisoes.put(chave_cache, decision_json)
+        return decision_json
+
+    def _decisao_llm(self, user_message: str, system_prompt: str, chave_cache: str, trace: TurnTrace) -> dict:
+        """
+        Primeira chamada ao LLM: decisão estruturada, guardada no cache de decisões
+        
+        Args:
+            user_message (str): Mensagem do usuário
+            system_prompt (str): System prompt do turno
+            chave_cache (str): Chave do cache de decisões
+            trace (TurnTrace): Rastro do turno que faz a chamada
+            
+        Returns:
+            dict: Decisão no formato de response_schema
+        """
+        with trace.etapa("llm_decisao"):
+            response = self.llm.criar(ETAPA_DECISAO, **self._requisicao_decisao(user_message, system_prompt))
+        trace.registrar_uso(response)
+        return self._ler_decisao(response, chave_cache)
+
+    def _decidir(self, user_message: str, tags_disponiveis: List[str], system_prompt: str, snapshot,
+                 trace: TurnTrace) -> tuple:
+        """
+        Decide a ação do turno: parser local, cache de decisões ou primeira chamada ao LLM
+        
+        Args:
+            user_message (str): Mensagem do usuário
+            tags_disponiveis (List[str]): Tags do catálogo do turno
+            system_prompt (str): System prompt do turno
+            snapshot (CatalogSnapshot): Versão do catálogo do turno
+            trace (TurnTrace): Rastro do turno
+            
+        Returns:
+            tuple: (decisão no formato de response_schema, origem: "parser", "cache", "llm"
+                   ou "coalescida" — a chamada ao LLM de outro turno idêntico simultâneo)
+        """
+        with trace.etapa("decisao"):
+            decision_json, origem, chave_cache = self._decisao_sem_llm(
+                user_message, tags_disponiveis, system_prompt, snapshot, trace
             )
-            try:
-                response_content = response.choices[0].message.content
-                if isinstance(response_content, str):
-                    decision_json = json.loads(response_content)
-                else:
-                    decision_json = json.loads(str(response_content))
-            except (json.JSONDecodeError, AttributeError) as e:
-                return f"Erro ao processar resposta estruturada: {str(e)}. Tente novamente!"            
-            action = decision_json["action_taken"]
-            reasoning = decision_json["reasoning"]
-            user_intent = decision_json["user_intent"]
+            if decision_json is None:
+                # A chave do cache já combina mensagem normalizada, prompt e catálogo
+                decision_json, compartilhada = self.coalescencia.executar(
+                    ("decisao", chave_cache),
+                    lambda: self._decisao_llm(user_message, system_prompt, chave_cache, trace)
+                )
+                origem = "coalescida" if compartilhada else "llm"
+        trace.origem_decisao = origem
+        return decision_json, origem
+
+    def _executar_decisao(self, user_message: str, decision_json: dict, origem_decisao: str,
+                          tags_disponiveis: List[str], snapshot, trace: TurnTrace, sessao: SessionState = None) -> dict:
+        """
+        Executa a ação decidida no catálogo (buscas sem resultado exato trazem os itens mais próximos)
+        
+        Args:
+            user_message (str): Mensagem do usuário
+            decision_json (dict): Decisão no formato de response_schema
+            origem_decisao (str): "parser", "cache", "llm" ou "coalescida"
+            tags_disponiveis (List[str]): Tags do catálogo do turno
+            snapshot (CatalogSnapshot): Versão do catálogo do turno
+            trace (TurnTrace): Rastro do turno
+            sessao (SessionState): Conversa do turno, atualizada com o resultado
             
+        Returns:
+            dict: Turno com a mensagem, a decisão e o resultado da função
+        """
+        action = decision_json["action_taken"]
+        relaxado = False
+        params_busca = {}
+        candidatos = []
+        trace.action = action
+        
+        with trace.etapa("busca"):
             if action == "search_catalog":
                 search_params = decision_json.get("search_params", {})
                 # Otimiza os parâmetros usando as tags reais do catálogo
-                optimized_params = self._optimize_search_params(user_message, search_params)
+                with trace.etapa("otimizacao"):
+                    optimized_params = self._optimize_search_params(user_message, search_params, tags_disponiveis)
                 clean_params = {k: v for k, v in optimized_params.items() if v is not None and v != []}
-                function_result = self._execute_function(action, clean_params)
-                
-                if function_result.get("count", 0) == 0 and clean_params:
-                    relaxed_params = self._relax_search_filters(clean_params)
-                    if relaxed_params != clean_params:
-                        function_result = self._execute_function(action, relaxed_params)
-                        
+                # Numa conversa, busca também os itens que os próximos refinamentos vão filtrar
+                limite = LIMITE_CANDIDATOS + 1 if sessao is not None else LIMITE_RESULTADOS
+                with trace.etapa("consulta"):
+                    function_result, posicoes = self._buscar_catalogo(clean_params, snapshot, limite)
+                params_busca = clean_params
+                relaxado = function_result.get("aproximados", False)
+                if function_result["success"]:
+                    candidatos = [] if relaxado else posicoes
+                    function_result["results"] = function_result["results"][:LIMITE_RESULTADOS]
+                    function_result["count"] = len(function_result["results"])
+
+            elif action in ACOES_POR_TAGS:
+                search_params = decision_json.get("search_params", {})
+                with trace.etapa("otimizacao"):
+                    optimized_params = self._optimize_search_params(user_message, search_params, tags_disponiveis)
+                tags = sorted(optimized_params.get("incluir_tags") or [])
+                if not tags:
+                    # Sem tag reconhecida, vale para o catálogo inteiro
+                    action = trace.action = ACOES_POR_TAGS[action]
+                with trace.etapa("consulta"):
+                    function_result = self._execute_function(action, {"incluir_tags": tags}, snapshot)
+                params_busca = {"incluir_tags": tags} if tags else {}
+
             else:
-                function_result = self._execute_function(action, {})
+                with trace.etapa("consulta"):
+                    function_result = self._execute_function(action, {}, snapshot)
+
+        trace.relaxado = relaxado
+        if "count" in function_result:
+            trace.resultados = function_result["count"]
+        turno = {
+            "user_message": user_message,
+            "action": action,
+            "reasoning": decision_json["reasoning"],
+            "user_intent": decision_json["user_intent"],
+            "function_result": function_result,
+            "search_params": params_busca,
+            "origem_decisao": origem_decisao,
+            "relaxado": relaxado
+        }
+        if sessao is not None and function_result["success"]:
+            camadas = [params_busca] if params_busca else []
+            sessao.registrar(turno, camadas, candidatos, len(candidatos) <= LIMITE_CANDIDATOS and bool(candidatos),
+                             snapshot.versao)
+        return turno
+
+    def _refinar(self, user_message: str, sessao: SessionState, tags_disponiveis: List[str], snapshot,
+                 trace: TurnTrace) -> Optional[dict]:
+        """
+        Responde sem o LLM a uma mensagem que refina o resultado anterior da conversa
+        
+        Os filtros novos ("agora só os sem lactose", "algo mais barato que isso")
+        se somam aos dos turnos anteriores e são aplicados aos itens guardados
+        na sessão. Só quando eles não bastam para uma resposta exata a busca
+        volta ao catálogo, com todos os filtros combinados.
+        
+        Args:
+            user_message (str): Mensagem do usuário
+            sessao (SessionState): Conversa com o resultado anterior
+            tags_disponiveis (List[str]): Tags do catálogo do turno
+            snapshot (CatalogSnapshot): Versão do catálogo do turno
+            trace (TurnTrace): Rastro do turno
             
-            final_response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "Você é um assistente de recomendação de refeições. Formate uma resposta amigável e útil baseada nos resultados fornecidos."
-                    },
-                    {
-                        "role": "user", 
-                        "content": f"""
-Solicitação do usuário: {user_message}
-Intenção identificada: {user_intent}
-Ação tomada: {action}
-Raciocínio: {reasoning}
-Resultado da busca: {json.dumps(function_result, ensure_ascii=False, indent=2)}
+        Returns:
+            Optional[dict]: Turno refinado, ou None se a mensagem não é um refinamento
+                reconhecido e deve seguir o caminho normal
+        """
+        with trace.etapa("decisao"), trace.etapa("parser"):
+            refinamento, confianca = interpretar_refinamento(user_message, tags_disponiveis)
+        if refinamento is None or confianca < self.limiar_parser_local:
+            return None
+
+        novos = {k: v for k, v in refinamento["search_params"].items() if v is not None and v != []}
+        if refinamento["mais_barato_que_anterior"]:
+            referencia = sessao.preco_referencia()
+            if referencia is None:
+                return None
+            novos["budget"] = min(novos.get("budget", referencia), round(referencia - 0.01, 2))
+        action = refinamento["action"]
+        anteriores = combinar_filtros(sessao.camadas)[0]
+        camadas = sessao.camadas + [novos]
+        filtros, extras = combinar_filtros(camadas)
+        # Um orçamento maior traz pratos que não estão entre os guardados
+        amplia = novos.get("budget") is not None and novos["budget"] > anteriores.get("budget", float("inf"))
+        # O mais caro só sai dos itens guardados se eles forem todos os que atendem
+        minimo = {"search_catalog": LIMITE_RESULTADOS, "get_cheapest_item": 1}.get(action, float("inf"))
+
+        with trace.etapa("busca"):
+            filtrados = None
+            if not amplia:
+                with trace.etapa("sessao"):
+                    filtrados = sessao.filtrar(novos, snapshot, minimo)
+            if filtrados is not None and filtrados[0]:
+                posicoes, itens, completo = filtrados
+                relaxado = False
+            elif extras or action == "get_most_expensive_item":
+                # Sem como combinar tudo numa busca: o turno segue o caminho normal
+                return None
+            else:
+                # Também quando nada dos itens guardados atende: a busca traz os mais próximos
+                with trace.etapa("consulta"):
+                    posicoes, exatos = search_positions(filtros, snapshot, aproximados=True,
+                                                        limite=LIMITE_CANDIDATOS + 1)
+                    itens = items_at(posicoes, exatos, filtros, snapshot)
+                completo = len(itens) <= LIMITE_CANDIDATOS
+                relaxado = not exatos and bool(itens)
+
+        if action == "get_cheapest_item":
+            mostrados = itens[:1]
+        elif action == "get_most_expensive_item" and itens:
+            maior = max(item["preco"] for item in itens)
+            mostrados = [next(item for item in itens if item["preco"] == maior)]
+        else:
+            mostrados = itens[:LIMITE_RESULTADOS]
+
+        trace.origem_decisao = "sessao"
+        trace.action = "search_catalog"
+        trace.relaxado = relaxado
+        trace.resultados = len(mostrados)
+        intencao = {"get_cheapest_item": "o mais barato", "get_most_expensive_item": "o mais caro"}.get(action, "os pratos")
+        turno = {
+            "user_message": user_message,
+            "action": "search_catalog",
+            "reasoning": "Refinamento do resultado anterior: os filtros novos se somam aos da conversa",
+            "user_intent": f"Ver {intencao} entre os resultados anteriores que atendem aos novos critérios",
+            "function_result": {"success": True, "results": mostrados, "count": len(mostrados), "aproximados": relaxado},
+            "search_params": filtros,
+            "origem_decisao": "sessao",
+            "relaxado": relaxado,
+            "tempos": trace.tempos
+        }
+        sessao.registrar(turno, camadas, [] if relaxado else posicoes, completo and not relaxado, snapshot.versao)
+        return turno
+
+    @staticmethod
+    def _com_historico(system_prompt: str, sessao: SessionState) -> str:
+        """
+        Acrescenta o resumo da conversa ao system prompt, depois do prefixo fixo
+        
+        Args:
+            system_prompt (str): System prompt do turno
+            sessao (SessionState): Conversa do turno
+            
+        Returns:
+            str: System prompt com o histórico (ou o mesmo, se a conversa está vazia)
+        """
+        resumo = sessao.resumo()
+        if not resumo:
+            return system_prompt
+        return (system_prompt + "\nHISTÓRICO DA CONVERSA (do mais antigo ao mais recente):\n" + resumo +
+                "\nSe a mensagem continuar um pedido anterior, combine os filtros dele com os novos.\n")
+
+    def _preparar_turno(self, user_message: str, trace: TurnTrace, sessao: SessionState = None) -> dict:
+        """
+        Executa tudo o que antecede a formatação: decisão e consulta ao catálogo
+        
+        Args:
+            user_message (str): Mensagem do usuário
+            trace (TurnTrace): Rastro do turno
+            sessao (SessionState): Conversa do turno (None para uma mensagem avulsa)
+            
+        Returns:
+            dict: Turno com a mensagem, a decisão e o resultado da função
+        """
+        # Todo o turno usa a mesma versão do catálogo, mesmo que haja recarga no meio
+        snapshot, tags_disponiveis, system_prompt = self._sincronizar_catalogo(user_message)
+        if sessao is not None and sessao.tem_contexto():
+            turno = self._refinar(user_message, sessao, tags_disponiveis, snapshot, trace)
+            if turno is not None:
+                return turno
+            system_prompt = self._com_historico(system_prompt, sessao)
+        decision_json, origem_decisao = self._decidir(user_message, tags_disponiveis, system_prompt, snapshot, trace)
+        turno = self._executar_decisao(user_message, decision_json, origem_decisao, tags_disponiveis, snapshot, trace,
+                                       sessao)
+        turno["tempos"] = trace.tempos
+        return turno
+
+    def _encerrar_turno(self, trace: TurnTrace, turno: dict) -> dict:
+        """
+        Finaliza o rastro, agrega nas métricas e anexa ao turno
+        
+        Args:
+            trace (TurnTrace): Rastro do turno
+            turno (dict): Turno (ou turno de erro) devolvido ao chamador
+            
+        Returns:
+            dict: O próprio turno, com "tempos" e "trace"
+        """
+        trace.finalizar()
+        self.metricas.registrar(trace)
+        turno["tempos"] = trace.tempos
+        turno["trace"] = trace.como_dict()
+        return turno
+
+    def metricas_snapshot(self) -> dict:
+        """Métricas agregadas dos turnos (JSON), incluindo o cache de decisões."""
+        return self.metricas.snapshot()
+
+    def metricas_prometheus(self) -> str:
+        """Métricas agregadas dos turnos no formato de texto do Prometheus."""
+        return self.metricas.prometheus()
+
+    def _formatar_localmente(self, turno: dict) -> bool:
+        """
+        Decide se a resposta do turno sai dos templates locais em vez do LLM
+        
+        Args:
+            turno (dict): Turno preparado por _preparar_turno
+            
+        Returns:
+            bool: True para usar o formatador local
+        """
+        if self.modo_formatacao == MODO_LLM or not self.formatador.pode_formatar(turno):
+            return False
+        if self.modo_formatacao == MODO_TEMPLATE:
+            return True
+        # Modo auto: pedidos que precisaram do LLM para serem entendidos também
+        # costumam ter nuances ("saudável", "prático") que só ele sabe comentar
+        return turno["origem_decisao"] in ("parser", "sessao")
+
+    @staticmethod
+    def _chave_formatacao(turno: dict) -> tuple:
+        """Chave de coalescência da formatação: mensagem normalizada, ação e resultado."""
+        conteudo = json.dumps(
+            [normalizar_consulta(turno["user_message"]), turno["action"], turno["function_result"]],
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+        return "formatacao", hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+    def _formatacao_llm(self, turno: dict, trace: TurnTrace) -> str:
+        """Segunda chamada ao LLM: a resposta final formatada."""
+        final_response = self.llm.criar(
+            ETAPA_FORMATACAO,
+            model=self.model,
+            messages=self._mensagens_formatacao(turno)
+        )
+        trace.registrar_uso(final_response)
+        return final_response.choices[0].message.content
+
+    def _mensagens_formatacao(self, turno: dict) -> List[Dict]:
+        """
+        Monta as mensagens da chamada que formata a resposta final
+        
+        Args:
+            turno (dict): Turno preparado por _preparar_turno
+            
+        Returns:
+            List[Dict]: Mensagens para chat.completions
+        """
+        return [
+            {
+                "role": "system", 
+                "content": "Você é um assistente de recomendação de refeições. Formate uma resposta amigável e útil baseada nos resultados fornecidos."
+            },
+            {
+                "role": "user", 
+                "content": f"""
+Solicitação do usuário: {turno["user_message"]}
+Intenção identificada: {turno["user_intent"]}
+Ação tomada: {turno["action"]}
+Raciocínio: {turno["reasoning"]}
+Resultado da busca: {serializar_resultado(turno["function_result"], self.formato_payload, self.orcamento_payload)}
 
 Formate uma resposta amigável e útil para o usuário, incluindo os pratos encontrados (se houver) com nome, preço e descrição.
 """
-                    }
-                ]
-            )
+            }
+        ]
+
+    def _sessao(self, sessao_id: Optional[str]) -> Optional[SessionState]:
+        return self.sessoes.obter(sessao_id) if sessao_id else None
+
+    def chat_detalhado(self, user_message: str, sessao_id: str = None) -> dict:
+        """
+        Processa uma mensagem e devolve a resposta junto com os detalhes do turno
+        
+        Args:
+            user_message (str): Mensagem do usuário
+            sessao_id (str): Id da conversa. Com ele, o agente lembra o resultado anterior
+                e responde refinamentos ("agora só os sem lactose") sem nova decisão.
+            
+        Returns:
+            dict: Turno com "resposta", ação, search_params, tempos por etapa e "erro" (se houver)
+        """
+        trace = TurnTrace(user_message, sessao_id)
+        try:
+            turno = self._preparar_turno(user_message, trace, self._sessao(sessao_id))
+            with trace.etapa("formatacao"):
+                if self._formatar_localmente(turno):
+                    trace.formatacao = "template"
+                    turno["resposta"] = self.formatador.formatar(turno)
+                else:
+                    turno["resposta"], compartilhada = self.coalescencia.executar(
+                        self._chave_formatacao(turno), lambda: self._formatacao_llm(turno, trace)
+                    )
+                    trace.formatacao = "coalescida" if compartilhada else "llm"
             
-            return final_response.choices[0].message.content
+        except ErroRespostaEstruturada as e:
+            trace.registrar_erro(e)
+            turno = {
+                "user_message": user_message,
+                "resposta": f"Erro ao processar resposta estruturada: {trace.erro}. Tente novamente!",
+                "erro": trace.erro
+            }
+        except Exception as e:
+            trace.registrar_erro(e)
+            turno = {
+                "user_message": user_message,
+                "resposta": f"Desculpe, ocorreu um erro: {trace.erro}. Tente novamente!",
+                "erro": trace.erro
+            }
+
+        return self._encerrar_turno(trace, turno)
+
+    def chat(self, user_message: str, sessao_id: str = None) -> str:
+        """
+        Processa uma mensagem do usuário usando Responses API
+        
+        Args:
+            user_message (str): Mensagem do usuário
+            sessao_id (str): Id da conversa (veja chat_detalhado)
+            
+        Returns:
+            str: Resposta do agente
+        """
+        return self.chat_detalhado(user_message, sessao_id)["resposta"]
+
+    def chat_stream(self, user_message: str, sessao_id: str = None) -> Iterator[str]:
+        """
+        Variante de chat que devolve a resposta final em partes, conforme chegam
+        
+        Args:
+            user_message (str): Mensagem do usuário
+            sessao_id (str): Id da conversa (veja chat_detalhado)
+            
+        Yields:
+            str: Trechos da resposta do agente (em caso de erro, a mensagem de erro)
+        """
+        trace = TurnTrace(user_message, sessao_id)
+        turno = {"user_message": user_message}
+        try:
+            turno = self._preparar_turno(user_message, trace, self._sessao(sessao_id))
+            if self._formatar_localmente(turno):
+                trace.formatacao = "template"
+                with trace.etapa("formatacao"):
+                    resposta = self.formatador.formatar(turno)
+                yield resposta
+                return
+            # Um turno idêntico já formatando: espera o texto dele e entrega de uma vez
+            chave = self._chave_formatacao(turno)
+            with trace.etapa("formatacao"):
+                voo, lider = self.coalescencia.entrar(chave)
+            if not lider:
+                # Para quem esperou, entrar() já devolve o texto
+                trace.formatacao = "coalescida"
+                yield voo
+                return
+            trace.formatacao = "llm"
+            partes = []
+            try:
+                with trace.etapa("formatacao"):
+                    stream = self.llm.criar(
+                        ETAPA_FORMATACAO,
+                        model=self.model,
+                        messages=self._mensagens_formatacao(turno),
+                        stream=True
+                    )
+                trace.chamadas_llm += 1
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        partes.append(chunk.choices[0].delta.content)
+                        yield partes[-1]
+                self.coalescencia.concluir(chave, voo, "".join(partes))
+            except Exception as e:
+                self.coalescencia.falhar(chave, voo, e)
+                raise
+            finally:
+                # Consumidor que parou de ler no meio: um turno em espera assume
+                if not voo.evento.is_set():
+                    self.coalescencia.abandonar(chave, voo)
             
+        except ErroRespostaEstruturada as e:
+            trace.registrar_erro(e)
+            yield f"Erro ao processar resposta estruturada: {str(e)}. Tente novamente!"
         except Exception as e:
-            return f"Desculpe, ocorreu um erro: {str(e)}. Tente novamente!"
+            trace.registrar_erro(e)
+            yield f"Desculpe, ocorreu um erro: {str(e)}. Tente novamente!"
+        finally:
+            self._encerrar_turno(trace, turno)
 
     def get_recommendation(self, user_request: str) -> str:
         """
@@ -0,0 +1,246 @@
+import asyncio
+import random
+import time
+from typing import List
+
+import openai
+from openai import AsyncOpenAI
+
+from .agent_executor import ErroRespostaEstruturada, MealRecommendationAgent
+from .cliente_llm import ETAPA_DECISAO, ETAPA_FORMATACAO, TempoEsgotadoLLM
+from .metricas import TurnTrace
+from .sessao import SessionState
+
+# Erros transitórios que valem uma nova tentativa. Backends alternativos (ex.:
+# AsyncStubLLMClient) acrescentam os seus no atributo `erros_transitorios`.
+ERROS_TRANSITORIOS = (
+    asyncio.TimeoutError,
+    TempoEsgotadoLLM,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class AsyncMealRecommendationAgent(MealRecommendationAgent):
+    """
+    Versão assíncrona do agente, sobre o cliente AsyncOpenAI.
+
+    Reaproveita toda a lógica do agente síncrono (parser local, cache de
+    decisões, busca e templates) e só troca as chamadas ao LLM, que passam a ter
+    concorrência limitada e novas tentativas com backoff exponencial com
+    jitter. O prazo e o hedge de cada etapa são os do agente síncrono
+    (LLM_TIMEOUT_* e LLM_HEDGE_*, veja HedgedClient.acriar): o prazo da etapa
+    inclui as novas tentativas, e `timeout` só limita cada tentativa das
+    etapas sem prazo. `abatch` roda muitas mensagens em paralelo sem ocupar
+    uma thread por requisição.
+    """
+
+    def __init__(self, api_key: str = None, concorrencia: int = 16, timeout: float = 30.0,
+                 tentativas: int = 3, backoff_base: float = 0.5, aclient=None, erros_transitorios: tuple = None,
+                 **kwargs):
+        """
+        Inicializa o agente assíncrono
+
+        Args:
+            api_key (str): Chave da API da OpenAI. Se não fornecida, busca na variável de ambiente.
+            concorrencia (int): Máximo de chamadas simultâneas ao LLM
+            timeout (float): Tempo máximo de cada tentativa nas etapas sem prazo próprio, em segundos
+            tentativas (int): Número total de tentativas por chamada
+            backoff_base (float): Espera base entre tentativas, em segundos
+            aclient: Backend assíncrono do LLM (ex.: AsyncStubLLMClient). Se não fornecido,
+                usa o AsyncOpenAI. Com ele, a API key não é necessária.
+            erros_transitorios (tuple): Exceções que valem uma nova tentativa. Padrão:
+                ERROS_TRANSITORIOS e os `erros_transitorios` do aclient, se houver.
+            **kwargs: Demais opções de MealRecommendationAgent
+        """
+        self.aclient = aclient
+        super().__init__(api_key, **kwargs)
+        if self.aclient is None:
+            # As novas tentativas são feitas aqui, com jitter, e não pelo cliente
+            self.aclient = AsyncOpenAI(api_key=self.api_key, max_retries=0)
+        if erros_transitorios is None:
+            erros_transitorios = ERROS_TRANSITORIOS + tuple(getattr(self.aclient, "erros_transitorios", ()))
+        self.erros_transitorios = erros_transitorios
+        self.concorrencia = concorrencia
+        self.timeout = timeout
+        self.tentativas = tentativas
+        self.backoff_base = backoff_base
+        self._semaforo = None
+        self._semaforo_loop = None
+
+    def _criar_cliente(self, timeout: float):
+        """O cliente síncrono só é criado quando não há aclient (as chamadas usam o aclient)."""
+        if self.aclient is not None:
+            return None
+        return super()._criar_cliente(timeout)
+
+    def _obter_semaforo(self) -> asyncio.Semaphore:
+        """Semáforo de concorrência do event loop atual."""
+        loop = asyncio.get_running_loop()
+        if self._semaforo_loop is not loop:
+            self._semaforo = asyncio.Semaphore(self.concorrencia)
+            self._semaforo_loop = loop
+        return self._semaforo
+
+    async def _chamar_llm(self, etapa: str, **kwargs):
+        """
+        Chama chat.completions com limite de concorrência, o prazo e o hedge da etapa e novas tentativas
+
+        Args:
+            etapa (str): "decisao" ou "formatacao"
+            **kwargs: Argumentos para chat.completions.create
+
+        Returns:
+            Resposta de chat.completions.create
+
+        Raises:
+            TempoEsgotadoLLM: O prazo da etapa (ou da tentativa) acabou
+        """
+        semaforo = self._obter_semaforo()
+        timeout_etapa = self.llm.timeouts.get(etapa)
+        prazo_etapa = time.monotonic() + timeout_etapa if timeout_etapa else None
+        for tentativa in range(self.tentativas):
+            if prazo_etapa is not None:
+                prazo = prazo_etapa
+            else:
+                prazo = time.monotonic() + self.timeout if self.timeout else None
+            try:
+                async with semaforo:
+                    return await self.llm.acriar(self.aclient, etapa, prazo, **kwargs)
+            except self.erros_transitorios:
+                if tentativa == self.tentativas - 1 or (prazo_etapa is not None and time.monotonic() >= prazo_etapa):
+                    raise
+                # Full jitter: espera aleatória até o teto exponencial, sem passar do prazo da etapa
+                espera = random.uniform(0, self.backoff_base * 2 ** tentativa)
+                if prazo_etapa is not None:
+                    espera = min(espera, prazo_etapa - time.monotonic())
+                await asyncio.sleep(max(espera, 0))
+
+    async def _adecisao_llm(self, user_message: str, system_prompt: str, chave_cache: str, trace: TurnTrace) -> dict:
+        """Versão assíncrona de _decisao_llm"""
+        with trace.etapa("llm_decisao"):
+            response = await self._chamar_llm(ETAPA_DECISAO, **self._requisicao_decisao(user_message, system_prompt))
+        trace.registrar_uso(response)
+        return self._ler_decisao(response, chave_cache)
+
+    async def _aformatacao_llm(self, turno: dict, trace: TurnTrace) -> str:
+        """Versão assíncrona de _formatacao_llm"""
+        final_response = await self._chamar_llm(
+            ETAPA_FORMATACAO,
+            model=self.model,
+            messages=self._mensagens_formatacao(turno)
+        )
+        trace.registrar_uso(final_response)
+        return final_response.choices[0].message.content
+
+    async def _apreparar_turno(self, user_message: str, trace: TurnTrace, sessao: SessionState = None) -> dict:
+        """
+        Versão assíncrona de _preparar_turno
+
+        Args:
+            user_message (str): Mensagem do usuário
+            trace (TurnTrace): Rastro do turno
+            sessao (SessionState): Conversa do turno (None para uma mensagem avulsa)
+
+        Returns:
+            dict: Turno com a mensagem, a decisão e o resultado da função
+        """
+        snapshot, tags_disponiveis, system_prompt = self._sincronizar_catalogo(user_message)
+        if sessao is not None and sessao.tem_contexto():
+            turno = self._refinar(user_message, sessao, tags_disponiveis, snapshot, trace)
+            if turno is not None:
+                return turno
+            system_prompt = self._com_historico(system_prompt, sessao)
+        with trace.etapa("decisao"):
+            decision_json, origem, chave_cache = self._decisao_sem_llm(
+                user_message, tags_disponiveis, system_prompt, snapshot, trace
+            )
+            if decision_json is None:
+                decision_json, compartilhada = await self.coalescencia.aexecutar(
+                    ("decisao", chave_cache),
+                    lambda: self._adecisao_llm(user_message, system_prompt, chave_cache, trace)
+                )
+                origem = "coalescida" if compartilhada else "llm"
+        trace.origem_decisao = origem
+        turno = self._executar_decisao(user_message, decision_json, origem, tags_disponiveis, snapshot, trace, sessao)
+        turno["tempos"] = trace.tempos
+        return turno
+
+    async def achat_detalhado(self, user_message: str, sessao_id: str = None) -> dict:
+        """
+        Versão assíncrona de chat_detalhado
+
+        Args:
+            user_message (str): Mensagem do usuário
+            sessao_id (str): Id da conversa (veja chat_detalhado)
+
+        Returns:
+            dict: Turno com "resposta", ação, search_params, tempos por etapa e "erro" (se houver)
+        """
+        trace = TurnTrace(user_message, sessao_id)
+        try:
+            turno = await self._apreparar_turno(user_message, trace, self._sessao(sessao_id))
+            with trace.etapa("formatacao"):
+                if self._formatar_localmente(turno):
+                    trace.formatacao = "template"
+                    turno["resposta"] = self.formatador.formatar(turno)
+                else:
+                    turno["resposta"], compartilhada = await self.coalescencia.aexecutar(
+                        self._chave_formatacao(turno), lambda: self._aformatacao_llm(turno, trace)
+                    )
+                    trace.formatacao = "coalescida" if compartilhada else "llm"
+
+        except ErroRespostaEstruturada as e:
+            trace.registrar_erro(e)
+            turno = {
+                "user_message": user_message,
+                "resposta": f"Erro ao processar resposta estruturada: {trace.erro}. Tente novamente!",
+                "erro": trace.erro
+            }
+        except Exception as e:
+            trace.registrar_erro(e)
+            turno = {
+                "user_message": user_message,
+                "resposta": f"Desculpe, ocorreu um erro: {trace.erro}. Tente novamente!",
+                "erro": trace.erro
+            }
+
+        return self._encerrar_turno(trace, turno)
+
+    async def achat(self, user_message: str, sessao_id: str = None) -> str:
+        """
+        Processa uma mensagem do usuário de forma assíncrona
+
+        Args:
+            user_message (str): Mensagem do usuário
+            sessao_id (str): Id da conversa (veja chat_detalhado)
+
+        Returns:
+            str: Resposta do agente
+        """
+        return (await self.achat_detalhado(user_message, sessao_id))["resposta"]
+
+    async def abatch(self, user_messages: List[str]) -> List[str]:
+        """
+        Processa várias mensagens em paralelo, respeitando o limite de concorrência
+
+        Args:
+            user_messages (List[str]): Mensagens dos usuários
+
+        Returns:
+            List[str]: Respostas na mesma ordem das mensagens
+        """
+        return await asyncio.gather(*(self.achat(mensagem) for mensagem in user_messages))
+
+    def batch(self, user_messages: List[str]) -> List[str]:
+        """
+        Atalho síncrono para abatch, para uso fora de um event loop
+
+        Args:
+            user_messages (List[str]): Mensagens dos usuários
+
+        Returns:
+            List[str]: Respostas na mesma ordem das mensagens
+        """
+        return asyncio.run(self.abatch(user_messages))
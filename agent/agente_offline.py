@@ -0,0 +1,23 @@
+from .agent_executor import MealRecommendationAgent
+from .formatador import MODO_TEMPLATE
+from .llm_local import LLMStub, StubLLMClient
+
+
+class OfflineMealAgent(MealRecommendationAgent):
+    """
+    Agente de demonstração que funciona sem a API da OpenAI.
+
+    Usa o LLM local (gravações ou respostas sintetizadas pelo parser) no lugar
+    do cliente da OpenAI e formata as respostas com os templates locais.
+    """
+
+    def __init__(self, stub: LLMStub = None, **kwargs):
+        """
+        Inicializa o agente offline
+
+        Args:
+            stub (LLMStub): LLM local; o padrão sintetiza as decisões com o parser local
+            **kwargs: Demais opções de MealRecommendationAgent
+        """
+        kwargs.setdefault("modo_formatacao", MODO_TEMPLATE)
+        super().__init__(client=StubLLMClient(stub), **kwargs)
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .tools.indice_texto import normalizar_texto
+
+_NAO_ALFANUMERICO = re.compile(r'[^\w]+')
+
+
+def normalizar_consulta(texto: str) -> str:
+    """
+    Normaliza a mensagem do usuário para uso como chave de cache.
+
+    Args:
+        texto (str): Mensagem original
+
+    Returns:
+        str: Texto sem acentos, em minúsculas e sem pontuação
+             ("Quero o prato mais barato!" → "quero o prato mais barato")
+    """
+    return _NAO_ALFANUMERICO.sub(' ', normalizar_texto(texto)).strip()
+
+
+class DecisionCache:
+    """
+    Cache das decisões da primeira chamada ao LLM (ação + search_params).
+
+    A chave combina a mensagem normalizada, o hash do system prompt e o hash do
+    conteúdo do catálogo, então uma mudança de prompt ou de catálogo invalida as
+    entradas antigas sem precisar apagá-las. Há uma camada LRU com TTL em
+    memória e, opcionalmente, uma camada persistente em SQLite compartilhada
+    entre processos.
+    """
+
+    def __init__(self, capacidade: int = 1024, ttl: float = 3600, caminho_sqlite: str = None):
+        """
+        Args:
+            capacidade (int): Máximo de decisões na camada em memória
+            ttl (float): Validade de cada decisão, em segundos
+            caminho_sqlite (str): Arquivo SQLite da camada persistente (opcional)
+        """
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits_memoria = 0
+        self.hits_sqlite = 0
+        self.misses = 0
+
+        self._sqlite = None
+        if caminho_sqlite:
+            self._sqlite = sqlite3.connect(caminho_sqlite, check_same_thread=False)
+            with self._sqlite:
+                self._sqlite.execute(
+                    "CREATE TABLE IF NOT EXISTS decisoes "
+                    "(chave TEXT PRIMARY KEY, decisao TEXT NOT NULL, expira_em REAL NOT NULL)"
+                )
+                self._sqlite.execute("CREATE INDEX IF NOT EXISTS decisoes_expira_em ON decisoes (expira_em)")
+
+    @staticmethod
+    def chave(user_message: str, system_prompt: str, snapshot) -> str:
+        """
+        Monta a chave de cache de uma mensagem.
+
+        Args:
+            user_message (str): Mensagem do usuário
+            system_prompt (str): System prompt usado na decisão
+            snapshot (CatalogSnapshot): Versão do catálogo do turno
+
+        Returns:
+            str: Chave SHA-256
+        """
+        partes = [
+            normalizar_consulta(user_message),
+            hashlib.sha256(system_prompt.encode('utf-8')).hexdigest(),
+            snapshot.hash_conteudo or '',
+            '|'.join(sorted(snapshot.tags)),
+        ]
+        return hashlib.sha256('\x00'.join(partes).encode('utf-8')).hexdigest()
+
+    def get(self, chave: str):
+        """
+        Busca uma decisão válida no cache.
+
+        Args:
+            chave (str): Chave gerada por `chave`
+
+        Returns:
+            dict: Decisão armazenada ou None
+        """
+        agora = time.time()
+        with self._lock:
+            entrada = self._memoria.get(chave)
+            if entrada is not None:
+                expira_em, decisao = entrada
+                if expira_em > agora:
+                    self._memoria.move_to_end(chave)
+                    self.hits_memoria += 1
+                    return json.loads(decisao)
+                del self._memoria[chave]
+
+            if self._sqlite is not None:
+                linha = self._sqlite.execute(
+                    "SELECT decisao, expira_em FROM decisoes WHERE chave = ?", (chave,)
+                ).fetchone()
+                if linha is not None and linha[1] > agora:
+                    self._guardar_memoria(chave, linha[0], linha[1])
+                    self.hits_sqlite += 1
+                    return json.loads(linha[0])
+
+            self.misses += 1
+            return None
+
+    def put(self, chave: str, decisao: dict):
+        """
+        Armazena uma decisão nas camadas configuradas.
+
+        Args:
+            chave (str): Chave gerada por `chave`
+            decisao (dict): Decisão já validada
+        """
+        serializada = json.dumps(decisao, ensure_ascii=False)
+        expira_em = time.time() + self.ttl
+        with self._lock:
+            self._guardar_memoria(chave, serializada, expira_em)
+            if self._sqlite is not None:
+                with self._sqlite:
+                    self._sqlite.execute(
+                        "INSERT OR REPLACE INTO decisoes (chave, decisao, expira_em) VALUES (?, ?, ?)",
+                        (chave, serializada, expira_em)
+                    )
+                    self._sqlite.execute("DELETE FROM decisoes WHERE expira_em <= ?", (time.time(),))
+
+    def _guardar_memoria(self, chave: str, serializada: str, expira_em: float):
+        self._memoria[chave] = (expira_em, serializada)
+        self._memoria.move_to_end(chave)
+        while len(self._memoria) > self.capacidade:
+            self._memoria.popitem(last=False)
+
+    def clear(self):
+        """Remove todas as decisões armazenadas."""
+        with self._lock:
+            self._memoria.clear()
+            if self._sqlite is not None:
+                with self._sqlite:
+                    self._sqlite.execute("DELETE FROM decisoes")
+
+    def estatisticas(self) -> dict:
+        """
+        Contadores de uso do cache.
+
+        Returns:
+            dict: Hits por camada, misses, taxa de acerto e tamanho em memória
+        """
+        with self._lock:
+            hits = self.hits_memoria + self.hits_sqlite
+            total = hits + self.misses
+            return {
+                "hits_memoria": self.hits_memoria,
+                "hits_sqlite": self.hits_sqlite,
+                "misses": self.misses,
+                "hit_rate": round(hits / total, 4) if total else 0.0,
+                "itens_memoria": len(self._memoria)
+            }
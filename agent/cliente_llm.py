@@ -0,0 +1,309 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    from openai import APIConnectionError
+except ImportError:
+    APIConnectionError = ConnectionError
+
+ETAPA_DECISAO = "decisao"
+ETAPA_FORMATACAO = "formatacao"
+
+# Hedges que podem ficar guardados para uma rajada de respostas lentas
+SALDO_HEDGES_MAX = 10.0
+
+# Espera base entre as novas tentativas feitas dentro do prazo, em segundos
+BACKOFF_BASE = 0.5
+
+# Erros sem status HTTP que valem uma nova tentativa
+ERROS_CONEXAO = (APIConnectionError, ConnectionError, TimeoutError)
+
+
+class TempoEsgotadoLLM(TimeoutError):
+    """A chamada ao LLM não respondeu dentro do tempo limite da etapa."""
+
+
+def _transitorio(erro: Exception) -> bool:
+    """Indica se o erro vale uma nova tentativa (conexão, 408, 409, 429 e 5xx, como no cliente da OpenAI)."""
+    status = getattr(erro, "status_code", None)
+    if status is None:
+        return isinstance(erro, ERROS_CONEXAO)
+    return status in (408, 409, 429) or status >= 500
+
+
+def criar_cliente_openai(api_key: str, timeout: float = None, conexoes: int = None, conexoes_ociosas: int = None,
+                         keepalive: float = None, tentativas: int = None):
+    """
+    Cria o cliente da OpenAI com um pool de conexões keep-alive dimensionado.
+
+    O pool vai num DefaultHttpxClient, que mantém os padrões do pacote openai
+    (timeout de conexão de 5 s, redirecionamentos); o timeout de cada
+    requisição é o `timeout` do cliente. Sem o httpx (dependência do pacote
+    openai) o cliente usa o pool padrão.
+
+    Args:
+        api_key (str): Chave da API da OpenAI
+        timeout (float): Tempo máximo de cada requisição HTTP, em segundos
+        conexoes (int): Máximo de conexões abertas. Padrão: LLM_CONEXOES ou 100.
+        conexoes_ociosas (int): Conexões keep-alive mantidas abertas sem uso.
+            Padrão: LLM_CONEXOES_OCIOSAS ou 20.
+        keepalive (float): Segundos que uma conexão ociosa fica aberta.
+            Padrão: LLM_KEEPALIVE ou 30.
+        tentativas (int): Novas tentativas do próprio cliente em erros transitórios.
+            Padrão: LLM_TENTATIVAS ou 2.
+
+    Returns:
+        OpenAI: Cliente síncrono
+    """
+    from openai import DefaultHttpxClient, OpenAI
+
+    if tentativas is None:
+        tentativas = int(os.getenv('LLM_TENTATIVAS', '2'))
+    opcoes = {"api_key": api_key, "max_retries": tentativas}
+    if timeout:
+        opcoes["timeout"] = timeout
+    if httpx is not None:
+        limites = httpx.Limits(
+            max_connections=conexoes or int(os.getenv('LLM_CONEXOES', '100')),
+            max_keepalive_connections=conexoes_ociosas or int(os.getenv('LLM_CONEXOES_OCIOSAS', '20')),
+            keepalive_expiry=keepalive or float(os.getenv('LLM_KEEPALIVE', '30')),
+        )
+        opcoes["http_client"] = DefaultHttpxClient(limits=limites)
+    return OpenAI(**opcoes)
+
+
+class HedgedClient:
+    """
+    Chamadas ao LLM com tempo limite por etapa e requisições "hedged".
+
+    Cada chamada roda numa thread do pool e tem um prazo total (`timeouts`
+    por etapa, incluindo as novas tentativas). Cada requisição leva o tempo
+    que falta do prazo como `timeout` e vai por uma cópia do cliente sem novas
+    tentativas próprias (`max_retries=0`): as novas tentativas dos erros
+    transitórios são feitas aqui, enquanto houver prazo, e uma requisição
+    descartada termina junto com ele em vez de ocupar a thread. Esgotado o
+    prazo, levanta TempoEsgotadoLLM. Com um atraso de hedge na etapa, uma
+    cópia da requisição é enviada quando a primeira passa desse tempo e vale a
+    resposta que chegar primeiro. Os hedges são limitados a `taxa_hedge` por
+    chamada: cada chamada acumula esse saldo (até SALDO_HEDGES_MAX) e cada
+    hedge gasta um.
+
+    Streams não recebem hedge nem prazo (o tempo limite é o do cliente HTTP),
+    pois não há como trocar de resposta depois dos primeiros trechos.
+
+    `acriar` aplica a mesma política (prazo, hedge e saldo de hedges) a uma
+    tentativa num cliente assíncrono; as novas tentativas ficam com quem chama.
+    """
+
+    def __init__(self, client, timeouts: dict = None, atrasos_hedge: dict = None, taxa_hedge: float = 0.05,
+                 max_paralelas: int = 64, tentativas: int = None):
+        """
+        Args:
+            client: Backend do LLM com a interface `chat.completions.create`
+            timeouts (dict): Segundos por etapa ("decisao", "formatacao"); None = sem prazo
+            atrasos_hedge (dict): Segundos por etapa até enviar a cópia; ausente ou 0 = sem hedge
+            taxa_hedge (float): Máximo de hedges por chamada (ex.: 0.05 = até 5% a mais de requisições)
+            max_paralelas (int): Threads do pool, ou seja, requisições em andamento ao mesmo tempo
+            tentativas (int): Novas tentativas dentro do prazo após um erro transitório.
+                Padrão: as do cliente (`max_retries`), ou 0.
+        """
+        self.client = client
+        if tentativas is None:
+            tentativas = getattr(client, "max_retries", 0)
+        self.tentativas = tentativas
+        # Dentro do prazo quem tenta de novo é o HedgedClient, não o cliente
+        with_options = getattr(client, "with_options", None)
+        self._cliente_prazo = with_options(max_retries=0) if with_options is not None else client
+        self.timeouts = dict(timeouts or {})
+        self.atrasos_hedge = dict(atrasos_hedge or {})
+        self.taxa_hedge = taxa_hedge
+        self._executor = ThreadPoolExecutor(max_paralelas, thread_name_prefix="llm")
+        self._lock = threading.Lock()
+        self._saldo = 0.0
+        self.chamadas = {}
+        self.hedges = {}
+        self.hedges_vencedores = 0
+        self.hedges_negados = 0
+        self.timeouts_esgotados = {}
+
+    def estatisticas(self) -> dict:
+        """Contadores de chamadas, hedges (enviados, vencedores, negados pelo limite) e timeouts por etapa."""
+        with self._lock:
+            chamadas = sum(self.chamadas.values())
+            hedges = sum(self.hedges.values())
+            dados = {
+                "chamadas": chamadas,
+                "hedges": hedges,
+                "hedges_vencedores": self.hedges_vencedores,
+                "hedges_negados": self.hedges_negados,
+                "taxa_hedge": round(hedges / chamadas, 4) if chamadas else 0.0,
+                "timeouts": sum(self.timeouts_esgotados.values()),
+            }
+            for etapa, quantidade in self.hedges.items():
+                dados[f"hedges_{etapa}"] = quantidade
+            for etapa, quantidade in self.timeouts_esgotados.items():
+                dados[f"timeouts_{etapa}"] = quantidade
+            return dados
+
+    def _reservar_hedge(self, etapa: str) -> bool:
+        """Gasta um hedge do saldo, se houver."""
+        with self._lock:
+            if self._saldo < 1.0:
+                self.hedges_negados += 1
+                return False
+            self._saldo -= 1.0
+            self.hedges[etapa] = self.hedges.get(etapa, 0) + 1
+            return True
+
+    def _enviar(self, kwargs: dict, prazo: float):
+        """Envia uma requisição ao pool, com o tempo que falta do prazo como timeout."""
+        if prazo is None:
+            return self._executor.submit(self.client.chat.completions.create, **kwargs)
+        restante = max(prazo - time.monotonic(), 0.001)
+        return self._executor.submit(self._cliente_prazo.chat.completions.create, **dict(kwargs, timeout=restante))
+
+    def criar(self, etapa: str, **kwargs):
+        """
+        Chama `chat.completions.create` com o prazo e o hedge da etapa.
+
+        Args:
+            etapa (str): "decisao" ou "formatacao"
+            **kwargs: Argumentos para chat.completions.create
+
+        Returns:
+            Resposta de chat.completions.create (a primeira que chegar)
+
+        Raises:
+            TempoEsgotadoLLM: Nenhuma resposta dentro do prazo da etapa
+            Exception: O erro do cliente, quando todas as requisições falham
+        """
+        with self._lock:
+            self.chamadas[etapa] = self.chamadas.get(etapa, 0) + 1
+            self._saldo = min(SALDO_HEDGES_MAX, self._saldo + self.taxa_hedge)
+
+        timeout = self.timeouts.get(etapa)
+        atraso = self.atrasos_hedge.get(etapa)
+        if kwargs.get("stream") or (not timeout and not atraso):
+            return self.client.chat.completions.create(**kwargs)
+
+        prazo = time.monotonic() + timeout if timeout else None
+        pendentes = {self._enviar(kwargs, prazo)}
+        hedge = None
+        if atraso and (prazo is None or atraso < timeout):
+            prontas, _ = wait(pendentes, timeout=atraso)
+            if not prontas and self._reservar_hedge(etapa):
+                hedge = self._enviar(kwargs, prazo)
+                pendentes.add(hedge)
+
+        erro = None
+        tentativa = 0
+        while pendentes:
+            restante = None if prazo is None else prazo - time.monotonic()
+            if restante is not None and restante <= 0:
+                break
+            prontas, pendentes = wait(pendentes, timeout=restante, return_when=FIRST_COMPLETED)
+            for futura in prontas:
+                if futura.exception() is None:
+                    for perdedora in pendentes:
+                        perdedora.cancel()
+                    if futura is hedge:
+                        with self._lock:
+                            self.hedges_vencedores += 1
+                    return futura.result()
+                erro = futura.exception()
+            if not pendentes and prazo is not None and tentativa < self.tentativas and _transitorio(erro):
+                # Backoff exponencial com jitter, sem passar do prazo
+                espera = min(random.uniform(0, BACKOFF_BASE * 2 ** tentativa), prazo - time.monotonic())
+                tentativa += 1
+                if espera > 0:
+                    time.sleep(espera)
+                if time.monotonic() < prazo:
+                    pendentes = {self._enviar(kwargs, prazo)}
+
+        # A requisição que leva o prazo como timeout pode falhar junto com ele
+        if pendentes or (prazo is not None and time.monotonic() >= prazo):
+            with self._lock:
+                self.timeouts_esgotados[etapa] = self.timeouts_esgotados.get(etapa, 0) + 1
+            raise TempoEsgotadoLLM(f"o LLM não respondeu à etapa {etapa} em {timeout:g}s")
+        raise erro
+
+    async def acriar(self, aclient, etapa: str, prazo: float = None, **kwargs):
+        """
+        Versão assíncrona de `criar` para uma tentativa, com o hedge da etapa.
+
+        Args:
+            aclient: Backend assíncrono com a interface `chat.completions.create`
+            etapa (str): "decisao" ou "formatacao"
+            prazo (float): Instante (time.monotonic) em que a tentativa desiste; None = sem prazo
+            **kwargs: Argumentos para chat.completions.create
+
+        Returns:
+            Resposta de chat.completions.create (a primeira que chegar)
+
+        Raises:
+            TempoEsgotadoLLM: Nenhuma resposta até o prazo
+            Exception: O erro do cliente, quando todas as requisições falham
+        """
+        with self._lock:
+            self.chamadas[etapa] = self.chamadas.get(etapa, 0) + 1
+            self._saldo = min(SALDO_HEDGES_MAX, self._saldo + self.taxa_hedge)
+
+        atraso = self.atrasos_hedge.get(etapa)
+        if kwargs.get("stream") or (prazo is None and not atraso):
+            return await aclient.chat.completions.create(**kwargs)
+
+        def enviar():
+            if prazo is None:
+                return asyncio.ensure_future(aclient.chat.completions.create(**kwargs))
+            restante = max(prazo - time.monotonic(), 0.001)
+            return asyncio.ensure_future(aclient.chat.completions.create(**dict(kwargs, timeout=restante)))
+
+        inicio = time.monotonic()
+        pendentes = {enviar()}
+        hedge = None
+        try:
+            if atraso and (prazo is None or inicio + atraso < prazo):
+                prontas, _ = await asyncio.wait(pendentes, timeout=atraso)
+                if not prontas and self._reservar_hedge(etapa):
+                    hedge = enviar()
+                    pendentes.add(hedge)
+
+            erro = None
+            while pendentes:
+                restante = None if prazo is None else prazo - time.monotonic()
+                if restante is not None and restante <= 0:
+                    break
+                prontas, pendentes = await asyncio.wait(pendentes, timeout=restante,
+                                                        return_when=asyncio.FIRST_COMPLETED)
+                # Lê o erro de todas as prontas, para nenhum ficar sem ser recuperado
+                erros = {tarefa: tarefa.exception() for tarefa in prontas}
+                for tarefa, erro_tarefa in erros.items():
+                    if erro_tarefa is None:
+                        if tarefa is hedge:
+                            with self._lock:
+                                self.hedges_vencedores += 1
+                        return tarefa.result()
+                    erro = erro_tarefa
+
+            if pendentes or (prazo is not None and time.monotonic() >= prazo):
+                with self._lock:
+                    self.timeouts_esgotados[etapa] = self.timeouts_esgotados.get(etapa, 0) + 1
+                raise TempoEsgotadoLLM(f"o LLM não respondeu à etapa {etapa} em {prazo - inicio:.3g}s")
+            raise erro
+        finally:
+            # Ao contrário das threads, as requisições descartadas são canceladas de fato
+            for tarefa in pendentes:
+                tarefa.cancel()
+
+    def fechar(self):
+        """Encerra o pool de threads sem esperar as requisições descartadas."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
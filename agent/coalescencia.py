@@ -0,0 +1,199 @@
+import asyncio
+import threading
+
+
+class TempoEsgotadoCoalescencia(TimeoutError):
+    """A chamada idêntica em andamento não terminou dentro do tempo de espera."""
+
+
+class _Voo:
+    """Uma execução em andamento, que outras chamadas com a mesma chave aguardam."""
+
+    __slots__ = ('evento', 'resultado', 'erro', 'abandonado')
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.erro = None
+        self.abandonado = False
+
+
+class SingleFlight:
+    """
+    Junta chamadas idênticas e simultâneas numa única execução ("single flight").
+
+    A primeira chamada com uma chave executa a função; as que chegam enquanto
+    ela está em andamento esperam e recebem o mesmo resultado, ou a mesma
+    exceção. Quem espera desiste depois de `timeout` segundos
+    (TempoEsgotadoCoalescencia), sem interromper a execução. Se a execução
+    for abandonada sem resultado (ex.: o consumidor de um stream parou de
+    ler), uma das chamadas em espera assume e executa de novo.
+
+    Nada é guardado depois que a execução termina: chamadas posteriores
+    executam de novo (o cache de decisões cuida da reutilização).
+    """
+
+    def __init__(self, timeout: float = 30.0):
+        """
+        Args:
+            timeout (float): Segundos que uma chamada espera pela execução em andamento
+        """
+        self.timeout = timeout
+        self._voos = {}
+        self._tarefas = {}
+        self._lock = threading.Lock()
+        self.execucoes = 0
+        self.coalescidas = 0
+        self.timeouts = 0
+        self.erros_compartilhados = 0
+        self.abandonos = 0
+
+    def estatisticas(self) -> dict:
+        """Contadores de execuções, chamadas coalescidas, timeouts e erros repassados."""
+        with self._lock:
+            return {
+                "execucoes": self.execucoes,
+                "coalescidas": self.coalescidas,
+                "timeouts": self.timeouts,
+                "erros_compartilhados": self.erros_compartilhados,
+                "abandonos": self.abandonos,
+                "em_andamento": len(self._voos) + len(self._tarefas),
+            }
+
+    def entrar(self, chave):
+        """
+        Entra na execução de uma chave.
+
+        Args:
+            chave: Identificador (hashable) da chamada
+
+        Returns:
+            tuple: (voo, True) se quem chamou deve executar e depois chamar
+                   `concluir`, `falhar` ou `abandonar`; (resultado, False) se
+                   outra chamada já executou
+
+        Raises:
+            TempoEsgotadoCoalescencia: A execução em andamento demorou mais que `timeout`
+            Exception: A mesma exceção da execução em andamento
+        """
+        while True:
+            with self._lock:
+                voo = self._voos.get(chave)
+                if voo is None:
+                    voo = self._voos[chave] = _Voo()
+                    self.execucoes += 1
+                    return voo, True
+                self.coalescidas += 1
+
+            if not voo.evento.wait(self.timeout):
+                with self._lock:
+                    self.timeouts += 1
+                raise TempoEsgotadoCoalescencia(
+                    f"a chamada idêntica em andamento não terminou em {self.timeout:g}s"
+                )
+            if voo.abandonado:
+                with self._lock:
+                    self.coalescidas -= 1
+                continue
+            if voo.erro is not None:
+                with self._lock:
+                    self.erros_compartilhados += 1
+                raise voo.erro
+            return voo.resultado, False
+
+    def _encerrar(self, chave, voo: _Voo):
+        with self._lock:
+            if self._voos.get(chave) is voo:
+                del self._voos[chave]
+        voo.evento.set()
+
+    def concluir(self, chave, voo: _Voo, resultado):
+        """Publica o resultado para as chamadas em espera."""
+        voo.resultado = resultado
+        self._encerrar(chave, voo)
+
+    def falhar(self, chave, voo: _Voo, erro: Exception):
+        """Repassa a exceção da execução para as chamadas em espera."""
+        voo.erro = erro
+        self._encerrar(chave, voo)
+
+    def abandonar(self, chave, voo: _Voo):
+        """Encerra sem resultado; uma das chamadas em espera executa de novo."""
+        voo.abandonado = True
+        with self._lock:
+            self.abandonos += 1
+        self._encerrar(chave, voo)
+
+    def executar(self, chave, funcao) -> tuple:
+        """
+        Executa `funcao()` ou aguarda a execução idêntica em andamento.
+
+        Args:
+            chave: Identificador (hashable) da chamada
+            funcao (callable): Função sem argumentos
+
+        Returns:
+            tuple: (resultado, compartilhado) — compartilhado é True quando o
+                   resultado veio da execução de outra chamada
+        """
+        voo, lider = self.entrar(chave)
+        if not lider:
+            return voo, True
+        try:
+            resultado = funcao()
+        except Exception as erro:
+            self.falhar(chave, voo, erro)
+            raise
+        except BaseException:
+            # KeyboardInterrupt, GeneratorExit...: não é um erro da chamada em si
+            self.abandonar(chave, voo)
+            raise
+        self.concluir(chave, voo, resultado)
+        return resultado, False
+
+    async def aexecutar(self, chave, fabrica) -> tuple:
+        """
+        Versão assíncrona de `executar`, para chamadas no mesmo event loop.
+
+        A execução roda numa task própria: se quem a iniciou for cancelado,
+        as chamadas em espera continuam recebendo o resultado.
+
+        Args:
+            chave: Identificador (hashable) da chamada
+            fabrica (callable): Função sem argumentos que cria a corrotina
+
+        Returns:
+            tuple: (resultado, compartilhado)
+        """
+        loop = asyncio.get_running_loop()
+        chave_loop = (loop, chave)
+        with self._lock:
+            tarefa = self._tarefas.get(chave_loop)
+            lider = tarefa is None
+            if lider:
+                tarefa = self._tarefas[chave_loop] = loop.create_task(fabrica())
+                tarefa.add_done_callback(lambda _: self._remover_tarefa(chave_loop, tarefa))
+                self.execucoes += 1
+            else:
+                self.coalescidas += 1
+
+        if lider:
+            return await asyncio.shield(tarefa), False
+        # asyncio.wait não cancela a tarefa ao esgotar o tempo, e um TimeoutError
+        # da própria execução não se confunde com o da espera
+        concluidas, _ = await asyncio.wait({tarefa}, timeout=self.timeout)
+        if not concluidas:
+            with self._lock:
+                self.timeouts += 1
+            raise TempoEsgotadoCoalescencia(
+                f"a chamada idêntica em andamento não terminou em {self.timeout:g}s"
+            )
+        if not tarefa.cancelled() and tarefa.exception() is not None:
+            with self._lock:
+                self.erros_compartilhados += 1
+        return tarefa.result(), True
+
+    def _remover_tarefa(self, chave_loop, tarefa):
+        with self._lock:
+            if self._tarefas.get(chave_loop) is tarefa:
+                del self._tarefas[chave_loop]
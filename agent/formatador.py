@@ -0,0 +1,151 @@
+from .tools.restricoes import resumir_violacao
+
+MODO_LLM = 'llm'
+MODO_TEMPLATE = 'template'
+MODO_AUTO = 'auto'
+
+ACOES_COM_TEMPLATE = ("search_catalog", "get_cheapest_item", "get_most_expensive_item", "get_price_range",
+                      "get_cheapest_item_by_tags", "get_most_expensive_item_by_tags", "get_price_range_by_tags")
+
+TEMPLATES_PADRAO = {
+    "item": "**{nome}** - {preco}\n{descricao}",
+    "violacoes": "_Não atende: {violacoes}_",
+    "search_catalog": "Aqui estão {quantidade} opções que encontrei para você:\n\n{itens}\n\nEspero que alguma delas te agrade! 😊",
+    "search_catalog_um": "Encontrei esta opção para você:\n\n{itens}\n\nEspero que te agrade! 😊",
+    "search_catalog_relaxado": (
+        "Não encontrei pratos que atendessem a todos os critérios. "
+        "Estas são as opções mais próximas:\n\n{itens}\n\nSe quiser, posso procurar com outros critérios."
+    ),
+    "sem_resultados": (
+        "Não encontrei pratos que atendam ao seu pedido. "
+        "Que tal tentar com menos restrições ou um orçamento maior?"
+    ),
+    "get_cheapest_item": "O prato mais barato do cardápio é {item}\n\nUma ótima opção para economizar! 😊",
+    "get_most_expensive_item": "O prato mais caro do cardápio é {item}\n\nUma escolha especial! 😊",
+    "get_price_range": (
+        "Os pratos do cardápio custam de {min_price} a {max_price}, "
+        "com preço médio de {avg_price} ({total_items} pratos no total)."
+    ),
+    "get_cheapest_item_by_tags": "O prato {tags} mais barato do cardápio é {item}\n\nUma ótima opção para economizar! 😊",
+    "get_most_expensive_item_by_tags": "O prato {tags} mais caro do cardápio é {item}\n\nUma escolha especial! 😊",
+    "get_price_range_by_tags": (
+        "Os pratos {tags} do cardápio custam de {min_price} a {max_price}, "
+        "com preço médio de {avg_price} ({total_items} pratos no total)."
+    ),
+    "sem_tags": "Não encontrei pratos {tags} no cardápio. Quer que eu procure outra opção?",
+    "catalogo_vazio": "O cardápio está vazio no momento. Tente novamente mais tarde!",
+    "erro": "Desculpe, não consegui consultar o cardápio agora: {error}. Tente novamente!",
+}
+
+
+def formatar_preco(valor: float) -> str:
+    """
+    Formata um valor em reais no padrão brasileiro.
+
+    Args:
+        valor (float): Preço
+
+    Returns:
+        str: Preço formatado ("R$ 38,00")
+    """
+    return f"R$ {valor:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.')
+
+
+def _juntar(tags: list) -> str:
+    """["vegano", "picante", "sem lactose"] → "vegano, picante e sem lactose"."""
+    return " e ".join([", ".join(tags[:-1]), tags[-1]] if len(tags) > 1 else tags)
+
+
+class TemplateFormatter:
+    """
+    Formatador local da resposta final, alternativa à segunda chamada ao LLM.
+
+    Cobre as ações determinísticas (busca, mais barato, mais caro e faixa de
+    preços, no catálogo inteiro ou por tags), incluindo as variantes sem resultado e com itens aproximados. Os
+    textos podem ser trocados passando outro dicionário de templates.
+    """
+
+    def __init__(self, templates: dict = None):
+        """
+        Args:
+            templates (dict): Templates que substituem os de TEMPLATES_PADRAO
+        """
+        self.templates = {**TEMPLATES_PADRAO, **(templates or {})}
+
+    def _item(self, item: dict) -> str:
+        texto = self.templates["item"].format(
+            nome=item["nome"], preco=formatar_preco(item["preco"]), descricao=item["descricao"]
+        )
+        if item.get("violacoes"):
+            texto += "\n" + self.templates["violacoes"].format(
+                violacoes="; ".join(resumir_violacao(violacao) for violacao in item["violacoes"])
+            )
+        return texto
+
+    def pode_formatar(self, turno: dict) -> bool:
+        """
+        Indica se o turno tem template local.
+
+        Args:
+            turno (dict): Turno preparado pelo agente
+
+        Returns:
+            bool: True para as ações determinísticas conhecidas
+        """
+        return turno["action"] in ACOES_COM_TEMPLATE
+
+    def formatar(self, turno: dict) -> str:
+        """
+        Formata a resposta de um turno preparado pelo agente.
+
+        Args:
+            turno (dict): Turno com `action`, `function_result` e `relaxado`
+
+        Returns:
+            str: Resposta para o usuário
+        """
+        resultado = turno["function_result"]
+        if not resultado.get("success"):
+            return self.templates["erro"].format(error=resultado.get("error", "erro desconhecido"))
+
+        action = turno["action"]
+        if action == "search_catalog":
+            itens = resultado.get("results", [])
+            if not itens:
+                return self.templates["sem_resultados"]
+            texto_itens = "\n\n".join(self._item(item) for item in itens)
+            if turno.get("relaxado"):
+                chave = "search_catalog_relaxado"
+            elif len(itens) == 1:
+                chave = "search_catalog_um"
+            else:
+                chave = "search_catalog"
+            return self.templates[chave].format(itens=texto_itens, quantidade=len(itens))
+
+        if action in ("get_cheapest_item", "get_most_expensive_item"):
+            item = resultado.get("result")
+            if not item:
+                return self.templates["catalogo_vazio"]
+            return self.templates[action].format(item=self._item(item))
+
+        if action in ("get_cheapest_item_by_tags", "get_most_expensive_item_by_tags"):
+            tags = _juntar(resultado.get("tags", []))
+            item = resultado.get("result")
+            if not item:
+                return self.templates["sem_tags"].format(tags=tags)
+            return self.templates[action].format(item=self._item(item), tags=tags)
+
+        if action in ("get_price_range", "get_price_range_by_tags"):
+            tags = _juntar(resultado.get("tags", []))
+            faixa = resultado.get("result") or {}
+            if not faixa.get("total_items"):
+                return self.templates["sem_tags"].format(tags=tags) if tags else self.templates["catalogo_vazio"]
+            return self.templates[action].format(
+                min_price=formatar_preco(faixa["min_price"]),
+                max_price=formatar_preco(faixa["max_price"]),
+                avg_price=formatar_preco(faixa["avg_price"]),
+                total_items=faixa["total_items"],
+                tags=tags
+            )
+
+        return self.templates["erro"].format(error=f"ação '{action}' não suportada")
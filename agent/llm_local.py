@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM local que fala o protocolo de chat.completions, para testes e benchmarks sem rede
+
+Responde com gravações (indexadas pelo hash da requisição) e, quando não há
+gravação, grava a resposta de um LLM real (modo gravação) ou sintetiza uma
+resposta com o parser local. Latência e erros podem ser injetados para medir a
+vazão e a latência de cauda do pipeline inteiro.
+
+Pode ser usado em processo (StubLLMClient / AsyncStubLLMClient, no lugar do
+cliente da OpenAI) ou como servidor HTTP:
+
+    python -m agent.llm_local --porta 8099 --gravacoes gravacoes.jsonl --latencia-ms 400 --taxa-erro 0.01
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 python avaliar_lote.py consultas.jsonl resultados.jsonl
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+# Campos que não mudam o conteúdo da resposta e ficam fora do hash
+CAMPOS_IGNORADOS_CHAVE = ("stream", "stream_options", "user", "timeout")
+
+TAMANHO_PEDACO_STREAM = 24
+
+
+class ErroLLMSimulado(Exception):
+    """Erro injetado pelo LLM local (equivale a um 5xx/429 da API, ou 408 ao passar do `timeout` da requisição)."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Erro simulado do LLM local (HTTP {status_code})")
+        self.status_code = status_code
+
+
+def chave_requisicao(corpo: dict) -> str:
+    """
+    Hash de uma requisição de chat.completions.
+
+    Args:
+        corpo (dict): Argumentos da chamada (model, messages, response_format...)
+
+    Returns:
+        str: SHA-256 do JSON canônico, sem os campos de CAMPOS_IGNORADOS_CHAVE
+    """
+    relevante = {campo: valor for campo, valor in corpo.items() if campo not in CAMPOS_IGNORADOS_CHAVE}
+    canonico = json.dumps(relevante, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonico.encode('utf-8')).hexdigest()
+
+
+def _como_dict(resposta):
+    """Converte a resposta de um cliente (OpenAI ou StubLLMClient) em dicionário."""
+    for metodo in ("model_dump", "to_dict"):
+        if hasattr(resposta, metodo):
+            return getattr(resposta, metodo)()
+    if isinstance(resposta, SimpleNamespace):
+        resposta = vars(resposta)
+    if isinstance(resposta, dict):
+        return {chave: _como_dict(valor) for chave, valor in resposta.items()}
+    if isinstance(resposta, list):
+        return [_como_dict(valor) for valor in resposta]
+    return resposta
+
+
+def _como_objeto(valor):
+    """Dicionários → objetos com atributos, como os do cliente OpenAI."""
+    if isinstance(valor, dict):
+        return SimpleNamespace(**{chave: _como_objeto(item) for chave, item in valor.items()})
+    if isinstance(valor, list):
+        return [_como_objeto(item) for item in valor]
+    return valor
+
+
+class GravacoesLLM:
+    """
+    Respostas gravadas, uma por linha de um arquivo JSONL.
+
+    Cada linha tem `chave`, `requisicao` e `resposta`; a última gravação de uma
+    chave prevalece. Sem caminho, as gravações ficam só em memória.
+    """
+
+    def __init__(self, caminho: str = None):
+        """
+        Args:
+            caminho (str): Arquivo JSONL das gravações (criado se não existir)
+        """
+        self.caminho = caminho
+        self._respostas = {}
+        self._lock = threading.Lock()
+        if caminho and os.path.exists(caminho):
+            with open(caminho, 'r', encoding='utf-8') as file:
+                for linha in file:
+                    try:
+                        registro = json.loads(linha)
+                        self._respostas[registro["chave"]] = registro["resposta"]
+                    except (json.JSONDecodeError, KeyError, TypeError):
+                        continue
+
+    def __len__(self) -> int:
+        return len(self._respostas)
+
+    def get(self, chave: str):
+        return self._respostas.get(chave)
+
+    def put(self, chave: str, requisicao: dict, resposta: dict):
+        with self._lock:
+            self._respostas[chave] = resposta
+            if self.caminho:
+                linha = json.dumps({"chave": chave, "requisicao": requisicao, "resposta": resposta}, ensure_ascii=False)
+                with open(self.caminho, 'a', encoding='utf-8') as file:
+                    file.write(linha + '\n')
+
+
+class LLMStub:
+    """
+    Lógica do LLM local, compartilhada pelos clientes em processo e pelo servidor HTTP.
+
+    Ordem de resolução de uma requisição: gravação com o mesmo hash; LLM real
+    (`upstream`), gravando a resposta; resposta sintética. Antes de responder,
+    espera uma latência sorteada (log-normal em torno de `latencia_ms`) e, com
+    probabilidade `taxa_erro`, falha com `status_erro`.
+    """
+
+    def __init__(self, gravacoes: GravacoesLLM = None, latencia_ms: float = 0.0, dispersao_latencia: float = 0.0,
+                 taxa_erro: float = 0.0, status_erro: int = 500, upstream=None, semente: int = None):
+        """
+        Args:
+            gravacoes (GravacoesLLM): Respostas gravadas (padrão: só em memória)
+            latencia_ms (float): Latência mediana de cada resposta, em milissegundos
+            dispersao_latencia (float): Sigma da log-normal; 0 = latência fixa, ~1 = cauda longa
+            taxa_erro (float): Probabilidade de cada requisição falhar
+            status_erro (int): Status HTTP dos erros injetados (ex.: 500, 503, 429)
+            upstream: Cliente OpenAI usado para gravar respostas que ainda não existem
+            semente (int): Semente do sorteio de latência e erros, para execuções reproduzíveis
+        """
+        self.gravacoes = gravacoes if gravacoes is not None else GravacoesLLM()
+        self.latencia_ms = latencia_ms
+        self.dispersao_latencia = dispersao_latencia
+        self.taxa_erro = taxa_erro
+        self.status_erro = status_erro
+        self.upstream = upstream
+        self._random = random.Random(semente)
+        self._lock = threading.Lock()
+        self.contadores = {"replay": 0, "gravadas": 0, "sinteticas": 0, "erros_injetados": 0}
+        # (snapshot, TagsCatalogo) da última versão do catálogo usada na síntese
+        self._tags_catalogo = None
+
+    def _contar(self, contador: str):
+        with self._lock:
+            self.contadores[contador] += 1
+
+    def sortear_latencia(self) -> float:
+        """Latência da próxima resposta, em segundos."""
+        if not self.latencia_ms:
+            return 0.0
+        with self._lock:
+            fator = self._random.lognormvariate(0.0, self.dispersao_latencia) if self.dispersao_latencia else 1.0
+        return self.latencia_ms * fator / 1000
+
+    def sortear_erro(self):
+        """Status do erro a injetar na próxima resposta, ou None."""
+        if not self.taxa_erro:
+            return None
+        with self._lock:
+            falhar = self._random.random() < self.taxa_erro
+        if falhar:
+            self._contar("erros_injetados")
+            return self.status_erro
+        return None
+
+    def responder(self, corpo: dict) -> dict:
+        """
+        Resolve uma requisição sem latência nem erros injetados.
+
+        Args:
+            corpo (dict): Argumentos de chat.completions.create
+
+        Returns:
+            dict: Resposta no formato de chat.completions
+        """
+        chave = chave_requisicao(corpo)
+        resposta = self.gravacoes.get(chave)
+        if resposta is not None:
+            self._contar("replay")
+            return resposta
+
+        if self.upstream is not None:
+            requisicao = {campo: valor for campo, valor in corpo.items() if campo not in CAMPOS_IGNORADOS_CHAVE}
+            resposta = _como_dict(self.upstream.chat.completions.create(**requisicao))
+            self.gravacoes.put(chave, requisicao, resposta)
+            self._contar("gravadas")
+            return resposta
+
+        self._contar("sinteticas")
+        return self._sintetizar(corpo)
+
+    def _sintetizar(self, corpo: dict) -> dict:
+        """
+        Resposta sem gravação: a decisão estruturada vem do parser local e a
+        formatação devolve um texto simples com a solicitação.
+        """
+        mensagens = corpo.get("messages", [])
+        texto_usuario = next((m.get("content", "") for m in reversed(mensagens) if m.get("role") == "user"), "")
+
+        if corpo.get("response_format"):
+            from .parser_intencao import TagsCatalogo, interpretar_mensagem
+            from .tools.procura_catalogo import repositorio
+
+            snapshot = repositorio.snapshot
+            estado = self._tags_catalogo
+            if estado is None or estado[0] is not snapshot:
+                estado = self._tags_catalogo = (snapshot, TagsCatalogo(sorted(snapshot.tags)))
+            decisao, _ = interpretar_mensagem(texto_usuario, estado[1])
+            conteudo = json.dumps(decisao, ensure_ascii=False)
+        else:
+            conteudo = "Resposta simulada pelo LLM local.\n" + texto_usuario.strip()
+
+        tokens_entrada = sum(len(str(m.get("content", ""))) for m in mensagens) // 4
+        tokens_saida = len(conteudo) // 4
+        return {
+            "id": f"chatcmpl-local-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": corpo.get("model", "local"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": conteudo},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": tokens_entrada,
+                "completion_tokens": tokens_saida,
+                "total_tokens": tokens_entrada + tokens_saida
+            }
+        }
+
+    @staticmethod
+    def pedacos(resposta: dict) -> list:
+        """
+        Divide uma resposta em chunks de streaming (chat.completion.chunk).
+
+        Args:
+            resposta (dict): Resposta completa
+
+        Returns:
+            list: Chunks, o primeiro com o papel e o último com finish_reason
+        """
+        conteudo = resposta["choices"][0]["message"].get("content") or ""
+        base = {"id": resposta.get("id"), "object": "chat.completion.chunk",
+                "created": resposta.get("created"), "model": resposta.get("model")}
+
+        def chunk(delta, finish_reason=None):
+            return {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+        chunks = [chunk({"role": "assistant", "content": ""})]
+        chunks += [chunk({"content": conteudo[i:i + TAMANHO_PEDACO_STREAM]})
+                   for i in range(0, len(conteudo), TAMANHO_PEDACO_STREAM)]
+        chunks.append(chunk({}, "stop"))
+        return chunks
+
+
+class _Completions:
+    def __init__(self, stub: LLMStub):
+        self._stub = stub
+
+    def create(self, **kwargs):
+        latencia = self._stub.sortear_latencia()
+        timeout = kwargs.get("timeout")
+        if timeout is not None and latencia > timeout:
+            # Como o timeout por requisição do cliente da OpenAI: desiste no prazo
+            time.sleep(timeout)
+            raise ErroLLMSimulado(408)
+        time.sleep(latencia)
+        status = self._stub.sortear_erro()
+        if status is not None:
+            raise ErroLLMSimulado(status)
+        resposta = self._stub.responder(kwargs)
+        if kwargs.get("stream"):
+            # No cliente OpenAI, um delta sem conteúdo ainda tem `content` (None)
+            return iter([_como_objeto({**chunk, "choices": [{**escolha, "delta": {"content": None, **escolha["delta"]}}
+                                                            for escolha in chunk["choices"]]})
+                         for chunk in self._stub.pedacos(resposta)])
+        return _como_objeto(resposta)
+
+
+class _AsyncCompletions:
+    def __init__(self, stub: LLMStub):
+        self._stub = stub
+
+    async def create(self, **kwargs):
+        latencia = self._stub.sortear_latencia()
+        timeout = kwargs.get("timeout")
+        if timeout is not None and latencia > timeout:
+            await asyncio.sleep(timeout)
+            raise ErroLLMSimulado(408)
+        await asyncio.sleep(latencia)
+        status = self._stub.sortear_erro()
+        if status is not None:
+            raise ErroLLMSimulado(status)
+        # Gravar uma resposta nova chama o upstream síncrono; fora do event loop
+        resposta = await asyncio.get_running_loop().run_in_executor(None, self._stub.responder, kwargs)
+        return _como_objeto(resposta)
+
+
+class StubLLMClient:
+    """Cliente em processo com a mesma interface de `OpenAI().chat.completions`."""
+
+    def __init__(self, stub: LLMStub = None):
+        self.stub = stub or LLMStub()
+        self.chat = SimpleNamespace(completions=_Completions(self.stub))
+
+
+class AsyncStubLLMClient:
+    """Cliente em processo com a mesma interface de `AsyncOpenAI().chat.completions`."""
+
+    # Os erros injetados equivalem a 5xx/429: o agente assíncrono tenta de novo
+    erros_transitorios = (ErroLLMSimulado,)
+
+    def __init__(self, stub: LLMStub = None):
+        self.stub = stub or LLMStub()
+        self.chat = SimpleNamespace(completions=_AsyncCompletions(self.stub))
+
+
+def criar_servidor(stub: LLMStub, host: str = "127.0.0.1", porta: int = 8099) -> ThreadingHTTPServer:
+    """
+    Servidor HTTP compatível com POST /v1/chat/completions (com e sem stream).
+
+    Args:
+        stub (LLMStub): Lógica de respostas, latência e erros
+        host (str): Endereço de escuta
+        porta (int): Porta de escuta (0 = porta livre qualquer)
+
+    Returns:
+        ThreadingHTTPServer: Servidor pronto para serve_forever()
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _json(self, status: int, corpo: dict):
+            dados = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def do_GET(self):
+            if self.path.rstrip('/').endswith("/estatisticas"):
+                self._json(200, {**stub.contadores, "gravacoes": len(stub.gravacoes)})
+            else:
+                self._json(404, {"error": {"message": "Rota não encontrada", "type": "invalid_request_error"}})
+
+        def do_POST(self):
+            tamanho = int(self.headers.get("Content-Length") or 0)
+            if not self.path.rstrip('/').endswith("/chat/completions"):
+                self.rfile.read(tamanho)
+                self._json(404, {"error": {"message": "Rota não encontrada", "type": "invalid_request_error"}})
+                return
+            try:
+                corpo = json.loads(self.rfile.read(tamanho) or b'{}')
+            except json.JSONDecodeError as e:
+                self._json(400, {"error": {"message": f"JSON inválido: {e}", "type": "invalid_request_error"}})
+                return
+
+            time.sleep(stub.sortear_latencia())
+            status = stub.sortear_erro()
+            if status is not None:
+                self._json(status, {"error": {"message": f"Erro simulado (HTTP {status})", "type": "server_error"}})
+                return
+            try:
+                resposta = stub.responder(corpo)
+            except Exception as e:
+                self._json(502, {"error": {"message": f"Falha no upstream: {e}", "type": "server_error"}})
+                return
+
+            if not corpo.get("stream"):
+                self._json(200, resposta)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for chunk in stub.pedacos(resposta):
+                self.wfile.write(b"data: " + json.dumps(chunk, ensure_ascii=False).encode('utf-8') + b"\n\n")
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+        def log_message(self, format, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((host, porta), Handler)
+    servidor.daemon_threads = True
+    return servidor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LLM local compatível com chat.completions (gravação/replay)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8099)
+    parser.add_argument("--gravacoes", help="Arquivo JSONL com as respostas gravadas")
+    parser.add_argument("--gravar", action="store_true",
+                        help="Repassa requisições sem gravação para a API da OpenAI e grava as respostas")
+    parser.add_argument("--latencia-ms", type=float, default=0.0, help="Latência mediana por resposta")
+    parser.add_argument("--dispersao-latencia", type=float, default=0.0,
+                        help="Sigma da distribuição log-normal da latência (0 = fixa)")
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="Probabilidade de erro por requisição")
+    parser.add_argument("--status-erro", type=int, default=500, help="Status HTTP dos erros injetados")
+    parser.add_argument("--semente", type=int, help="Semente para latência e erros reproduzíveis")
+    args = parser.parse_args(argv)
+
+    upstream = None
+    if args.gravar:
+        from dotenv import load_dotenv
+        from openai import OpenAI
+
+        load_dotenv()
+        # Sem herdar OPENAI_BASE_URL, que pode estar apontando para este servidor
+        upstream = OpenAI(api_key=os.getenv('OPENAI_API_KEY'), base_url="https://api.openai.com/v1")
+
+    stub = LLMStub(GravacoesLLM(args.gravacoes), args.latencia_ms, args.dispersao_latencia,
+                   args.taxa_erro, args.status_erro, upstream, args.semente)
+    servidor = criar_servidor(stub, args.host, args.porta)
+    print(f"LLM local em http://{args.host}:{servidor.server_address[1]}/v1 ({len(stub.gravacoes)} gravações)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        print(f"Encerrado: {stub.contadores}")
+
+
+if __name__ == "__main__":
+    main()
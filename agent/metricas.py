@@ -0,0 +1,306 @@
+import bisect
+import hashlib
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Limites dos histogramas de duração, em segundos (formato Prometheus)
+LIMITES_HISTOGRAMA = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Durações recentes guardadas por etapa para os percentis do snapshot JSON
+JANELA_PERCENTIS = 1024
+
+
+def _hash_curto(texto: str):
+    """Hash curto de um texto, para identificar sem guardar o conteúdo (None fica None)."""
+    if texto is None:
+        return None
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()[:16]
+
+
+class TurnTrace:
+    """
+    Rastro de um turno do agente: tempo de cada etapa, tokens, cache e resultado.
+
+    As etapas são medidas com `with trace.etapa("nome")` e podem ser aninhadas
+    (ex.: "llm_decisao" dentro de "decisao"). Se uma etapa levanta exceção, o
+    nome dela fica em `etapa_erro`, então um erro no turno diz onde aconteceu.
+    """
+
+    def __init__(self, user_message: str = None, sessao_id: str = None):
+        """
+        Args:
+            user_message (str): Mensagem do usuário do turno; o rastro guarda só o
+                tamanho e um hash, nunca o texto
+            sessao_id (str): Id da conversa, guardado como hash para filtrar os
+                rastros de uma sessão
+        """
+        self.mensagem_hash = _hash_curto(user_message)
+        self.mensagem_chars = len(user_message) if user_message is not None else None
+        self.sessao = _hash_curto(sessao_id)
+        self.inicio = time.perf_counter()
+        self.tempos = {}
+        self.tokens = {"prompt": 0, "completion": 0}
+        self.chamadas_llm = 0
+        self.origem_decisao = None
+        self.cache_decisao = None
+        self.action = None
+        self.resultados = None
+        self.relaxado = False
+        self.formatacao = None
+        self.erro = None
+        self.etapa_erro = None
+        self._etapa_atual = None
+
+    @contextmanager
+    def etapa(self, nome: str):
+        """Mede uma etapa do turno e grava `<nome>_ms` em `tempos`."""
+        anterior, self._etapa_atual = self._etapa_atual, nome
+        inicio = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            # A etapa mais interna que falhou é a que interessa
+            if self.etapa_erro is None:
+                self.etapa_erro = nome
+            raise
+        finally:
+            chave = f"{nome}_ms"
+            self.tempos[chave] = round(self.tempos.get(chave, 0.0) + (time.perf_counter() - inicio) * 1000, 2)
+            self._etapa_atual = anterior
+
+    def registrar_uso(self, response):
+        """
+        Soma os tokens de uma resposta de chat.completions.
+
+        Args:
+            response: Resposta com `usage` (prompt_tokens, completion_tokens), se houver
+        """
+        self.chamadas_llm += 1
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.tokens["prompt"] += getattr(usage, "prompt_tokens", 0) or 0
+            self.tokens["completion"] += getattr(usage, "completion_tokens", 0) or 0
+
+    def registrar_erro(self, erro: Exception):
+        self.erro = str(erro) or type(erro).__name__
+        if self.etapa_erro is None:
+            self.etapa_erro = self._etapa_atual or "turno"
+
+    def finalizar(self):
+        self.tempos["total_ms"] = round((time.perf_counter() - self.inicio) * 1000, 2)
+
+    def como_dict(self) -> dict:
+        return {
+            "mensagem_hash": self.mensagem_hash,
+            "mensagem_chars": self.mensagem_chars,
+            "sessao": self.sessao,
+            "action": self.action,
+            "origem_decisao": self.origem_decisao,
+            "cache_decisao": self.cache_decisao,
+            "resultados": self.resultados,
+            "relaxado": self.relaxado,
+            "formatacao": self.formatacao,
+            "chamadas_llm": self.chamadas_llm,
+            "tokens": dict(self.tokens),
+            "tempos": dict(self.tempos),
+            "erro": self.erro,
+            "etapa_erro": self.etapa_erro,
+        }
+
+
+class _Histograma:
+    def __init__(self):
+        self.baldes = [0] * (len(LIMITES_HISTOGRAMA) + 1)
+        self.soma = 0.0
+        self.contagem = 0
+        self.recentes = deque(maxlen=JANELA_PERCENTIS)
+
+    def observar(self, segundos: float):
+        self.baldes[bisect.bisect_left(LIMITES_HISTOGRAMA, segundos)] += 1
+        self.soma += segundos
+        self.contagem += 1
+        self.recentes.append(segundos)
+
+
+def _percentil(ordenados: list, p: float) -> float:
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+class MetricsRegistry:
+    """
+    Agrega os rastros dos turnos em contadores e histogramas por etapa.
+
+    `snapshot()` devolve um dicionário (JSON) com contadores, percentis das
+    durações recentes e os últimos rastros; `prometheus()` devolve o mesmo
+    conteúdo no formato de texto do Prometheus. Outras fontes de números (ex.:
+    estatísticas do cache de decisões) entram com `adicionar_fonte`.
+    """
+
+    def __init__(self, ultimos: int = 50):
+        """
+        Args:
+            ultimos (int): Quantos rastros recentes manter para inspeção
+        """
+        self._lock = threading.Lock()
+        self._fontes = {}
+        self.ultimos = deque(maxlen=ultimos)
+        self.turnos = 0
+        self.erros = {}
+        self.origens = {}
+        self.cache_decisao = {}
+        self.formatacoes = {}
+        self.relaxamentos = 0
+        self.sem_resultados = 0
+        self.chamadas_llm = 0
+        self.tokens = {"prompt": 0, "completion": 0}
+        self.etapas = {}
+
+    def adicionar_fonte(self, nome: str, fonte):
+        """
+        Registra uma função sem argumentos que devolve um dict de números.
+
+        Args:
+            nome (str): Prefixo das métricas da fonte
+            fonte (callable): Ex.: `DecisionCache.estatisticas`
+        """
+        self._fontes[nome] = fonte
+
+    def registrar(self, trace: TurnTrace):
+        """Agrega um rastro finalizado."""
+        with self._lock:
+            self.turnos += 1
+            if trace.erro is not None:
+                self.erros[trace.etapa_erro] = self.erros.get(trace.etapa_erro, 0) + 1
+            for contador, valor in ((self.origens, trace.origem_decisao),
+                                    (self.cache_decisao, trace.cache_decisao),
+                                    (self.formatacoes, trace.formatacao)):
+                if valor is not None:
+                    contador[valor] = contador.get(valor, 0) + 1
+            self.relaxamentos += trace.relaxado
+            self.sem_resultados += trace.resultados == 0
+            self.chamadas_llm += trace.chamadas_llm
+            for tipo, quantidade in trace.tokens.items():
+                self.tokens[tipo] += quantidade
+            for chave, ms in trace.tempos.items():
+                etapa = chave[:-3]
+                if etapa not in self.etapas:
+                    self.etapas[etapa] = _Histograma()
+                self.etapas[etapa].observar(ms / 1000)
+            self.ultimos.append(trace.como_dict())
+
+    def ultimos_da_sessao(self, sessao_id: str) -> list:
+        """
+        Rastros recentes de uma conversa, do mais antigo ao mais recente.
+
+        Args:
+            sessao_id (str): Id da conversa
+
+        Returns:
+            list: Rastros (como_dict) dos turnos dessa sessão entre os últimos guardados
+        """
+        if sessao_id is None:
+            return []
+        sessao = _hash_curto(sessao_id)
+        with self._lock:
+            return [rastro for rastro in self.ultimos if rastro["sessao"] == sessao]
+
+    def _valores_fontes(self) -> dict:
+        valores = {}
+        for nome, fonte in self._fontes.items():
+            try:
+                valores[nome] = {chave: valor for chave, valor in fonte().items() if isinstance(valor, (int, float))}
+            except Exception:
+                continue
+        return valores
+
+    def snapshot(self) -> dict:
+        """
+        Estado atual das métricas.
+
+        Returns:
+            dict: Contadores, durações por etapa (contagem, média e percentis em ms),
+                  fontes extras e os últimos rastros
+        """
+        with self._lock:
+            etapas = {}
+            for etapa, histograma in self.etapas.items():
+                recentes = sorted(histograma.recentes)
+                etapas[etapa] = {
+                    "contagem": histograma.contagem,
+                    "media_ms": round(histograma.soma / histograma.contagem * 1000, 2),
+                    **{f"p{p}_ms": round(_percentil(recentes, p) * 1000, 2) for p in (50, 95, 99)},
+                }
+            dados = {
+                "turnos": self.turnos,
+                "erros": dict(self.erros),
+                "origem_decisao": dict(self.origens),
+                "cache_decisao": dict(self.cache_decisao),
+                "formatacao": dict(self.formatacoes),
+                "relaxamentos": self.relaxamentos,
+                "sem_resultados": self.sem_resultados,
+                "chamadas_llm": self.chamadas_llm,
+                "tokens": dict(self.tokens),
+                "etapas": etapas,
+                "ultimos": list(self.ultimos),
+            }
+        dados.update(self._valores_fontes())
+        return dados
+
+    def prometheus(self, prefixo: str = "agente") -> str:
+        """
+        Métricas no formato de texto do Prometheus.
+
+        Args:
+            prefixo (str): Prefixo dos nomes das métricas
+
+        Returns:
+            str: Exposição pronta para um endpoint /metrics
+        """
+        linhas = []
+
+        def metrica(nome, tipo, ajuda, amostras):
+            linhas.append(f"# HELP {prefixo}_{nome} {ajuda}")
+            linhas.append(f"# TYPE {prefixo}_{nome} {tipo}")
+            for rotulos, valor in amostras:
+                texto_rotulos = ",".join(f'{chave}="{rotulo}"' for chave, rotulo in rotulos.items())
+                linhas.append(f"{prefixo}_{nome}{{{texto_rotulos}}} {valor}" if rotulos
+                              else f"{prefixo}_{nome} {valor}")
+
+        with self._lock:
+            metrica("turnos_total", "counter", "Turnos processados", [({}, self.turnos)])
+            metrica("erros_total", "counter", "Turnos com erro, por etapa",
+                    [({"etapa": etapa}, total) for etapa, total in sorted(self.erros.items())])
+            metrica("decisoes_total", "counter", "Decisões por origem (parser, sessao, cache, llm, coalescida)",
+                    [({"origem": origem}, total) for origem, total in sorted(self.origens.items())])
+            metrica("cache_decisao_total", "counter", "Consultas ao cache de decisões, por resultado",
+                    [({"resultado": resultado}, total) for resultado, total in sorted(self.cache_decisao.items())])
+            metrica("formatacoes_total", "counter", "Respostas por modo de formatação",
+                    [({"modo": modo}, total) for modo, total in sorted(self.formatacoes.items())])
+            metrica("relaxamentos_total", "counter", "Buscas sem resultado exato, respondidas com itens aproximados",
+                    [({}, self.relaxamentos)])
+            metrica("sem_resultados_total", "counter", "Buscas que terminaram sem resultados",
+                    [({}, self.sem_resultados)])
+            metrica("chamadas_llm_total", "counter", "Chamadas ao LLM", [({}, self.chamadas_llm)])
+            metrica("tokens_total", "counter", "Tokens consumidos, por tipo",
+                    [({"tipo": tipo}, total) for tipo, total in self.tokens.items()])
+
+            amostras = []
+            for etapa, histograma in sorted(self.etapas.items()):
+                acumulado = 0
+                for limite, quantidade in zip(LIMITES_HISTOGRAMA + ("+Inf",), histograma.baldes):
+                    acumulado += quantidade
+                    amostras.append(({"etapa": etapa, "le": limite}, acumulado))
+            linhas.append(f"# HELP {prefixo}_etapa_duracao_segundos Duração de cada etapa do turno")
+            linhas.append(f"# TYPE {prefixo}_etapa_duracao_segundos histogram")
+            for rotulos, valor in amostras:
+                linhas.append(f'{prefixo}_etapa_duracao_segundos_bucket{{etapa="{rotulos["etapa"]}",le="{rotulos["le"]}"}} {valor}')
+            for etapa, histograma in sorted(self.etapas.items()):
+                linhas.append(f'{prefixo}_etapa_duracao_segundos_sum{{etapa="{etapa}"}} {histograma.soma:.6f}')
+                linhas.append(f'{prefixo}_etapa_duracao_segundos_count{{etapa="{etapa}"}} {histograma.contagem}')
+
+        for nome, valores in self._valores_fontes().items():
+            for chave, valor in valores.items():
+                metrica(f"{nome}_{chave}", "gauge", f"{nome}: {chave}", [({}, valor)])
+        return "\n".join(linhas) + "\n"
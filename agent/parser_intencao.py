@@ -0,0 +1,332 @@
+import re
+
+from .tools.indice_texto import normalizar_texto, tokenizar
+
+# Termos comuns → tags do catálogo
+MAPEAMENTO_TAGS = {
+    'sem lactose': ['sem lactose'],
+    'intolerante a lactose': ['sem lactose'],
+    'lactose': ['sem lactose'],
+    'vegano': ['vegano'],
+    'vegan': ['vegano'],
+    'apimentado': ['picante'],
+    'apimentada': ['picante'],
+    'picante': ['picante'],
+    'sem gluten': ['sem gluten'],
+    'sem açucar': ['sem açucar'],
+    'sem açúcar': ['sem açucar'],
+}
+
+# Termos → ingredientes obrigatórios (mesmo mapeamento do system prompt)
+MAPEAMENTO_INGREDIENTES = {
+    'proteina': ["frango", "carne", "peixe", "ovo", "tofu", "camarão"],
+    'arroz': ["arroz"],
+    'legume': ["legumes", "brócolis", "cenoura"],
+    'frango': ["frango"],
+    'carne': ["carne"],
+    'peixe': ["peixe"],
+    'ovo': ["ovo"],
+    'tofu': ["tofu"],
+    'camara': ["camarão"],
+    'brocolis': ["brócolis"],
+    'cenoura': ["cenoura"],
+}
+
+_ACOES = [
+    (re.compile(r'\bmais barat[oa]s?\b'), "get_cheapest_item"),
+    (re.compile(r'\bmais car[oa]s?\b'), "get_most_expensive_item"),
+    (re.compile(r'\b(?:faixa|variacao|intervalo) de precos?\b'), "get_price_range"),
+]
+
+_ORCAMENTO = re.compile(
+    r'\b(?:ate|no maximo|maximo de|menos de|abaixo de)\s*(?:de\s*)?(?:r\s*\$\s*)?'
+    r'(\d+(?:[.,]\d{1,2})?)\s*(?:reais\b)?'
+)
+
+_EXCLUSOES = [
+    (re.compile(r'\b(?:nao|nada|sem)\s+(?:picantes?|apimentad[oa]s?|pimenta)\b'), 'picante'),
+]
+
+# Marcas de que a mensagem continua a anterior. "e", "só", "também"... só contam no
+# início ("e sem lactose?", "agora só os veganos"): no meio de um pedido completo
+# ("quero apenas pratos veganos") fazem parte dele. Referências ao resultado
+# anterior ("desses", "entre eles") contam em qualquer posição.
+_REFINAMENTO = re.compile(
+    r'^\s*(?:agora\s+)?(?:e|so|somente|apenas|tambem)\b'
+    r'|\b(?:desses|dessas|destes|destas|deles|delas|nesses|nessas'
+    r'|entre (?:esses|essas|estes|estas|eles|elas))\b'
+)
+
+# "mais barato que isso": abaixo do preço do que foi mostrado por último
+_MAIS_BARATO_QUE = re.compile(
+    r'\b(?:mais barat[oa]s?|mais em conta)\s+(?:que|do que)\s+'
+    r'(?:isso|esse|essa|esses|essas|este|esta|estes|estas|ele|ela|eles|elas|[oa]s? anterior(?:es)?)\b'
+)
+
+_PALAVRAS_NEUTRAS = {
+    'quero', 'queria', 'gostaria', 'preciso', 'procuro', 'busco', 'me', 'mostre', 'mostra',
+    'sugira', 'sugere', 'indique', 'indica', 'recomende', 'recomenda', 'um', 'uma', 'uns', 'umas',
+    'o', 'a', 'os', 'as', 'de', 'do', 'da', 'dos', 'das', 'com', 'e', 'ou', 'que', 'tenha',
+    'tenham', 'tem', 'prato', 'pratos', 'refeicao', 'refeicoes', 'opcao', 'opcoes', 'algo',
+    'algum', 'alguma', 'alguns', 'algumas', 'por', 'favor', 'para', 'pra', 'mim', 'eu', 'sou',
+    'estou', 'almoco', 'jantar', 'comida', 'comer', 'r', 'reais', 'qual', 'quais', 'no', 'na',
+    'em', 'seja', 'sejam', 'cardapio', 'catalogo', 'voce', 'voces', 'ola', 'oi', 'hoje', 'custe',
+    'custem', 'custando', 'preco', 'precos', 'valor', 'tipo', 'bem', 'muito', 'mais', 'ser',
+    'agora', 'isso', 'esse', 'essa', 'esses', 'essas', 'aqueles', 'aquelas', 'ai', 'entao',
+}
+
+
+def _casar(padrao: str) -> re.Pattern:
+    """Casa o termo normalizado no início de uma palavra, aceitando flexões (vegano → veganos)."""
+    return re.compile(r'\b' + re.escape(normalizar_texto(padrao)) + r'\w*')
+
+
+_PADROES_TAGS = sorted(((_casar(termo), tags) for termo, tags in MAPEAMENTO_TAGS.items()),
+                       key=lambda par: -len(par[0].pattern))
+_PADROES_INGREDIENTES = [(_casar(termo), ingredientes) for termo, ingredientes in MAPEAMENTO_INGREDIENTES.items()]
+
+
+class TagsCatalogo(tuple):
+    """
+    Tags do catálogo, na ordem recebida, prontas para o parser.
+
+    Construída uma vez por versão do catálogo (o agente guarda a sua junto do
+    system prompt). A pertinência usa um frozenset e todas as tags viram um
+    único padrão, com os termos mais longos primeiro ("sem lactose" antes de
+    "sem"), em vez de um regex compilado por tag a cada mensagem.
+    """
+
+    def __new__(cls, tags=()):
+        """
+        Args:
+            tags (iterable): Tags do catálogo
+        """
+        self = super().__new__(cls, tags)
+        self.conjunto = frozenset(self)
+        # Termo normalizado → tag (a primeira, se duas tags normalizam igual)
+        self.termos = {}
+        for tag in self:
+            self.termos.setdefault(normalizar_texto(tag), tag)
+        self.padrao = None
+        if self.termos:
+            alternativas = sorted(self.termos, key=len, reverse=True)
+            self.padrao = re.compile(r'\b(?:' + '|'.join(map(re.escape, alternativas)) + r')\w*')
+        return self
+
+    def __contains__(self, tag) -> bool:
+        return tag in self.conjunto
+
+    def tag_do_trecho(self, trecho: str) -> str:
+        """Tag de um trecho casado por `padrao`: a do termo mais longo que o inicia."""
+        for fim in range(len(trecho), 0, -1):
+            tag = self.termos.get(trecho[:fim])
+            if tag is not None:
+                return tag
+        return None
+
+
+def tags_catalogo(tags) -> TagsCatalogo:
+    """Devolve `tags` como TagsCatalogo, construindo-a só se ainda não for uma."""
+    return tags if isinstance(tags, TagsCatalogo) else TagsCatalogo(tags)
+
+
+def _consumir(texto: str, padrao: re.Pattern) -> tuple:
+    """Remove do texto os trechos que casam com o padrão e devolve (texto, matches)."""
+    matches = list(padrao.finditer(texto))
+    for match in reversed(matches):
+        texto = texto[:match.start()] + ' ' * (match.end() - match.start()) + texto[match.end():]
+    return texto, matches
+
+
+def _analisar(texto: str, tags_disponiveis: TagsCatalogo) -> dict:
+    """
+    Extrai ação, orçamento, tags e ingredientes de um texto já normalizado.
+
+    Returns:
+        dict: action, budget, incluir_tags, excluir_tags, ingredientes, sinais
+              (quantos trechos foram entendidos) e nao_explicadas (palavras que sobraram)
+    """
+    sinais = 0
+
+    action = "search_catalog"
+    for padrao, acao in _ACOES:
+        texto, matches = _consumir(texto, padrao)
+        if matches and action == "search_catalog":
+            action = acao
+            sinais += 1
+
+    budget = None
+    texto, matches = _consumir(texto, _ORCAMENTO)
+    if matches:
+        budget = float(matches[-1].group(1).replace(',', '.'))
+        sinais += 1
+
+    excluir_tags = []
+    for padrao, tag in _EXCLUSOES:
+        texto, matches = _consumir(texto, padrao)
+        if matches and tag in tags_disponiveis:
+            excluir_tags.append(tag)
+            sinais += 1
+
+    incluir_tags = []
+    # Termos mapeados para tags que não existem no catálogo ficam sem explicação
+    tags_ausentes = []
+    for padrao, tags in _PADROES_TAGS:
+        texto, matches = _consumir(texto, padrao)
+        if matches:
+            sinais += 1
+            for tag in tags:
+                if tag not in tags_disponiveis:
+                    tags_ausentes.append(tag)
+                elif tag not in incluir_tags:
+                    incluir_tags.append(tag)
+
+    # As tags do próprio catálogo casam todas em uma passada só
+    if tags_disponiveis.padrao is not None:
+        texto, matches = _consumir(texto, tags_disponiveis.padrao)
+        casadas = []
+        for match in matches:
+            tag = tags_disponiveis.tag_do_trecho(match.group())
+            if tag not in casadas:
+                casadas.append(tag)
+        sinais += len(casadas)
+        incluir_tags += [tag for tag in casadas if tag not in incluir_tags]
+
+    ingredientes = []
+    for padrao, grupo in _PADROES_INGREDIENTES:
+        texto, matches = _consumir(texto, padrao)
+        if matches:
+            sinais += 1
+            for ingrediente in grupo:
+                if ingrediente not in ingredientes:
+                    ingredientes.append(ingrediente)
+
+    nao_explicadas = [palavra for palavra in tokenizar(texto) if palavra not in _PALAVRAS_NEUTRAS]
+    nao_explicadas += tags_ausentes
+
+    return {
+        "action": action,
+        "budget": budget,
+        "incluir_tags": incluir_tags,
+        "excluir_tags": excluir_tags,
+        "ingredientes": ingredientes,
+        "sinais": sinais,
+        "nao_explicadas": nao_explicadas,
+    }
+
+
+def interpretar_mensagem(user_text: str, tags_disponiveis: list) -> tuple:
+    """
+    Interpreta a mensagem do usuário com regras locais, sem chamar o LLM.
+
+    Produz a mesma estrutura de `response_schema` e uma confiança entre 0 e 1:
+    1.0 quando toda palavra relevante da mensagem foi explicada pelas regras, e
+    menos a cada palavra que as regras não entendem (ex.: "saudável", "prático").
+
+    Args:
+        user_text (str): Mensagem do usuário
+        tags_disponiveis (list): Tags existentes no catálogo. Uma TagsCatalogo evita
+            recompilar os padrões das tags a cada mensagem.
+
+    Returns:
+        tuple: (decisao, confianca)
+    """
+    analise = _analisar(normalizar_texto(user_text), tags_catalogo(tags_disponiveis))
+    action, budget, sinais = analise["action"], analise["budget"], analise["sinais"]
+    incluir_tags, excluir_tags, ingredientes = analise["incluir_tags"], analise["excluir_tags"], analise["ingredientes"]
+    nao_explicadas = analise["nao_explicadas"]
+
+    filtros = budget is not None or incluir_tags or excluir_tags or ingredientes
+    confianca = 0.0 if not sinais else max(0.0, 1.0 - 0.3 * len(nao_explicadas))
+
+    if action != "search_catalog" and incluir_tags and not (budget is not None or excluir_tags or ingredientes):
+        # Só tags: os agregados por tag respondem direto ("prato vegano mais caro")
+        action += "_by_tags"
+    elif filtros and action == "get_cheapest_item":
+        # A busca já ordena por preço: o primeiro resultado é o mais barato com os filtros
+        action = "search_catalog"
+    elif filtros and action != "search_catalog":
+        # "mais caro" ou "faixa de preço" com filtros não têm ação equivalente
+        confianca = min(confianca, 0.5)
+
+    search_params = {
+        "budget": budget,
+        "incluir_tags": incluir_tags,
+        "excluir_tags": excluir_tags,
+        "ingredientes_obrigatorios": ingredientes
+    }
+
+    if action == "search_catalog":
+        partes = []
+        if incluir_tags:
+            partes.append("tags: " + ", ".join(incluir_tags))
+        if excluir_tags:
+            partes.append("excluindo: " + ", ".join(excluir_tags))
+        if ingredientes:
+            partes.append("ingredientes: " + ", ".join(ingredientes))
+        if budget is not None:
+            partes.append(f"até R$ {budget:.2f}")
+        user_intent = "Buscar pratos (" + "; ".join(partes) + ")" if partes else "Buscar pratos do catálogo"
+    else:
+        user_intent = {
+            "get_cheapest_item": "Encontrar o prato mais barato",
+            "get_most_expensive_item": "Encontrar o prato mais caro",
+            "get_price_range": "Conhecer a faixa de preços do catálogo",
+            "get_cheapest_item_by_tags": "Encontrar o prato mais barato",
+            "get_most_expensive_item_by_tags": "Encontrar o prato mais caro",
+            "get_price_range_by_tags": "Conhecer a faixa de preços",
+        }[action]
+        if incluir_tags:
+            user_intent += " (tags: " + ", ".join(incluir_tags) + ")"
+
+    decisao = {
+        "action_taken": action,
+        "search_params": search_params,
+        "reasoning": f"Interpretação local por regras (confiança {confianca:.2f})",
+        "user_intent": user_intent
+    }
+    return decisao, confianca
+
+
+def interpretar_refinamento(user_text: str, tags_disponiveis: list) -> tuple:
+    """
+    Interpreta uma mensagem que refina o resultado anterior da conversa.
+
+    Só reconhece mensagens com uma marca de continuação ("e sem lactose?",
+    "agora só os veganos", "desses, o mais barato", "algo mais barato que
+    isso"); o restante é lido pelas mesmas regras de `interpretar_mensagem`.
+
+    Args:
+        user_text (str): Mensagem do usuário
+        tags_disponiveis (list): Tags existentes no catálogo. Uma TagsCatalogo evita
+            recompilar os padrões das tags a cada mensagem.
+
+    Returns:
+        tuple: (refinamento ou None, confianca). O refinamento tem "action"
+               (search_catalog, get_cheapest_item ou get_most_expensive_item),
+               "search_params" com os filtros novos e "mais_barato_que_anterior"
+    """
+    texto = normalizar_texto(user_text)
+    texto, mais_barato = _consumir(texto, _MAIS_BARATO_QUE)
+    texto, marcas = _consumir(texto, _REFINAMENTO)
+    if not mais_barato and not marcas:
+        return None, 0.0
+
+    analise = _analisar(texto, tags_catalogo(tags_disponiveis))
+    if not analise["sinais"] and not mais_barato:
+        # "e aí?", "só isso": continuação sem nenhum filtro novo
+        return None, 0.0
+    if analise["action"] == "get_price_range":
+        return None, 0.0
+
+    refinamento = {
+        "action": analise["action"],
+        "search_params": {
+            "budget": analise["budget"],
+            "incluir_tags": analise["incluir_tags"],
+            "excluir_tags": analise["excluir_tags"],
+            "ingredientes_obrigatorios": analise["ingredientes"],
+        },
+        "mais_barato_que_anterior": bool(mais_barato),
+    }
+    return refinamento, max(0.0, 1.0 - 0.3 * len(analise["nao_explicadas"]))
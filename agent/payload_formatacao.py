@@ -0,0 +1,183 @@
+import json
+import math
+import re
+
+from .tools.restricoes import resumir_violacao
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+FORMATO_COMPACTO = 'compacto'
+FORMATO_JSON = 'json'
+
+# Orçamento padrão do resultado no prompt de formatação, em tokens
+ORCAMENTO_PADRAO = 400
+# Teto de tokens da descrição de cada item
+TOKENS_DESCRICAO_PADRAO = 24
+# Abaixo disso a descrição não ajuda o LLM e é melhor mostrar mais itens
+TOKENS_DESCRICAO_MINIMO = 8
+
+LEGENDA = "itens (nome|preço R$|tags|descrição):"
+LEGENDA_APROXIMADOS = "nenhum item atende a todos os filtros; mais próximos (nome|preço R$|tags|descrição|não atende):"
+
+_PEDACOS = re.compile(r'\w+|[^\w\s]')
+
+_codificador = None
+
+
+def _obter_codificador():
+    """Codificador do tiktoken para o gpt-4o, ou None se não estiver disponível."""
+    global _codificador
+    if _codificador is None and tiktoken is not None:
+        try:
+            _codificador = tiktoken.encoding_for_model("gpt-4o")
+        except Exception:
+            # Sem o arquivo do vocabulário (ex.: máquina sem rede): usa a estimativa
+            _codificador = False
+    return _codificador or None
+
+
+def estimar_tokens(texto: str) -> int:
+    """
+    Número de tokens de um texto.
+
+    Usa o tokenizador do modelo (tiktoken) quando instalado; senão, estima
+    por palavra: cada palavra custa ~1 token a cada 4 caracteres e cada sinal
+    de pontuação custa 1 token, o que acompanha bem o BPE em português.
+
+    Args:
+        texto (str): Texto
+
+    Returns:
+        int: Tokens (exatos ou estimados)
+    """
+    codificador = _obter_codificador()
+    if codificador is not None:
+        return len(codificador.encode(texto))
+    return sum(math.ceil(len(pedaco) / 4) for pedaco in _PEDACOS.findall(texto))
+
+
+def truncar_tokens(texto: str, limite: int) -> str:
+    """
+    Corta o texto em fim de palavra para caber em `limite` tokens.
+
+    Args:
+        texto (str): Texto original
+        limite (int): Máximo de tokens
+
+    Returns:
+        str: Texto original, ou prefixo terminado em "…"
+    """
+    if estimar_tokens(texto) <= limite:
+        return texto
+    palavras = texto.split()
+    # Busca binária pelo maior prefixo de palavras que cabe (reservando 1 token para "…")
+    baixo, alto = 0, len(palavras)
+    while baixo < alto:
+        meio = (baixo + alto + 1) // 2
+        if estimar_tokens(' '.join(palavras[:meio])) <= limite - 1:
+            baixo = meio
+        else:
+            alto = meio - 1
+    return ' '.join(palavras[:baixo]).rstrip('.,;:') + '…'
+
+
+def _preco(valor) -> str:
+    return f"{valor:.2f}".rstrip('0').rstrip('.') if isinstance(valor, (int, float)) else str(valor)
+
+
+def _linha_item(item: dict, tokens_descricao: int) -> str:
+    campos = [
+        item.get("nome", ""),
+        _preco(item.get("preco")),
+        ",".join(item.get("tags", [])),
+        truncar_tokens(item.get("descricao", ""), tokens_descricao) if tokens_descricao else "",
+    ]
+    if "violacoes" in item:
+        campos.append("; ".join(resumir_violacao(violacao) for violacao in item["violacoes"]))
+    return "|".join(campo.replace("|", "/").replace("\n", " ") for campo in campos)
+
+
+def _tabela_itens(itens: list, total: int, orcamento: int, tokens_descricao: int) -> str:
+    """
+    Monta a tabela de itens no orçamento, na ordem recebida (mais baratos primeiro).
+
+    A descrição de cada item recebe a sua parte do orçamento, até `tokens_descricao`;
+    se nem com descrições mínimas todos os itens couberem, os últimos ficam de fora.
+    """
+    cabecalho = LEGENDA_APROXIMADOS if any("violacoes" in item for item in itens) else LEGENDA
+    custo_cabecalho = estimar_tokens(cabecalho) + estimar_tokens(f"mostrando {len(itens)} de {total}") + 2
+    custo_fixo = [estimar_tokens(_linha_item(item, 0)) + 1 for item in itens]
+
+    disponivel = orcamento - custo_cabecalho - sum(custo_fixo)
+    por_item = min(tokens_descricao, disponivel // len(itens)) if itens else 0
+    if por_item < TOKENS_DESCRICAO_MINIMO:
+        por_item = min(tokens_descricao, TOKENS_DESCRICAO_MINIMO)
+
+    linhas = []
+    usados = custo_cabecalho
+    for item in itens:
+        linha = _linha_item(item, por_item)
+        custo = estimar_tokens(linha) + 1
+        if linhas and usados + custo > orcamento:
+            break
+        linhas.append(linha)
+        usados += custo
+
+    resumo = f"total={total}" if len(linhas) == total else f"mostrando {len(linhas)} de {total}"
+    return "\n".join([resumo, cabecalho] + linhas)
+
+
+def compactar_resultado(function_result: dict, orcamento_tokens: int = ORCAMENTO_PADRAO,
+                        tokens_descricao: int = TOKENS_DESCRICAO_PADRAO) -> str:
+    """
+    Serializa o resultado de uma função para o prompt de formatação, sem
+    indentação nem chaves repetidas e dentro de um orçamento de tokens.
+
+    Buscas viram uma tabela "nome|preço|tags|descrição" com uma linha por
+    item; as descrições são truncadas e, se preciso, os itens mais caros
+    ficam de fora (com "mostrando N de M").
+
+    Args:
+        function_result (dict): Resultado de `_execute_function`
+        orcamento_tokens (int): Máximo de tokens do texto gerado (aproximado)
+        tokens_descricao (int): Máximo de tokens da descrição de cada item
+
+    Returns:
+        str: Resultado compacto
+    """
+    if not function_result.get("success"):
+        return f"erro: {function_result.get('error', 'erro desconhecido')}"
+
+    if "results" in function_result:
+        itens = function_result["results"]
+        if not itens:
+            return "nenhum item encontrado"
+        return _tabela_itens(itens, function_result.get("count", len(itens)), orcamento_tokens, tokens_descricao)
+
+    resultado = function_result.get("result")
+    if not resultado:
+        return "catálogo vazio"
+    if "nome" in resultado:
+        return _tabela_itens([resultado], 1, orcamento_tokens, tokens_descricao)
+    return " ".join(f"{chave}={_preco(valor)}" for chave, valor in resultado.items())
+
+
+def serializar_resultado(function_result: dict, formato: str = FORMATO_COMPACTO,
+                         orcamento_tokens: int = ORCAMENTO_PADRAO) -> str:
+    """
+    Texto do resultado para o prompt de formatação.
+
+    Args:
+        function_result (dict): Resultado de `_execute_function`
+        formato (str): "compacto" (tabela com orçamento) ou "json" (JSON indentado completo)
+        orcamento_tokens (int): Orçamento do formato compacto
+
+    Returns:
+        str: Resultado serializado
+    """
+    if formato == FORMATO_JSON:
+        return json.dumps(function_result, ensure_ascii=False, indent=2)
+    return compactar_resultado(function_result, orcamento_tokens)
@@ -0,0 +1,111 @@
+import math
+
+from .parser_intencao import MAPEAMENTO_TAGS
+from .tools.indice_texto import normalizar_texto, tokenizar
+
+# Prefixo usado para agrupar o vocabulário das tags
+TAMANHO_PREFIXO = 3
+
+# Fração mínima do peso (IDF) de uma tag que precisa aparecer na mensagem
+COBERTURA_MINIMA = 0.5
+
+
+def _casa(termo: str, token: str) -> bool:
+    """
+    Igualdade tolerante a flexões: "veganos" ~ "vegano", "apimentada" ~ "apimentado".
+
+    Os dois precisam compartilhar um prefixo de pelo menos 4 caracteres que
+    cubra tudo, menos no máximo 2 caracteres finais da palavra menor.
+    """
+    if termo == token:
+        return True
+    menor = min(len(termo), len(token))
+    if menor < 4:
+        return False
+    comum = 0
+    while comum < menor and termo[comum] == token[comum]:
+        comum += 1
+    return comum >= max(4, menor - 2)
+
+
+class TagRetriever:
+    """
+    Recuperação lexical das tags relevantes para uma mensagem.
+
+    Cada tag é quebrada em palavras normalizadas (sem acento, minúsculas). A
+    pontuação de uma tag é a fração do seu peso que aparece na mensagem, com
+    cada palavra ponderada pelo IDF: em "sem lactose", "lactose" pesa mais que
+    "sem", então "sem glúten" na mensagem não traz "sem lactose". Os termos de
+    MAPEAMENTO_TAGS encontrados na mensagem ("apimentado" → "picante") entram
+    na frente das demais.
+    """
+
+    def __init__(self, tags: list):
+        """
+        Args:
+            tags (list): Tags do catálogo
+        """
+        self.tags = sorted(tags)
+        self._posicao = {tag: indice for indice, tag in enumerate(self.tags)}
+        self._palavras_tag = [tokenizar(normalizar_texto(tag)) for tag in self.tags]
+
+        frequencia = {}
+        for palavras in self._palavras_tag:
+            for palavra in set(palavras):
+                frequencia[palavra] = frequencia.get(palavra, 0) + 1
+        total = max(1, len(self.tags))
+        self._idf = {palavra: math.log(1 + total / quantidade) for palavra, quantidade in frequencia.items()}
+        self._peso_tag = [sum(self._idf[palavra] for palavra in set(palavras)) for palavras in self._palavras_tag]
+
+        self._tags_da_palavra = {}
+        for indice, palavras in enumerate(self._palavras_tag):
+            for palavra in set(palavras):
+                self._tags_da_palavra.setdefault(palavra, []).append(indice)
+
+        self._vocabulario_prefixo = {}
+        for palavra in self._idf:
+            self._vocabulario_prefixo.setdefault(palavra[:TAMANHO_PREFIXO], []).append(palavra)
+
+        self._mapeamento = [(normalizar_texto(termo), [self._posicao[tag] for tag in destino if tag in self._posicao])
+                            for termo, destino in MAPEAMENTO_TAGS.items()]
+
+    def _palavras_vocabulario(self, token: str) -> list:
+        """Palavras das tags que casam com um token da mensagem."""
+        if len(token) < 4:
+            return [token] if token in self._idf else []
+        candidatas = self._vocabulario_prefixo.get(token[:TAMANHO_PREFIXO], [])
+        return [palavra for palavra in candidatas if _casa(token, palavra)]
+
+    def relevantes(self, texto: str, limite: int) -> list:
+        """
+        Tags mais relevantes para a mensagem.
+
+        Args:
+            texto (str): Mensagem do usuário
+            limite (int): Máximo de tags devolvidas
+
+        Returns:
+            list: Até `limite` tags, em ordem alfabética (prompt estável)
+        """
+        normalizado = normalizar_texto(texto)
+
+        casadas = set()
+        for token in set(tokenizar(normalizado)):
+            casadas.update(self._palavras_vocabulario(token))
+
+        peso_casado = {}
+        for palavra in casadas:
+            for indice in self._tags_da_palavra[palavra]:
+                peso_casado[indice] = peso_casado.get(indice, 0.0) + self._idf[palavra]
+
+        # (cobertura, peso casado): tags do mapeamento vêm antes de todas
+        pontuacao = {indice: (peso / self._peso_tag[indice], peso) for indice, peso in peso_casado.items()
+                     if peso >= COBERTURA_MINIMA * self._peso_tag[indice]}
+        for termo, destino in self._mapeamento:
+            if termo in normalizado:
+                for indice in destino:
+                    pontuacao[indice] = (math.inf, math.inf)
+
+        escolhidas = sorted(pontuacao, key=lambda indice: (-pontuacao[indice][0], -pontuacao[indice][1],
+                                                           self.tags[indice]))[:limite]
+        return sorted(self.tags[indice] for indice in escolhidas)
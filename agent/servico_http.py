@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+API HTTP do assistente (sem interface), para tráfego de produção
+
+Rotas:
+    POST /recomendar   {"mensagem": "...", "sessao": "id opcional"} → resposta do agente e detalhes do turno
+    POST /buscar       filtros de search_catalog       → pratos (com "aproximados": true, os mais próximos)
+    GET  /agregados?tags=vegano&tags=picante           → mínimo, máximo, média, total e pratos extremos
+    GET  /saude                                        → versão do catálogo e pid do worker
+    GET  /metricas                                     → métricas do worker (Prometheus; /metricas.json em JSON)
+
+Roda em um pool pré-fork: o processo mestre carrega o catálogo e monta os
+índices uma única vez, congela esses objetos para o coletor de lixo
+(gc.freeze) e só então cria os workers. As páginas dos índices ficam
+compartilhadas entre os processos (cópia na escrita), então mais workers não
+multiplicam a memória do catálogo: cada worker só paga a memória de trabalho
+das suas requisições. Os índices evitam escrever nos objetos herdados (posições
+em arrays, bitsets e arrays do NumPy), e um catálogo NDJSON fica no cache de
+páginas do sistema, mapeado uma vez para todos.
+
+Quem recarrega o catálogo é o mestre (a cada CATALOGO_INTERVALO_RECARGA
+segundos ou ao receber SIGHUP); a cada nova versão ele cria uma nova geração
+de workers e encerra a anterior depois que ela termina as requisições em curso.
+
+    python -m agent.servico_http --porta 8080 --workers 4
+"""
+
+import argparse
+import gc
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from dotenv import load_dotenv
+
+# Antes do catálogo: CATALOGO_PATH e CATALOGO_BACKEND podem vir do .env
+load_dotenv()
+
+from .tools.procura_catalogo import (CATALOGO_INTERVALO_RECARGA, get_cheapest_item_by_tags,
+                                     get_most_expensive_item_by_tags, get_price_range_by_tags, repositorio,
+                                     search_catalog, start_search_processes, uses_search_processes)
+
+# Tamanho máximo aceito para o corpo de uma requisição
+TAMANHO_MAXIMO_CORPO = 64 * 1024
+
+# Segundos que um worker tem para terminar as requisições em curso ao ser encerrado
+PRAZO_ENCERRAMENTO = 30.0
+
+# Conexões keep-alive ociosas por mais que isso são fechadas
+TIMEOUT_CONEXAO = 15.0
+
+CAMPOS_FILTROS = (
+    "budget", "incluir_tags", "excluir_tags", "ingredientes_obrigatorios", "modo_ingredientes", "redes"
+)
+
+
+class ErroRequisicao(Exception):
+    """Requisição inválida (HTTP 400)."""
+
+
+def criar_agente(offline: bool = False):
+    """
+    Agente usado pelos workers: o da OpenAI ou, sem API key, o offline.
+
+    Args:
+        offline (bool): Usa sempre o OfflineMealAgent (LLM local + templates)
+    """
+    from .agent_executor import MealRecommendationAgent
+    from .agente_offline import OfflineMealAgent
+
+    if not offline:
+        try:
+            return MealRecommendationAgent()
+        except Exception as e:
+            print(f"Aviso: API da OpenAI não disponível ({e}), usando o agente offline.")
+    return OfflineMealAgent()
+
+
+def validar_filtros(corpo: dict) -> dict:
+    """
+    Filtros de search_catalog a partir do corpo de POST /buscar.
+
+    Args:
+        corpo (dict): JSON recebido
+
+    Returns:
+        dict: Somente os campos conhecidos e não vazios
+
+    Raises:
+        ErroRequisicao: Campo com tipo inválido
+    """
+    if not isinstance(corpo, dict):
+        raise ErroRequisicao("O corpo deve ser um objeto JSON com os filtros.")
+    filtros = {}
+    for campo in CAMPOS_FILTROS:
+        valor = corpo.get(campo)
+        if valor is None or valor == []:
+            continue
+        if campo == "budget":
+            if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+                raise ErroRequisicao("budget deve ser um número.")
+        elif campo == "modo_ingredientes":
+            if valor not in ("qualquer", "todos"):
+                raise ErroRequisicao('modo_ingredientes deve ser "qualquer" ou "todos".')
+        elif not isinstance(valor, list) or not all(isinstance(texto, str) for texto in valor):
+            raise ErroRequisicao(f"{campo} deve ser uma lista de textos.")
+        filtros[campo] = valor
+    return filtros
+
+
+def agregados_tags(tags: list) -> dict:
+    """Agregados de preço dos pratos com todas as tags, em uma única versão do catálogo."""
+    snapshot = repositorio.snapshot
+    return {
+        "tags": tags,
+        **get_price_range_by_tags(tags, snapshot),
+        "cheapest": get_cheapest_item_by_tags(tags, snapshot),
+        "most_expensive": get_most_expensive_item_by_tags(tags, snapshot),
+        "versao_catalogo": snapshot.versao,
+    }
+
+
+def resumo_turno(turno: dict) -> dict:
+    """Campos públicos de um turno devolvido por chat_detalhado."""
+    resultado = turno.get("function_result") or {}
+    return {
+        "resposta": turno.get("resposta"),
+        "action": turno.get("action"),
+        "search_params": turno.get("search_params"),
+        "relaxado": turno.get("relaxado"),
+        "origem_decisao": turno.get("origem_decisao"),
+        "count": resultado.get("count"),
+        "tempos": turno.get("tempos"),
+        "erro": turno.get("erro"),
+    }
+
+
+class ServidorAPI(ThreadingHTTPServer):
+    # Ao encerrar, espera as requisições em curso em vez de abandoná-las
+    daemon_threads = False
+    block_on_close = True
+
+
+def criar_servidor(agente, host: str = "127.0.0.1", porta: int = 8080, sock: socket.socket = None) -> ServidorAPI:
+    """
+    Servidor HTTP da API.
+
+    Args:
+        agente: MealRecommendationAgent (ou compatível) que atende /recomendar
+        host (str): Endereço de escuta
+        porta (int): Porta de escuta (0 = porta livre qualquer)
+        sock (socket.socket): Socket já em escuta, herdado do mestre no modo pré-fork
+
+    Returns:
+        ServidorAPI: Servidor pronto para serve_forever()
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        timeout = TIMEOUT_CONEXAO
+
+        def _enviar(self, status: int, dados: bytes, tipo: str):
+            self.send_response(status)
+            self.send_header("Content-Type", tipo)
+            self.send_header("Content-Length", str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def _json(self, status: int, corpo: dict):
+            self._enviar(status, json.dumps(corpo, ensure_ascii=False).encode('utf-8'),
+                         "application/json; charset=utf-8")
+
+        def _erro(self, status: int, mensagem: str):
+            self._json(status, {"erro": mensagem})
+
+        def _ler_json(self):
+            tamanho = int(self.headers.get("Content-Length") or 0)
+            if tamanho > TAMANHO_MAXIMO_CORPO:
+                self.close_connection = True
+                raise ErroRequisicao(f"Corpo maior que {TAMANHO_MAXIMO_CORPO} bytes.")
+            try:
+                return json.loads(self.rfile.read(tamanho) or b'{}')
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                raise ErroRequisicao(f"JSON inválido: {e}")
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            rota = url.path.rstrip('/')
+            if rota == "/saude":
+                self._json(200, {"status": "ok", "versao_catalogo": repositorio.versao, "pid": os.getpid()})
+            elif rota == "/agregados":
+                self._json(200, agregados_tags(parse_qs(url.query).get("tags", [])))
+            elif rota == "/metricas":
+                self._enviar(200, agente.metricas_prometheus().encode('utf-8'), "text/plain; version=0.0.4")
+            elif rota == "/metricas.json":
+                self._json(200, agente.metricas_snapshot())
+            else:
+                self._erro(404, "Rota não encontrada")
+
+        def do_POST(self):
+            rota = urlsplit(self.path).path.rstrip('/')
+            try:
+                corpo = self._ler_json()
+                if rota == "/recomendar":
+                    mensagem = corpo.get("mensagem") if isinstance(corpo, dict) else None
+                    if not isinstance(mensagem, str) or not mensagem.strip():
+                        raise ErroRequisicao('Informe o texto do pedido em "mensagem".')
+                    sessao = corpo.get("sessao")
+                    if sessao is not None and not isinstance(sessao, str):
+                        raise ErroRequisicao('"sessao" deve ser um texto.')
+                    self._json(200, resumo_turno(agente.chat_detalhado(mensagem, sessao)))
+                elif rota == "/buscar":
+                    filtros = validar_filtros(corpo)
+                    snapshot = repositorio.snapshot
+                    resultados = search_catalog(filtros, snapshot, aproximados=bool(corpo.get("aproximados")))
+                    self._json(200, {"results": resultados, "count": len(resultados),
+                                     "versao_catalogo": snapshot.versao})
+                else:
+                    self._erro(404, "Rota não encontrada")
+            except ErroRequisicao as e:
+                self._erro(400, str(e))
+            except Exception as e:
+                self._erro(500, f"Erro interno: {e}")
+
+        def log_message(self, format, *args):
+            pass
+
+    if sock is None:
+        return ServidorAPI((host, porta), Handler)
+    servidor = ServidorAPI(sock.getsockname()[:2], Handler, bind_and_activate=False)
+    servidor.socket.close()
+    servidor.socket = sock
+    return servidor
+
+
+def _executar_worker(sock: socket.socket, offline: bool):
+    """Corpo de um worker pré-fork: atende no socket herdado até receber SIGTERM."""
+    gc.enable()
+    # O pool de busca das partições nasce por fork: antes de qualquer thread do worker
+    start_search_processes()
+    servidor = criar_servidor(criar_agente(offline), sock=sock)
+
+    def encerrar(signum, frame):
+        # shutdown() espera o loop de serve_forever, então não pode rodar nesta thread
+        threading.Thread(target=servidor.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, encerrar)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    try:
+        servidor.serve_forever()
+    finally:
+        servidor.server_close()
+
+
+class PreforkMaster:
+    """
+    Processo mestre do pool pré-fork.
+
+    Mantém `workers` processos filhos atendendo no mesmo socket, repõe os que
+    morrem, recarrega o catálogo e troca a geração de workers quando ele muda.
+    """
+
+    def __init__(self, sock: socket.socket, workers: int, offline: bool = False, intervalo_recarga: float = 0.0):
+        """
+        Args:
+            sock (socket.socket): Socket em escuta compartilhado pelos workers
+            workers (int): Quantidade de workers
+            offline (bool): Workers usam o agente offline
+            intervalo_recarga (float): Segundos entre verificações do catálogo (0 = só com SIGHUP)
+        """
+        self.sock = sock
+        self.workers = workers
+        self.offline = offline
+        self.intervalo_recarga = intervalo_recarga
+        self.filhos = {}
+        self.geracao = 0
+        self._parar = False
+        self._recarregar = False
+
+    def _criar_worker(self):
+        pid = os.fork()
+        if pid == 0:
+            codigo = 0
+            try:
+                _executar_worker(self.sock, self.offline)
+            except BaseException:
+                codigo = 1
+            finally:
+                os._exit(codigo)
+        self.filhos[pid] = self.geracao
+
+    def _nova_geracao(self):
+        """Congela o catálogo atual e cria workers novos; os antigos terminam o que estão fazendo."""
+        antigos = list(self.filhos)
+        self.geracao += 1
+        # Objetos vivos até aqui (catálogo e índices) saem do alcance do coletor de
+        # lixo, que de outro modo tocaria suas páginas e desfaria o compartilhamento
+        gc.collect()
+        gc.freeze()
+        # Sem isso, o que estiver no buffer seria impresso de novo por cada filho
+        sys.stdout.flush()
+        for _ in range(self.workers):
+            self._criar_worker()
+        for pid in antigos:
+            self._sinalizar(pid, signal.SIGTERM)
+
+    def _sinalizar(self, pid: int, sinal: int):
+        try:
+            os.kill(pid, sinal)
+        except ProcessLookupError:
+            pass
+
+    def _recolher(self):
+        """Recolhe workers encerrados e repõe os da geração atual que morreram."""
+        while self.filhos:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            geracao = self.filhos.pop(pid, None)
+            if geracao == self.geracao and not self._parar:
+                print(f"Worker {pid} terminou inesperadamente; criando outro.")
+                self._criar_worker()
+
+    def executar(self):
+        """Roda o mestre até SIGTERM/SIGINT."""
+        def parar(signum, frame):
+            self._parar = True
+
+        def recarregar(signum, frame):
+            self._recarregar = True
+
+        signal.signal(signal.SIGTERM, parar)
+        signal.signal(signal.SIGINT, parar)
+        signal.signal(signal.SIGHUP, recarregar)
+
+        # O mestre verifica o catálogo sozinho: threads não sobrevivem ao fork
+        repositorio.parar_observacao()
+        self._nova_geracao()
+        proxima_verificacao = time.monotonic() + self.intervalo_recarga
+        try:
+            while not self._parar:
+                time.sleep(0.2)
+                self._recolher()
+                verificar = self.intervalo_recarga > 0 and time.monotonic() >= proxima_verificacao
+                if self._recarregar or verificar:
+                    forcar, self._recarregar = self._recarregar, False
+                    proxima_verificacao = time.monotonic() + self.intervalo_recarga
+                    if repositorio.reload(force=forcar):
+                        print(f"Catálogo versão {repositorio.versao}: trocando os workers.")
+                        self._nova_geracao()
+        finally:
+            self._encerrar_workers()
+
+    def _encerrar_workers(self):
+        """Pede que os workers terminem e mata os que passarem do prazo."""
+        # Também no caminho de erro: workers que saírem não devem ser repostos
+        self._parar = True
+        for pid in list(self.filhos):
+            self._sinalizar(pid, signal.SIGTERM)
+        limite = time.monotonic() + PRAZO_ENCERRAMENTO
+        while self.filhos and time.monotonic() < limite:
+            self._recolher()
+            time.sleep(0.05)
+        for pid in list(self.filhos):
+            self._sinalizar(pid, signal.SIGKILL)
+        self.sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API HTTP do assistente de refeições (pré-fork)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=int(os.getenv('SERVICO_WORKERS', '2')),
+                        help="Processos atendendo requisições (1 = processo único, sem fork)")
+    parser.add_argument("--offline", action="store_true",
+                        help="Usa o agente offline (LLM local + templates), sem API da OpenAI")
+    parser.add_argument("--backlog", type=int, default=128, help="Fila de conexões do socket")
+    args = parser.parse_args(argv)
+
+    # Um processo com threads não cria mais o pool de busca das partições: com
+    # recarga automática, o worker único também é recriado pelo mestre a cada versão
+    refork = args.workers <= 1 and CATALOGO_INTERVALO_RECARGA > 0 and uses_search_processes()
+    if (args.workers <= 1 and not refork) or not hasattr(os, "fork"):
+        # O pool de busca das partições nasce por fork, então a observação do
+        # catálogo (uma thread) só começa depois dele
+        repositorio.parar_observacao()
+        start_search_processes()
+        if CATALOGO_INTERVALO_RECARGA > 0:
+            repositorio.observar(CATALOGO_INTERVALO_RECARGA)
+        servidor = criar_servidor(criar_agente(args.offline), args.host, args.porta)
+        print(f"API em http://{args.host}:{servidor.server_address[1]} (processo único)")
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            servidor.server_close()
+        return
+
+    sock = socket.create_server((args.host, args.porta), backlog=args.backlog)
+    print(f"API em http://{args.host}:{sock.getsockname()[1]} ({args.workers} workers, "
+          f"catálogo versão {repositorio.versao}, {len(repositorio.snapshot.motor)} pratos)")
+    PreforkMaster(sock, max(1, args.workers), args.offline, CATALOGO_INTERVALO_RECARGA).executar()
+
+
+if __name__ == "__main__":
+    main()
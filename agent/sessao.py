@@ -0,0 +1,239 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+from .payload_formatacao import estimar_tokens, truncar_tokens
+from .tools.indice_texto import MODO_TODOS
+from .tools.restricoes import atende
+
+# Posições guardadas do resultado de uma busca para filtrar os refinamentos localmente
+LIMITE_CANDIDATOS = 50
+# Itens mostrados ao usuário em uma busca (o mesmo limite de search_catalog)
+LIMITE_RESULTADOS = 10
+# Turnos guardados para o resumo do histórico
+LIMITE_TURNOS = 20
+# Tokens do resumo do histórico enviado ao LLM
+ORCAMENTO_HISTORICO = 200
+
+
+def combinar_filtros(camadas: list) -> tuple:
+    """
+    Junta os filtros de vários turnos em uma busca só.
+
+    Tags se somam e o orçamento é o do turno mais recente que citou um ("até
+    40" e depois "e até 60?" busca até 60). Ingredientes de turnos
+    diferentes são exigências independentes ("com frango" e depois "só os com
+    arroz"): viram um requisito do modo "todos" quando cada turno pediu um
+    ingrediente só (ou pediu todos os seus); senão, o primeiro turno vai para
+    o motor e os demais precisam ser verificados item a item.
+
+    Args:
+        camadas (list): Filtros de search_catalog, um por turno
+
+    Returns:
+        tuple: (filtros para o motor, filtros de ingredientes que o motor não cobre)
+    """
+    combinado = {}
+    com_ingredientes = []
+    for filtros in camadas:
+        for campo in ("incluir_tags", "excluir_tags"):
+            for tag in filtros.get(campo) or []:
+                if tag not in combinado.setdefault(campo, []):
+                    combinado[campo].append(tag)
+        if filtros.get("budget") is not None:
+            combinado["budget"] = filtros["budget"]
+        if filtros.get("ingredientes_obrigatorios"):
+            com_ingredientes.append({campo: filtros[campo] for campo in ("ingredientes_obrigatorios", "modo_ingredientes")
+                                     if campo in filtros})
+
+    if len(com_ingredientes) <= 1:
+        for filtros in com_ingredientes:
+            combinado.update(filtros)
+        return combinado, []
+
+    if all(len(filtros["ingredientes_obrigatorios"]) == 1 or filtros.get("modo_ingredientes") == MODO_TODOS
+           for filtros in com_ingredientes):
+        todos = []
+        for filtros in com_ingredientes:
+            todos += [ingrediente for ingrediente in filtros["ingredientes_obrigatorios"] if ingrediente not in todos]
+        combinado.update(ingredientes_obrigatorios=todos, modo_ingredientes=MODO_TODOS)
+        return combinado, []
+
+    combinado.update(com_ingredientes[0])
+    return combinado, com_ingredientes[1:]
+
+
+class SessionState:
+    """
+    Estado de uma conversa: a última decisão, os itens do último resultado e
+    um histórico curto.
+
+    Depois de uma busca, guarda as posições no motor (da versão do catálogo
+    usada) de até LIMITE_CANDIDATOS itens que atendem aos filtros, em ordem
+    de preço, e se eles são todos os que atendem (`completo`); os itens são
+    remontados pelo motor quando um refinamento precisa deles. Um refinamento
+    ("só os sem lactose") só acrescenta filtros, então o resultado dele está
+    dentro desse conjunto: se o conjunto está completo, ou se ainda sobram
+    itens suficientes para a resposta, filtrar os itens guardados dá
+    exatamente o que a busca no catálogo daria.
+    """
+
+    def __init__(self):
+        self.camadas = []
+        self.candidatos = []
+        self.completo = False
+        self.versao_catalogo = None
+        self.ultima_acao = None
+        self.preco_mostrado = None
+        self.historico = deque(maxlen=LIMITE_TURNOS)
+        self.atualizado_em = time.monotonic()
+        self.lock = threading.Lock()
+
+    def tem_contexto(self) -> bool:
+        return self.ultima_acao is not None
+
+    def preco_referencia(self):
+        """Menor preço mostrado no último turno ("mais barato que isso"), ou None."""
+        return self.preco_mostrado
+
+    def filtrar(self, filtros: dict, snapshot, minimo: float) -> tuple:
+        """
+        Aplica filtros novos aos itens guardados, se o resultado for exato.
+
+        Args:
+            filtros (dict): Filtros acrescentados pelo refinamento
+            snapshot (CatalogSnapshot): Versão do catálogo do turno atual
+            minimo (float): Itens necessários para a resposta quando o conjunto
+                guardado não está completo
+
+        Returns:
+            tuple: (posições e itens que atendem, em ordem de preço, e se são
+                   todos os do catálogo), ou None se for preciso buscar no
+                   catálogo (outra versão ou itens guardados insuficientes)
+        """
+        with self.lock:
+            if snapshot.versao != self.versao_catalogo or not self.candidatos:
+                return None
+            candidatos, completo = self.candidatos, self.completo
+        posicoes, itens = [], []
+        for posicao in candidatos:
+            item = snapshot.motor.item(posicao)
+            if atende(item, filtros):
+                posicoes.append(posicao)
+                itens.append(item)
+        if completo or len(itens) >= minimo:
+            return posicoes, itens, completo
+        return None
+
+    def registrar(self, turno: dict, camadas: list, candidatos: list, completo: bool, versao_catalogo: int):
+        """
+        Guarda o resultado de um turno bem-sucedido.
+
+        Args:
+            turno (dict): Turno executado (ação, search_params e function_result)
+            camadas (list): Filtros em vigor, um por turno da cadeia de refinamentos
+            candidatos (list): Posições no motor dos itens que atendem às camadas, em ordem de preço
+            completo (bool): Se `candidatos` tem todos os itens que atendem
+            versao_catalogo (int): Versão do catálogo usada (as posições só valem para ela)
+        """
+        resultado = turno.get("function_result") or {}
+        mostrados = resultado.get("results")
+        if mostrados is None:
+            mostrados = [resultado["result"]] if isinstance(resultado.get("result"), dict) and "nome" in resultado["result"] else []
+
+        with self.lock:
+            self.camadas = camadas
+            self.candidatos = tuple(candidatos[:LIMITE_CANDIDATOS])
+            self.completo = completo and len(candidatos) <= LIMITE_CANDIDATOS
+            self.versao_catalogo = versao_catalogo
+            self.ultima_acao = turno.get("action")
+            self.preco_mostrado = min((item["preco"] for item in mostrados), default=None)
+            self.historico.append(_resumir_turno(turno, mostrados))
+            self.atualizado_em = time.monotonic()
+
+    def resumo(self, orcamento_tokens: int = ORCAMENTO_HISTORICO) -> str:
+        """
+        Histórico da conversa para o LLM, dos turnos mais recentes para trás até o orçamento.
+
+        Args:
+            orcamento_tokens (int): Máximo de tokens do resumo
+
+        Returns:
+            str: Uma linha por turno, em ordem cronológica ("" sem histórico)
+        """
+        with self.lock:
+            historico = list(self.historico)
+        linhas = []
+        usados = 0
+        for linha in reversed(historico):
+            custo = estimar_tokens(linha) + 1
+            if usados + custo > orcamento_tokens:
+                if not linhas:
+                    linhas.append(truncar_tokens(linha, orcamento_tokens))
+                break
+            linhas.append(linha)
+            usados += custo
+        return "\n".join(reversed(linhas))
+
+
+def _resumir_turno(turno: dict, mostrados: list) -> str:
+    """Linha do histórico: pedido, filtros usados e os primeiros pratos mostrados."""
+    filtros = turno.get("search_params") or {}
+    partes = [f'usuário: "{turno.get("user_message", "")}"', f'ação: {turno.get("action")}']
+    if filtros:
+        partes.append("filtros: " + "; ".join(f"{campo}={valor}" for campo, valor in filtros.items()))
+    if mostrados:
+        partes.append("mostrados: " + ", ".join(f'{item["nome"]} ({item["preco"]:.2f})' for item in mostrados[:3]))
+    return " | ".join(partes)
+
+
+class SessionStore:
+    """
+    Estados de conversa por id de sessão, em memória e com tamanho limitado.
+
+    Guarda no máximo `max_sessoes` (as usadas há mais tempo saem primeiro) e
+    descarta as que ficaram sem uso por mais de `ttl` segundos.
+    """
+
+    def __init__(self, max_sessoes: int = 10000, ttl: float = 1800.0):
+        """
+        Args:
+            max_sessoes (int): Máximo de sessões em memória
+            ttl (float): Segundos sem uso até a sessão ser esquecida
+        """
+        self.max_sessoes = max_sessoes
+        self.ttl = ttl
+        self._sessoes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessoes)
+
+    def estatisticas(self) -> dict:
+        """Sessões em memória e o limite configurado."""
+        return {"ativas": len(self._sessoes), "max_sessoes": self.max_sessoes}
+
+    def obter(self, sessao_id: str) -> SessionState:
+        """
+        Estado da sessão, criado vazio se ela não existir ou tiver expirado.
+
+        Args:
+            sessao_id (str): Id da conversa
+
+        Returns:
+            SessionState: Estado da sessão
+        """
+        agora = time.monotonic()
+        with self._lock:
+            sessao = self._sessoes.get(sessao_id)
+            if sessao is None or agora - sessao.atualizado_em > self.ttl:
+                sessao = self._sessoes[sessao_id] = SessionState()
+            self._sessoes.move_to_end(sessao_id)
+            while len(self._sessoes) > self.max_sessoes:
+                self._sessoes.popitem(last=False)
+            return sessao
+
+    def encerrar(self, sessao_id: str):
+        """Esquece o estado da sessão (ex.: "Reiniciar conversa")."""
+        with self._lock:
+            self._sessoes.pop(sessao_id, None)
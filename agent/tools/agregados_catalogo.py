@@ -0,0 +1,425 @@
+import json
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from .carrega_catalogo import CAMPOS_PRATO, ItensCompactos, Prato, em_memoria, extrair_colunas
+
+# Combinações de tags materializadas mantidas ao mesmo tempo (as menos usadas saem)
+COMBINACOES_MAX = 256
+
+
+def _extras(item):
+    """Campos de um item além dos quatro do catálogo, num formato comparável (None se não houver)."""
+    if isinstance(item, Prato):
+        extras = item.extras
+    elif len(item) > len(CAMPOS_PRATO) or 'tags' not in item:
+        extras = {campo: valor for campo, valor in item.items() if campo not in CAMPOS_PRATO}
+    else:
+        return None
+    if not extras:
+        return None
+    try:
+        return frozenset(extras.items())
+    except TypeError:
+        # Extras com listas ou dicts entram serializados
+        return json.dumps(extras, sort_keys=True, ensure_ascii=False)
+
+
+def _hash(item) -> int:
+    """Hash do conteúdo de um item (todos os campos, inclusive os extras), usado para comparar versões."""
+    if isinstance(item, Prato):
+        return hash((item.nome, item.preco, item.descricao, item.tags, _extras(item)))
+    return hash((item['nome'], item['preco'], item['descricao'], tuple(item.get('tags', ())), _extras(item)))
+
+
+def _hashes(itens, colunas: dict) -> array:
+    """Hash de cada item de um catálogo em memória (lista ou ItensCompactos), como em `_hash`."""
+    registros = itens.registros if isinstance(itens, ItensCompactos) else itens
+    return array('q', map(hash, zip(colunas['nome'], colunas['preco'], colunas['descricao'],
+                                    map(tuple, colunas['tags']), map(_extras, registros))))
+
+
+def _publico(item) -> dict:
+    """Item no formato do catálogo, seja ele um dict ou um registro Prato."""
+    return item.como_dict() if isinstance(item, Prato) else item
+
+
+def _intercalar(quantidade: int, anterior, proxima) -> list:
+    """`quantidade` ordens crescentes entre `anterior` e `proxima` (None = sem limite), ou None se não couberem."""
+    if anterior is None and proxima is None:
+        return list(range(quantidade))
+    if anterior is None:
+        return [proxima - quantidade + passo for passo in range(quantidade)]
+    if proxima is None:
+        return [anterior + 1 + passo for passo in range(quantidade)]
+    intervalo = (proxima - anterior) / (quantidade + 1)
+    valores = [anterior + intervalo * (passo + 1) for passo in range(quantidade)]
+    # Depois de muitas recargas no mesmo ponto, a precisão do float acaba
+    limites = [anterior] + valores + [proxima]
+    if all(menor < maior for menor, maior in zip(limites, limites[1:])):
+        return valores
+    return None
+
+
+class _Agregado:
+    """Ids dos itens de um grupo em ordem de (preço, ordem no catálogo), com a soma dos preços para a média."""
+
+    __slots__ = ('ids', 'soma')
+
+    def __init__(self, ids: array = None, soma: float = 0.0):
+        self.ids = ids if ids is not None else array('i')
+        self.soma = soma
+
+    def adicionar(self, id_item: int, posicao, preco: float):
+        insort(self.ids, id_item, key=posicao)
+        self.soma += preco
+
+    def remover(self, id_item: int, posicao, preco: float):
+        del self.ids[bisect_left(self.ids, posicao(id_item), key=posicao)]
+        self.soma -= preco
+
+    def copia(self) -> '_Agregado':
+        return _Agregado(self.ids[:], self.soma)
+
+
+class CatalogAggregates:
+    """
+    Agregados de preço do catálogo: global, por tag e por combinação de tags.
+
+    Cada grupo guarda os ids dos itens em ordem de (preço, ordem no catálogo), então
+    mínimo, máximo, contagem, média e os itens correspondentes (argmin/argmax)
+    saem em O(1). Empates ficam com o item que vem primeiro no catálogo, como
+    nos motores de busca. O global e as tags individuais são montados junto
+    com o catálogo; uma combinação ("vegano" + "sem lactose") é materializada
+    na primeira consulta, a partir da menor das suas tags, e a partir daí é
+    mantida junto com as outras.
+
+    `adicionar` e `remover` atualizam só os grupos das tags do item. Numa
+    recarga, `atualizado` aplica a diferença entre as duas versões do catálogo
+    em vez de recalcular tudo; as versões compartilham os grupos, e cada grupo
+    só é copiado quando um item dele muda.
+    """
+
+    def __init__(self, itens=(), colunas: dict = None):
+        """
+        Args:
+            itens (list): Itens do catálogo (lista, ItensCompactos ou sequência preguiçosa)
+            colunas (dict): Colunas já extraídas pelo carregador do catálogo
+        """
+        if colunas is None:
+            colunas = extrair_colunas(itens)
+        precos = colunas['preco']
+
+        # O id de um item é a sua posição na carga; itens removidos viram None.
+        # A ordem no catálogo começa igual ao id e, nas recargas, os itens novos
+        # recebem uma ordem entre a dos vizinhos que continuaram
+        self.incremental = em_memoria(itens)
+        if isinstance(itens, ItensCompactos):
+            self.itens = list(itens.registros)
+        else:
+            self.itens = list(itens) if self.incremental else itens
+        self.hashes = _hashes(itens, colunas) if self.incremental else None
+        self.precos = list(precos)
+        self.ordens = array('d', range(len(precos)))
+        self.ultima_ordem = len(precos) - 1
+        # Uma tupla (sem tags repetidas) por combinação de tags, compartilhada
+        # pelos itens que a têm
+        self._conjuntos = {}
+        self.tags = [self._conjunto(tags_item) for tags_item in colunas['tags']]
+        self.removidos = 0
+
+        self.global_ = _Agregado(soma=sum(precos))
+        self.por_tag = {}
+        # A ordenação é estável: entre preços iguais, a ordem do catálogo
+        self.global_.ids = array('i', sorted(range(len(precos)), key=precos.__getitem__))
+        for id_item in self.global_.ids:
+            for tag in self.tags[id_item]:
+                agregado = self.por_tag.get(tag)
+                if agregado is None:
+                    agregado = self.por_tag[tag] = _Agregado()
+                agregado.ids.append(id_item)
+                agregado.soma += precos[id_item]
+
+        self.combinacoes = OrderedDict()
+        # ids dos grupos que outra versão (veja `copia`) também usa
+        self._compartilhados = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.global_.ids)
+
+    def _posicao(self, id_item: int) -> tuple:
+        """Chave de ordenação dos grupos: (preço, ordem no catálogo)."""
+        return self.precos[id_item], self.ordens[id_item]
+
+    def _conjunto(self, tags) -> tuple:
+        chave = tuple(tags)
+        conjunto = self._conjuntos.get(chave)
+        if conjunto is None:
+            conjunto = self._conjuntos[chave] = tuple(dict.fromkeys(chave))
+        return conjunto
+
+    def _proprio(self, agregado: _Agregado) -> _Agregado:
+        """O grupo pronto para alteração: copiado antes se ainda for compartilhado."""
+        if id(agregado) in self._compartilhados:
+            self._compartilhados.discard(id(agregado))
+            return agregado.copia()
+        return agregado
+
+    def _grupos(self, tags: tuple) -> list:
+        """Grupos afetados por um item com estas tags, já prontos para alteração."""
+        self.global_ = self._proprio(self.global_)
+        grupos = [self.global_]
+        for tag in tags:
+            agregado = self.por_tag[tag] = self._proprio(self.por_tag[tag])
+            grupos.append(agregado)
+        for combinacao in [combinacao for combinacao in self.combinacoes if combinacao.issubset(tags)]:
+            agregado = self.combinacoes[combinacao] = self._proprio(self.combinacoes[combinacao])
+            grupos.append(agregado)
+        return grupos
+
+    def adicionar(self, item: dict, ordem: float = None) -> int:
+        """
+        Inclui um item nos agregados.
+
+        Args:
+            item (dict | Prato): Item no formato do catálogo ou registro compacto
+            ordem (float): Ordem do item no catálogo, para os empates. Padrão: depois de todos.
+
+        Returns:
+            int: Id do item, usado em `remover`
+        """
+        if not self.incremental:
+            raise TypeError("Agregados de um catálogo preguiçoso não aceitam alterações.")
+        id_item = len(self.itens)
+        if ordem is None:
+            ordem = self.ultima_ordem + 1
+        self.ultima_ordem = max(self.ultima_ordem, ordem)
+        if isinstance(item, Prato):
+            preco, tags = item.preco, self._conjunto(item.tags)
+        else:
+            preco, tags = item['preco'], self._conjunto(item.get('tags', ()))
+        self.itens.append(item)
+        self.hashes.append(_hash(item))
+        self.precos.append(preco)
+        self.ordens.append(ordem)
+        self.tags.append(tags)
+        with self._lock:
+            for tag in tags:
+                self.por_tag.setdefault(tag, _Agregado())
+            for agregado in self._grupos(tags):
+                agregado.adicionar(id_item, self._posicao, preco)
+        return id_item
+
+    def remover(self, id_item: int):
+        """
+        Retira um item dos agregados.
+
+        Args:
+            id_item (int): Id devolvido por `adicionar` (ou posição na carga original)
+        """
+        if not self.incremental:
+            raise TypeError("Agregados de um catálogo preguiçoso não aceitam alterações.")
+        if self.itens[id_item] is None:
+            return
+        preco, tags = self.precos[id_item], self.tags[id_item]
+        with self._lock:
+            for agregado in self._grupos(tags):
+                agregado.remover(id_item, self._posicao, preco)
+            for tag in tags:
+                if not self.por_tag[tag].ids:
+                    del self.por_tag[tag]
+        self.itens[id_item] = None
+        self.removidos += 1
+
+    def copia(self) -> 'CatalogAggregates':
+        """
+        Cópia para alterar sem afetar quem ainda lê esta versão.
+
+        Os grupos são compartilhados entre as duas versões e cada um só é
+        copiado na primeira alteração (em qualquer das duas), então o custo
+        de uma recarga acompanha os grupos tocados, e não o catálogo inteiro.
+        """
+        nova = CatalogAggregates.__new__(CatalogAggregates)
+        nova.incremental = self.incremental
+        nova.itens = list(self.itens) if self.incremental else self.itens
+        nova.hashes = self.hashes[:] if self.incremental else None
+        nova.precos = list(self.precos)
+        nova.ordens = self.ordens[:]
+        nova.ultima_ordem = self.ultima_ordem
+        nova.tags = list(self.tags)
+        nova._conjuntos = dict(self._conjuntos)
+        nova.removidos = self.removidos
+        nova._lock = threading.Lock()
+        with self._lock:
+            nova.global_ = self.global_
+            nova.por_tag = dict(self.por_tag)
+            nova.combinacoes = OrderedDict(self.combinacoes)
+            compartilhados = {id(agregado) for agregado in nova.por_tag.values()}
+            compartilhados.update(id(agregado) for agregado in nova.combinacoes.values())
+            compartilhados.add(id(self.global_))
+            self._compartilhados |= compartilhados
+        nova._compartilhados = compartilhados
+        return nova
+
+    def atualizado(self, itens, colunas: dict) -> 'CatalogAggregates':
+        """
+        Agregados de uma nova versão do catálogo.
+
+        Compara os itens das duas versões pelo hash do conteúdo (todos os
+        campos) e aplica só as
+        inclusões e remoções numa cópia; os itens novos recebem uma ordem entre
+        a dos vizinhos que continuaram, para os empates seguirem o catálogo
+        novo. Recalcula do zero se alguma das versões for preguiçosa, se a
+        mudança (somada aos buracos de remoções anteriores) passar da metade do
+        catálogo ou se os itens que continuaram mudaram de ordem.
+
+        Args:
+            itens (list): Itens da nova versão (lista, ItensCompactos ou preguiçosa)
+            colunas (dict): Colunas da nova versão
+
+        Returns:
+            CatalogAggregates: Agregados da nova versão
+        """
+        if not self.incremental or not em_memoria(itens):
+            return CatalogAggregates(itens, colunas)
+
+        mantidos, remover = self._casar(_hashes(itens, colunas))
+        adicionar = [indice for indice, id_item in enumerate(mantidos) if id_item is None]
+
+        if (len(remover) + len(adicionar) + self.removidos) * 2 > len(itens):
+            return CatalogAggregates(itens, colunas)
+        ordens = self._ordens_novas(mantidos)
+        if ordens is None:
+            return CatalogAggregates(itens, colunas)
+
+        nova = self.copia()
+        for id_item in remover:
+            nova.remover(id_item)
+        for indice in adicionar:
+            item = itens.registro(indice) if isinstance(itens, ItensCompactos) else itens[indice]
+            nova.adicionar(item, ordens[indice])
+        return nova
+
+    def _casar(self, hashes: array) -> tuple:
+        """
+        Casa os itens da nova versão com os ids atuais.
+
+        Args:
+            hashes (array): Hash de cada item da nova versão (veja `_hash`)
+
+        Returns:
+            tuple: (id que cada item da nova versão mantém, ou None se for novo;
+                    ids que saíram do catálogo)
+        """
+        if self.removidos:
+            livres = {valor: id_item for id_item, valor in enumerate(self.hashes)
+                      if self.itens[id_item] is not None}
+        else:
+            livres = dict(zip(self.hashes, range(len(self.hashes))))
+        if len(livres) == len(self.hashes) - self.removidos:
+            mantidos = [livres.pop(valor, None) for valor in hashes]
+            return mantidos, list(livres.values())
+
+        # Com itens repetidos, cada hash guarda seus ids do último para o
+        # primeiro (pop devolve o primeiro)
+        livres = {}
+        for id_item in range(len(self.hashes) - 1, -1, -1):
+            if self.itens[id_item] is not None:
+                livres.setdefault(self.hashes[id_item], []).append(id_item)
+        mantidos = []
+        for valor in hashes:
+            ids = livres.get(valor)
+            mantidos.append(ids.pop() if ids else None)
+        return mantidos, [id_item for ids in livres.values() for id_item in ids]
+
+    def _ordens_novas(self, mantidos: list) -> dict:
+        """
+        Ordem no catálogo de cada item novo, entre a dos vizinhos que continuaram.
+
+        Args:
+            mantidos (list): Id atual de cada item da nova versão (None = item novo)
+
+        Returns:
+            dict: Índice na nova versão → ordem, ou None se os itens que
+                  continuaram mudaram de ordem (ou não há mais espaço entre eles)
+        """
+        ordens = {}
+        novos = []
+        anterior = None
+        for indice, id_item in enumerate(mantidos):
+            if id_item is None:
+                novos.append(indice)
+                continue
+            ordem = self.ordens[id_item]
+            if anterior is not None and ordem <= anterior:
+                return None
+            if novos:
+                valores = _intercalar(len(novos), anterior, ordem)
+                if valores is None:
+                    return None
+                ordens.update(zip(novos, valores))
+                novos = []
+            anterior = ordem
+        if novos:
+            ordens.update(zip(novos, _intercalar(len(novos), anterior, None)))
+        return ordens
+
+    def _agregado(self, tags: frozenset):
+        """Grupo de um conjunto de tags, materializando combinações sob demanda."""
+        if not tags:
+            return self.global_
+        if len(tags) == 1:
+            return self.por_tag.get(next(iter(tags)))
+
+        with self._lock:
+            agregado = self.combinacoes.get(tags)
+            if agregado is not None:
+                self.combinacoes.move_to_end(tags)
+                return agregado
+
+            grupos = [self.por_tag.get(tag) for tag in tags]
+            if not all(grupos):
+                return None
+            menor = min(grupos, key=lambda grupo: len(grupo.ids))
+            ids = array('i', [id_item for id_item in menor.ids if tags.issubset(self.tags[id_item])])
+            agregado = _Agregado(ids, sum(map(self.precos.__getitem__, ids)))
+            self.combinacoes[tags] = agregado
+            if len(self.combinacoes) > COMBINACOES_MAX:
+                self.combinacoes.popitem(last=False)
+            return agregado
+
+    def estatisticas(self, tags=()) -> dict:
+        """
+        Agregados dos itens que têm todas as tags informadas.
+
+        Args:
+            tags (iterable): Tags exigidas (vazio = catálogo inteiro)
+
+        Returns:
+            dict: min_price, max_price, avg_price, total_items, cheapest e
+                  most_expensive (itens, ou None se nenhum item tiver as tags)
+        """
+        agregado = self._agregado(frozenset(tags))
+        if agregado is None or not agregado.ids:
+            return {"min_price": 0, "max_price": 0, "avg_price": 0, "total_items": 0,
+                    "cheapest": None, "most_expensive": None}
+
+        with self._lock:
+            ids = agregado.ids
+            total = len(ids)
+            menor, maior = ids[0], ids[-1]
+            if total > 1 and self.precos[ids[-2]] == self.precos[maior]:
+                # Entre empates no preço máximo, o primeiro do catálogo
+                maior = ids[bisect_left(ids, self.precos[maior], key=self.precos.__getitem__)]
+            media = round(agregado.soma / total, 2)
+        return {
+            "min_price": self.precos[menor],
+            "max_price": self.precos[maior],
+            "avg_price": media,
+            "total_items": total,
+            "cheapest": _publico(self.itens[menor]),
+            "most_expensive": _publico(self.itens[maior]),
+        }
@@ -0,0 +1,132 @@
+import threading
+from collections import OrderedDict
+
+from .indice_texto import MODO_QUALQUER, MODO_TODOS, normalizar_texto
+
+
+def filtros_canonicos(filters: dict, corte_orcamento: int) -> tuple:
+    """
+    Forma canônica dos filtros de `search_catalog`, para chave de cache.
+
+    Filtros que selecionam os mesmos itens na mesma ordem viram a mesma tupla:
+    tags e redes em ordem alfabética, ingredientes normalizados e ordenados, o
+    modo "todos" só quando há mais de um ingrediente e, no lugar do orçamento, o
+    corte que ele faz na lista de preços (quantos itens custam até ele). Assim
+    "até 39,90" e "até 39,99" são a mesma busca quando nenhum prato custa entre
+    os dois valores.
+
+    Args:
+        filters (dict): Filtros de `search_catalog`
+        corte_orcamento (int): Itens com preço até o orçamento (todos, sem orçamento)
+
+    Returns:
+        tuple: Filtros canônicos, hashable
+    """
+    requisitos = tuple(sorted(normalizar_texto(req) for req in filters.get('ingredientes_obrigatorios') or []))
+    modo = MODO_TODOS if len(requisitos) > 1 and filters.get('modo_ingredientes') == MODO_TODOS else MODO_QUALQUER
+    return (
+        corte_orcamento,
+        tuple(sorted(filters.get('incluir_tags') or [])),
+        tuple(sorted(filters.get('excluir_tags') or [])),
+        requisitos,
+        modo,
+        tuple(sorted(set(filters.get('redes') or []))),
+    )
+
+
+class ResultCache:
+    """
+    Cache LRU dos resultados de `search_catalog`, guardados como posições no motor.
+
+    A chave junta a versão do catálogo e os filtros canônicos
+    (`filtros_canonicos`), então frases diferentes que resultam nos mesmos
+    search_params reaproveitam a busca. Guardar posições em vez de pratos deixa
+    cada entrada pequena; os dicionários são montados a cada acerto. Uma
+    recarga muda a versão e as entradas antigas deixam de ser encontradas, sem
+    precisar apagá-las: saem pelo LRU.
+    """
+
+    def __init__(self, capacidade: int = 2048):
+        """
+        Args:
+            capacidade (int): Máximo de buscas guardadas (0 desativa o cache)
+        """
+        self.capacidade = capacidade
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def chave(snapshot, filters: dict, aproximados: bool, limite: int) -> tuple:
+        """
+        Monta a chave de cache de uma busca.
+
+        Args:
+            snapshot (CatalogSnapshot): Versão do catálogo da busca
+            filters (dict): Filtros de `search_catalog`
+            aproximados (bool): Se a busca ranqueia os itens mais próximos
+            limite (int): Máximo de resultados
+
+        Returns:
+            tuple: Chave hashable
+        """
+        corte = snapshot.motor.corte_orcamento(filters.get('budget'))
+        return (snapshot.versao, bool(aproximados), limite, filtros_canonicos(filters, corte))
+
+    def get(self, chave: tuple):
+        """
+        Busca um resultado guardado.
+
+        Args:
+            chave (tuple): Chave gerada por `chave`
+
+        Returns:
+            tuple: (posicoes, exatos) guardado por `put`, ou None
+        """
+        with self._lock:
+            resultado = self._entradas.get(chave)
+            if resultado is None:
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(chave)
+            self.hits += 1
+            return resultado
+
+    def put(self, chave: tuple, posicoes, exatos: bool):
+        """
+        Guarda o resultado de uma busca.
+
+        Args:
+            chave (tuple): Chave gerada por `chave`
+            posicoes (iterable): Posições dos itens no motor, na ordem do resultado
+            exatos (bool): Se todos os itens atendem aos filtros
+        """
+        if self.capacidade <= 0:
+            return
+        with self._lock:
+            self._entradas[chave] = (tuple(posicoes), exatos)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.capacidade:
+                self._entradas.popitem(last=False)
+
+    def clear(self):
+        """Remove todos os resultados guardados."""
+        with self._lock:
+            self._entradas.clear()
+
+    def estatisticas(self) -> dict:
+        """
+        Contadores de uso do cache.
+
+        Returns:
+            dict: Hits, misses, taxa de acerto e buscas guardadas
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "itens": len(self._entradas),
+            }
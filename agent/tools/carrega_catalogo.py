@@ -0,0 +1,243 @@
+import json
+import mmap
+import os
+from array import array
+
+FORMATOS_NDJSON = ('.ndjson', '.jsonl')
+CAMPOS_PRATO = ('nome', 'preco', 'descricao', 'tags')
+
+
+class TabelaTags:
+    """
+    Tags internadas: cada tag e cada combinação de tags existe uma única vez.
+
+    O json cria uma string nova para cada ocorrência de "vegano" e uma lista
+    nova para as tags de cada item; com a tabela, todos os itens com as mesmas
+    tags apontam para a mesma tupla.
+    """
+
+    def __init__(self):
+        self._tags = {}
+        self._combinacoes = {}
+
+    def __len__(self) -> int:
+        return len(self._tags)
+
+    def combinacao(self, tags) -> tuple:
+        """
+        Tupla compartilhada com as tags informadas, na mesma ordem.
+
+        Args:
+            tags (iterable): Tags de um item
+
+        Returns:
+            tuple: A mesma tupla para toda combinação igual
+        """
+        chave = tuple(tags)
+        combinacao = self._combinacoes.get(chave)
+        if combinacao is None:
+            combinacao = tuple(self._tags.setdefault(tag, tag) for tag in chave)
+            self._combinacoes[combinacao] = combinacao
+        return combinacao
+
+
+class Prato:
+    """
+    Registro compacto de um item do catálogo.
+
+    Sem dicionário por instância, com as tags numa tupla compartilhada (veja
+    TabelaTags). Campos além dos quatro do catálogo ficam em `extras`. O
+    formato público (dict) só é montado em `como_dict`, para os itens que saem
+    de uma busca.
+    """
+
+    __slots__ = ('nome', 'preco', 'descricao', 'tags', 'extras')
+
+    def __init__(self, nome: str, preco: float, descricao: str, tags: tuple = (), extras: dict = None):
+        self.nome = nome
+        self.preco = preco
+        self.descricao = descricao
+        self.tags = tags
+        self.extras = extras
+
+    @classmethod
+    def de_dict(cls, item: dict, tabela: TabelaTags) -> 'Prato':
+        """
+        Args:
+            item (dict): Item no formato do catálogo
+            tabela (TabelaTags): Tabela onde as tags são internadas
+
+        Returns:
+            Prato: Registro com os mesmos dados
+        """
+        extras = None
+        if len(item) > len(CAMPOS_PRATO) or 'tags' not in item:
+            extras = {chave: valor for chave, valor in item.items() if chave not in CAMPOS_PRATO} or None
+        return cls(item['nome'], item['preco'], item['descricao'], tabela.combinacao(item.get('tags', ())), extras)
+
+    def como_dict(self) -> dict:
+        """Item no formato do catálogo (um dicionário novo a cada chamada)."""
+        item = {"nome": self.nome, "preco": self.preco, "descricao": self.descricao, "tags": list(self.tags)}
+        if self.extras:
+            item.update(self.extras)
+        return item
+
+
+class ItensCompactos:
+    """
+    Sequência somente leitura de itens guardados como registros Prato.
+
+    Indexar devolve o dicionário público do item, montado na hora: quem lê o
+    catálogo continua recebendo dicts, mas só os itens acessados (tipicamente
+    os resultados de uma busca) existem nesse formato.
+    """
+
+    def __init__(self, registros: list):
+        """
+        Args:
+            registros (list): Registros Prato, na ordem do catálogo
+        """
+        self.registros = registros
+
+    def __len__(self) -> int:
+        return len(self.registros)
+
+    def __getitem__(self, indice: int) -> dict:
+        return self.registros[indice].como_dict()
+
+    def __iter__(self):
+        for registro in self.registros:
+            yield registro.como_dict()
+
+    def registro(self, indice: int) -> Prato:
+        """Registro do item, sem converter para dicionário."""
+        return self.registros[indice]
+
+
+def em_memoria(itens) -> bool:
+    """
+    Indica se os itens estão todos em memória (acesso barato a qualquer um).
+
+    Args:
+        itens: Sequência de itens do catálogo
+
+    Returns:
+        bool: False para sequências preguiçosas, como ItensNDJSON
+    """
+    return isinstance(itens, (list, ItensCompactos))
+
+
+def extrair_colunas(itens, tabela: TabelaTags = None) -> dict:
+    """
+    Extrai as colunas usadas pelos motores de busca de uma lista de itens.
+
+    Args:
+        itens (list): Lista de dicionários do catálogo ou ItensCompactos
+        tabela (TabelaTags): Tabela onde as tags são internadas (padrão: uma nova)
+
+    Returns:
+        dict: Listas `preco`, `tags`, `nome` e `descricao`, na ordem dos itens;
+              as tags de cada item numa tupla compartilhada
+    """
+    colunas = {"preco": [], "tags": [], "nome": [], "descricao": []}
+    if isinstance(itens, ItensCompactos):
+        for registro in itens.registros:
+            _adicionar_registro(colunas, registro)
+        return colunas
+
+    tabela = tabela or TabelaTags()
+    for item in itens:
+        _adicionar(colunas, item, tabela)
+    return colunas
+
+
+def _adicionar(colunas: dict, item: dict, tabela: TabelaTags):
+    colunas["preco"].append(item['preco'])
+    colunas["tags"].append(tabela.combinacao(item.get('tags', ())))
+    colunas["nome"].append(item['nome'])
+    colunas["descricao"].append(item['descricao'])
+
+
+def _adicionar_registro(colunas: dict, registro: Prato):
+    colunas["preco"].append(registro.preco)
+    colunas["tags"].append(registro.tags)
+    colunas["nome"].append(registro.nome)
+    colunas["descricao"].append(registro.descricao)
+
+
+class ItensNDJSON:
+    """
+    Sequência somente leitura de itens de um arquivo NDJSON mapeado em memória.
+
+    Guarda apenas o offset de cada linha; o dicionário de um item só é criado
+    quando ele é acessado (tipicamente os poucos resultados de uma busca).
+    Para recarregar com segurança, substitua o arquivo com rename atômico em vez
+    de reescrevê-lo no lugar.
+    """
+
+    def __init__(self, caminho: str, colunas: dict = None):
+        """
+        Indexa o arquivo em uma única passada.
+
+        Args:
+            caminho (str): Caminho do arquivo NDJSON
+            colunas (dict): Se informado, recebe as colunas de cada item lido
+        """
+        self.caminho = caminho
+        self.inicios = array('q')
+        self.fins = array('q')
+        tabela = TabelaTags()
+
+        with open(caminho, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                self._mapa = b''
+                return
+            self._mapa = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        inicio = 0
+        for linha in iter(self._mapa.readline, b''):
+            fim = inicio + len(linha)
+            if linha.strip():
+                if colunas is not None:
+                    _adicionar(colunas, json.loads(linha), tabela)
+                self.inicios.append(inicio)
+                self.fins.append(fim)
+            inicio = fim
+
+    def __len__(self) -> int:
+        return len(self.inicios)
+
+    def __getitem__(self, indice: int) -> dict:
+        if indice < 0:
+            indice += len(self)
+        return json.loads(self._mapa[self.inicios[indice]:self.fins[indice]])
+
+    def __iter__(self):
+        for indice in range(len(self)):
+            yield self[indice]
+
+
+def ler_catalogo(caminho: str) -> tuple:
+    """
+    Lê o catálogo em JSON (array) ou NDJSON (um item por linha).
+
+    O formato é escolhido pela extensão (.ndjson/.jsonl). No NDJSON os índices
+    são construídos em uma passada sem manter os dicionários em memória; no
+    JSON os itens ficam como registros Prato (ItensCompactos).
+
+    Args:
+        caminho (str): Caminho do arquivo do catálogo
+
+    Returns:
+        tuple: (itens, colunas) — sequência de itens e colunas para os motores
+    """
+    if caminho.lower().endswith(FORMATOS_NDJSON):
+        colunas = {"preco": [], "tags": [], "nome": [], "descricao": []}
+        itens = ItensNDJSON(caminho, colunas)
+        return itens, colunas
+
+    with open(caminho, 'r', encoding='utf-8') as file:
+        dicionarios = json.load(file)
+    tabela = TabelaTags()
+    itens = ItensCompactos([Prato.de_dict(item, tabela) for item in dicionarios])
+    return itens, extrair_colunas(itens)
@@ -0,0 +1,355 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .carrega_catalogo import extrair_colunas
+from .indice_texto import MODO_QUALQUER, IndiceTexto
+from .restricoes import (RESTRICAO_BUDGET, RESTRICAO_EXCLUIR, RESTRICAO_INCLUIR, descrever_violacao,
+                         listar_restricoes, requisitos_normalizados)
+
+# Linhas do primeiro bloco de candidatas de uma busca; os seguintes crescem até o máximo
+TAMANHO_BLOCO_INICIAL = 256
+TAMANHO_BLOCO_MAXIMO = 1 << 16
+
+
+def _contem(lista, linhas):
+    """
+    Máscara de quais `linhas` aparecem em `lista`.
+
+    Args:
+        lista (numpy.ndarray): Linhas ordenadas
+        linhas (numpy.ndarray): Linhas a testar
+
+    Returns:
+        numpy.ndarray: Máscara booleana alinhada com `linhas`
+    """
+    if not len(lista):
+        return np.zeros(len(linhas), dtype=bool)
+    indices = np.minimum(np.searchsorted(lista, linhas), len(lista) - 1)
+    return lista[indices] == linhas
+
+
+def _primeiras(mascara, quantidade: int) -> list:
+    """
+    Até `quantidade` posições verdadeiras da máscara, em ordem, sem percorrer
+    a máscara inteira quando elas aparecem cedo.
+
+    Args:
+        mascara (numpy.ndarray): Máscara booleana
+        quantidade (int): Máximo de posições
+
+    Returns:
+        list: Posições encontradas
+    """
+    encontradas = []
+    inicio, tamanho = 0, TAMANHO_BLOCO_INICIAL
+    while inicio < len(mascara) and len(encontradas) < quantidade:
+        fim = inicio + tamanho
+        encontradas += (np.flatnonzero(mascara[inicio:fim])[:quantidade - len(encontradas)] + inicio).tolist()
+        inicio, tamanho = fim, min(tamanho * 4, TAMANHO_BLOCO_MAXIMO)
+    return encontradas
+
+
+class ColumnarCatalog:
+    """
+    Backend colunar do catálogo apoiado em NumPy.
+
+    As linhas ficam ordenadas por preço (ordenação estável), com `preco` em um
+    array float64 e, para cada tag, o array ordenado das linhas que a possuem.
+    Orçamento vira um corte por searchsorted e as tags viram interseções desses
+    arrays, então o custo de uma busca por tags acompanha o tamanho das listas
+    envolvidas e não o do catálogo. Nome e descrição não são duplicados: o
+    índice de texto guarda só a versão normalizada e os itens devolvidos vêm da
+    sequência original do catálogo, com todos os campos, como no CatalogIndex.
+    """
+
+    def __init__(self, itens, normalizados: dict = None, colunas: dict = None):
+        """
+        Constrói as colunas a partir da lista de itens do catálogo.
+
+        Args:
+            itens (list): Lista de dicionários do catálogo (ou sequência
+                preguiçosa, acessada apenas para os itens devolvidos)
+            normalizados (dict): Textos normalizados de uma carga anterior
+            colunas (dict): Colunas já extraídas pelo carregador do catálogo
+        """
+        if np is None:
+            raise ImportError("O backend colunar do catálogo requer numpy.")
+        if colunas is None:
+            colunas = extrair_colunas(itens)
+
+        self.fonte = itens
+        precos_originais = np.array(colunas['preco'], dtype=np.float64)
+        ordem = np.argsort(precos_originais, kind='stable')
+        # Linha (ordem de preço) → índice do item no catálogo
+        self.ordem = ordem
+        self.precos = precos_originais[ordem]
+        # Soma na ordem original do catálogo para manter a média idêntica
+        self.soma_precos = sum(colunas['preco'])
+
+        ordem_lista = ordem.tolist()
+        nomes, descricoes = colunas['nome'], colunas['descricao']
+        self.indice_texto = IndiceTexto([nomes[indice] + ' ' + descricoes[indice] for indice in ordem_lista],
+                                        normalizados)
+
+        linhas_por_tag = {}
+        tags = colunas['tags']
+        for linha, indice in enumerate(ordem_lista):
+            for tag in tags[indice]:
+                linhas_por_tag.setdefault(tag, []).append(linha)
+        # Tag → linhas que a possuem, em ordem crescente (= ordem de preço)
+        self.linhas_tags = {tag: np.array(linhas, dtype=np.int32) for tag, linhas in linhas_por_tag.items()}
+
+    def __len__(self) -> int:
+        return len(self.precos)
+
+    def textos_busca(self):
+        """
+        Texto pesquisável (`nome + descricao`) de cada linha, na ordem das linhas.
+
+        Yields:
+            str: Texto original do item
+        """
+        for linha in range(len(self)):
+            item = self.item(linha)
+            yield item['nome'] + ' ' + item['descricao']
+
+    def texto_normalizado(self, linha: int) -> str:
+        """Texto pesquisável já normalizado da linha (veja `normalizar_texto`)."""
+        return self.indice_texto.textos[linha]
+
+    def item(self, linha: int) -> dict:
+        """
+        Item de uma linha, com todos os campos do catálogo.
+
+        Args:
+            linha (int): Linha do item nas colunas
+
+        Returns:
+            dict: Item no formato do catálogo
+        """
+        return self.fonte[int(self.ordem[linha])]
+
+    def _coluna_tag(self, tag: str):
+        """Máscara booleana das linhas que possuem a tag, ou None se a tag não existir."""
+        linhas = self.linhas_tags.get(tag)
+        if linhas is None:
+            return None
+        coluna = np.zeros(len(self), dtype=bool)
+        coluna[linhas] = True
+        return coluna
+
+    def corte_orcamento(self, budget) -> int:
+        """
+        Quantidade de linhas com preço menor ou igual ao orçamento.
+
+        Args:
+            budget (float): Preço máximo ou None para não limitar
+
+        Returns:
+            int: As linhas abaixo do corte são as que cabem no orçamento
+        """
+        if budget is None:
+            return len(self)
+        return int(np.searchsorted(self.precos, budget, side='right'))
+
+    def _blocos(self, corte: int, obrigatorias: list, proibidas: list):
+        """
+        Percorre, em blocos e em ordem de preço, as linhas abaixo do corte que
+        estão em todas as listas `obrigatorias` e em nenhuma das `proibidas`.
+
+        Os blocos crescem aos poucos: uma busca que acha seus resultados logo no
+        começo não paga pelo resto do catálogo.
+
+        Args:
+            corte (int): Linhas a partir dele ficam de fora (orçamento)
+            obrigatorias (list): Arrays ordenados de linhas permitidas
+            proibidas (list): Arrays ordenados de linhas excluídas
+
+        Yields:
+            numpy.ndarray: Linhas candidatas do bloco
+        """
+        obrigatorias = sorted(obrigatorias, key=len)
+        if obrigatorias:
+            # A lista mais curta é a fonte; as demais só filtram
+            fonte = obrigatorias.pop(0)
+            fonte = fonte[:np.searchsorted(fonte, corte)]
+        else:
+            fonte = None
+        total = corte if fonte is None else len(fonte)
+
+        inicio, tamanho = 0, TAMANHO_BLOCO_INICIAL
+        while inicio < total:
+            fim = min(total, inicio + tamanho)
+            bloco = np.arange(inicio, fim, dtype=np.int32) if fonte is None else fonte[inicio:fim]
+            for lista in obrigatorias:
+                bloco = bloco[_contem(lista, bloco)]
+            for lista in proibidas:
+                bloco = bloco[~_contem(lista, bloco)]
+            if len(bloco):
+                yield bloco
+            inicio, tamanho = fim, min(tamanho * 4, TAMANHO_BLOCO_MAXIMO)
+
+    def search(self, filters: dict, limite: int = 10) -> list:
+        """
+        Aplica os filtros de `search_catalog` de forma vetorizada.
+
+        Args:
+            filters (dict): Mesmos filtros aceitos por `search_catalog`
+            limite (int): Quantidade máxima de resultados
+
+        Returns:
+            list: Até `limite` refeições ordenadas por preço
+        """
+        return [self.item(linha) for linha in self.posicoes(filters, limite)]
+
+    def posicoes(self, filters: dict, limite: int = 10) -> list:
+        """
+        Mesma busca de `search`, devolvendo as linhas em vez dos itens.
+
+        Args:
+            filters (dict): Mesmos filtros aceitos por `search_catalog`
+            limite (int): Quantidade máxima de resultados
+
+        Returns:
+            list: Até `limite` linhas, em ordem de preço
+        """
+        corte = self.corte_orcamento(filters.get('budget'))
+        obrigatorias = []
+        for tag in filters.get('incluir_tags') or []:
+            linhas = self.linhas_tags.get(tag)
+            if linhas is None:
+                return []
+            obrigatorias.append(linhas)
+        proibidas = [self.linhas_tags[tag] for tag in filters.get('excluir_tags') or [] if tag in self.linhas_tags]
+
+        verificar = None
+        requisitos = filters.get('ingredientes_obrigatorios') or []
+        if requisitos:
+            modo = filters.get('modo_ingredientes', MODO_QUALQUER)
+            restricoes, verificar = self.indice_texto.plano(requisitos, modo)
+            obrigatorias += [np.array(posicoes, dtype=np.int32) for posicoes in restricoes]
+
+        resultados = []
+        for bloco in self._blocos(corte, obrigatorias, proibidas):
+            if verificar is None:
+                resultados.extend(bloco[:limite - len(resultados)].tolist())
+            else:
+                for linha in bloco.tolist():
+                    if verificar(linha):
+                        resultados.append(linha)
+                        if len(resultados) >= limite:
+                            break
+            if len(resultados) >= limite:
+                break
+        return resultados
+
+    def _violadores(self, restricao: tuple):
+        """Máscara booleana das linhas que violam uma restrição de `listar_restricoes`."""
+        tipo, valor = restricao
+        if tipo == RESTRICAO_BUDGET:
+            violadores = np.zeros(len(self), dtype=bool)
+            violadores[self.corte_orcamento(valor):] = True
+            return violadores
+        if tipo in (RESTRICAO_INCLUIR, RESTRICAO_EXCLUIR):
+            coluna = self._coluna_tag(valor)
+            if coluna is None:
+                return np.full(len(self), tipo == RESTRICAO_INCLUIR)
+            return ~coluna if tipo == RESTRICAO_INCLUIR else coluna
+        violadores = np.ones(len(self), dtype=bool)
+        violadores[self.indice_texto.todas_posicoes(requisitos_normalizados(restricao))] = False
+        return violadores
+
+    def rank(self, filters: dict, limite: int = 10) -> list:
+        """
+        Ordena as linhas pelo quanto se afastam dos filtros (veja `posicoes_ranqueadas`).
+
+        Args:
+            filters (dict): Mesmos filtros aceitos por `search_catalog`
+            limite (int): Quantidade máxima de resultados
+
+        Returns:
+            list: Até `limite` pares (item, violacoes); violacoes vazia = item exato
+        """
+        return [(self.item(linha), violacoes) for linha, violacoes in self.posicoes_ranqueadas(filters, limite)]
+
+    def posicoes_ranqueadas(self, filters: dict, limite: int = 10) -> list:
+        """
+        Ordena as linhas pelo quanto se afastam dos filtros, em uma única passada.
+
+        Mesma ordem de `CatalogIndex.rank`: menos violações, depois quem respeita
+        o orçamento, depois o preço.
+
+        Args:
+            filters (dict): Mesmos filtros aceitos por `search_catalog`
+            limite (int): Quantidade máxima de resultados
+
+        Returns:
+            list: Até `limite` pares (linha, violacoes); violacoes vazia = item exato
+        """
+        restricoes = listar_restricoes(filters)
+        violadores = [self._violadores(restricao) for restricao in restricoes]
+
+        chave = np.zeros(len(self), dtype=np.int16)
+        for mascara in violadores:
+            chave += mascara
+        chave *= 2
+        if restricoes and restricoes[0][0] == RESTRICAO_BUDGET:
+            chave += violadores[0]
+
+        # As linhas já estão em ordem de preço: basta percorrer as chaves presentes
+        # em ordem crescente, sem ordenar o catálogo inteiro
+        linhas = []
+        for valor in range(2 * len(restricoes) + 2):
+            if len(linhas) >= limite:
+                break
+            iguais = chave == valor
+            if iguais.any():
+                linhas += _primeiras(iguais, limite - len(linhas))
+
+        resultados = []
+        for linha in linhas:
+            violacoes = [descrever_violacao(restricao, float(self.precos[linha]))
+                         for restricao, mascara in zip(restricoes, violadores) if mascara[linha]]
+            resultados.append((linha, violacoes))
+        return resultados
+
+    def cheapest_item(self) -> dict:
+        """
+        Retorna o prato mais barato (o primeiro do catálogo em caso de empate).
+
+        Returns:
+            dict: Prato mais barato ou None se o catálogo estiver vazio
+        """
+        if not len(self):
+            return None
+        return self.item(0)
+
+    def most_expensive_item(self) -> dict:
+        """
+        Retorna o prato mais caro (o primeiro do catálogo em caso de empate).
+
+        Returns:
+            dict: Prato mais caro ou None se o catálogo estiver vazio
+        """
+        if not len(self):
+            return None
+        return self.item(int(np.searchsorted(self.precos, self.precos[-1], side='left')))
+
+    def price_range(self) -> dict:
+        """
+        Retorna informações sobre a faixa de preços do catálogo.
+
+        Returns:
+            dict: Informações de preços (min, max, média)
+        """
+        if not len(self):
+            return {"min_price": 0, "max_price": 0, "avg_price": 0, "total_items": 0}
+
+        return {
+            "min_price": float(self.precos[0]),
+            "max_price": float(self.precos[-1]),
+            "avg_price": round(self.soma_precos / len(self), 2),
+            "total_items": len(self)
+        }
@@ -0,0 +1,450 @@
+import heapq
+import math
+import multiprocessing
+import os
+import threading
+import weakref
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import count, islice
+from operator import itemgetter
+
+from .carrega_catalogo import ItensCompactos, extrair_colunas
+
+# Abaixo deste número de itens nas partições consultadas, a troca de mensagens
+# com os processos custa mais que a busca: as partições são percorridas aqui
+MINIMO_PARALELO = 50000
+
+# Só com fork os processos herdam as partições já montadas, sem serializá-las
+FORK_DISPONIVEL = hasattr(os, 'fork') and 'fork' in multiprocessing.get_all_start_methods()
+
+# Catálogos vivos, por token; os processos do pool os encontram aqui depois do fork
+_CATALOGOS = {}
+_TOKENS = count()
+_catalogo_worker = None
+
+# Buscas grandes deste processo, por caminho, somadas entre as versões do catálogo
+_buscas = {"pool": 0, "sem_pool": 0, "pool_quebrado": 0}
+_lock_buscas = threading.Lock()
+
+
+def _contar(caminho: str):
+    with _lock_buscas:
+        _buscas[caminho] += 1
+
+
+def estatisticas() -> dict:
+    """
+    Contadores das buscas que valiam o pool de processos.
+
+    Returns:
+        dict: Buscas feitas pelo pool, buscas no próprio processo por falta de
+              pool (outras threads já rodando) e buscas refeitas aqui porque o
+              pool quebrou
+    """
+    with _lock_buscas:
+        return {f"buscas_{caminho}": total for caminho, total in _buscas.items()}
+
+
+def _iniciar_worker(token: int):
+    global _catalogo_worker
+    _catalogo_worker = _CATALOGOS[token]()
+
+
+def _pronto() -> bool:
+    """Tarefa vazia: faz o pool criar os processos."""
+    return True
+
+
+def _encerrar_pool(pools: dict):
+    """Encerra o pool deste processo (um processo filho não encerra o do pai)."""
+    executor = pools.pop(os.getpid(), None)
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _buscar_grupo(particoes: list, filters: dict, limite: int, aproximados: bool) -> list:
+    """Tarefa de um processo do pool: busca em um grupo de partições."""
+    return _catalogo_worker._buscar_local(particoes, filters, limite, aproximados)
+
+
+class _ItensParticao:
+    """Vista somente leitura dos itens de uma partição sobre a sequência do catálogo."""
+
+    def __init__(self, itens, indices: list):
+        self.itens = itens
+        self.indices = indices
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __getitem__(self, indice: int) -> dict:
+        return self.itens[self.indices[indice]]
+
+
+class _Particao:
+    __slots__ = ('rede', 'indices', 'motor')
+
+    def __init__(self, rede, indices: list, motor):
+        self.rede = rede
+        self.indices = indices
+        self.motor = motor
+
+
+class _TextosParticoes:
+    """Textos normalizados de todas as partições, na ordem de `textos_busca`."""
+
+    def __init__(self, particoes: list):
+        self._particoes = particoes
+
+    @property
+    def textos(self) -> list:
+        return [texto for particao in self._particoes for texto in particao.motor.indice_texto.textos]
+
+
+def _valores_campo(itens, campo: str) -> list:
+    """Valor de `campo` em cada item (None quando o item não tem o campo)."""
+    if isinstance(itens, ItensCompactos):
+        return [(registro.extras or {}).get(campo) for registro in itens.registros]
+    return [item.get(campo) for item in itens]
+
+
+class ShardedCatalog:
+    """
+    Catálogo dividido em partições, cada uma com o seu próprio motor de busca.
+
+    Os itens são agrupados pela rede (o campo `campo_rede` de cada prato) e as
+    redes grandes são divididas em partições de tamanho parecido, sempre
+    mantendo a ordem do catálogo. Uma busca consulta só as partições das redes
+    pedidas (filtro "redes"), cada partição devolve os seus `limite` melhores e
+    uma intercalação (heapq.merge) monta o resultado global: a mesma ordem de
+    preço, com empates resolvidos pela ordem do catálogo, que um motor único
+    daria.
+
+    Com `processos` > 1 e fork disponível, grupos de partições são consultados
+    em paralelo por um pool de processos, que herda as partições já montadas.
+    Fork em processos com várias threads só copia a thread atual (e os locks
+    que as outras seguravam), então o pool é criado por `iniciar_processos`
+    antes das threads (por exemplo, no início de cada worker da API pré-fork),
+    ou na primeira busca grande de um processo que ainda só tem uma thread.
+    Sem pool, e já com outras threads, as partições são consultadas no próprio
+    processo: o catálogo avisa uma vez e conta essas buscas em `estatisticas`.
+    O pool é encerrado com `fechar` ou quando o catálogo sai de uso.
+
+    Implementa a mesma interface de CatalogIndex, com posições no formato
+    (partição, posição no motor da partição).
+    """
+
+    def __init__(self, itens, normalizados: dict = None, colunas: dict = None, particoes: int = 1,
+                 campo_rede: str = None, processos: int = None, criar_motor=None):
+        """
+        Args:
+            itens (list): Itens do catálogo (lista, ItensCompactos ou ItensNDJSON)
+            normalizados (dict): Textos normalizados de uma carga anterior
+            colunas (dict): Colunas já extraídas pelo carregador do catálogo
+            particoes (int): Número aproximado de partições (cada rede tem pelo menos uma)
+            campo_rede (str): Campo do prato com a rede (ex.: "rede"); None = uma rede só
+            processos (int): Processos do pool de busca (padrão: número de CPUs;
+                1 consulta as partições no próprio processo)
+            criar_motor (callable): `criar_motor(itens, normalizados, colunas)` de cada
+                partição (padrão: CatalogIndex)
+        """
+        if colunas is None:
+            colunas = extrair_colunas(itens)
+        if criar_motor is None:
+            from .indice_catalogo import CatalogIndex
+            criar_motor = CatalogIndex
+
+        self.campo_rede = campo_rede
+        self.processos = processos or os.cpu_count() or 1
+        self.soma_precos = sum(colunas['preco'])
+        self.total = len(colunas['preco'])
+
+        redes = _valores_campo(itens, campo_rede) if campo_rede else [None] * self.total
+        por_rede = {}
+        for indice, rede in enumerate(redes):
+            por_rede.setdefault(rede, []).append(indice)
+        tamanho = max(1, math.ceil(self.total / max(1, particoes)))
+
+        self.particoes = []
+        self.por_rede = {}
+        for rede, indices_rede in por_rede.items():
+            for inicio in range(0, len(indices_rede), tamanho):
+                indices = indices_rede[inicio:inicio + tamanho]
+                colunas_particao = {nome: [valores[indice] for indice in indices] for nome, valores in colunas.items()}
+                motor = criar_motor(_ItensParticao(itens, indices), normalizados, colunas_particao)
+                self.por_rede.setdefault(rede, []).append(len(self.particoes))
+                self.particoes.append(_Particao(rede, indices, motor))
+        self.indice_texto = _TextosParticoes(self.particoes)
+
+        self._lock = threading.Lock()
+        # Pool de processos por pid: um processo filho não usa o pool do pai
+        self._pools = {}
+        self._avisou_sem_pool = False
+        self._token = next(_TOKENS)
+        _CATALOGOS[self._token] = weakref.ref(self)
+        weakref.finalize(self, _CATALOGOS.pop, self._token, None)
+        weakref.finalize(self, _encerrar_pool, self._pools)
+
+    def __len__(self) -> int:
+        return self.total
+
+    def textos_busca(self):
+        """
+        Texto pesquisável (`nome + descricao`) de cada item, na ordem das posições.
+
+        Yields:
+            str: Texto original do item
+        """
+        for particao in self.particoes:
+            yield from particao.motor.textos_busca()
+
+    def texto_normalizado(self, posicao: tuple) -> str:
+        """Texto pesquisável já normalizado do item na posição (veja `normalizar_texto`)."""
+        particao, local = posicao
+        return self.particoes[particao].motor.texto_normalizado(local)
+
+    def item(self, posicao: tuple) -> dict:
+        """
+        Item na posição informada.
+
+        Args:
+            posicao (tuple): (partição, posição no motor da partição)
+
+        Returns:
+            dict: Item no formato do catálogo
+        """
+        particao, local = posicao
+        return self.particoes[particao].motor.item(local)
+
+    def corte_orcamento(self, budget) -> tuple:
+        """
+        Corte do orçamento em cada partição (veja CatalogIndex.corte_orcamento).
+
+        Returns:
+            tuple: Itens até o orçamento, por partição; iguais para dois orçamentos
+                   só quando ambos selecionam os mesmos itens
+        """
+        return tuple(particao.motor.corte_orcamento(budget) for particao in self.particoes)
+
+    def _selecionadas(self, filters: dict) -> list:
+        """Partições das redes pedidas em `filters["redes"]` (todas, sem o filtro)."""
+        redes = filters.get('redes')
+        if not redes:
+            return list(range(len(self.particoes)))
+        return sorted(particao for rede in set(redes) for particao in self.por_rede.get(rede, ()))
+
+    def _chave_global(self, particao: int, local: int) -> tuple:
+        """(preço, índice no catálogo) de uma posição: a ordem de um motor único."""
+        motor = self.particoes[particao].motor
+        return float(motor.precos[local]), self.particoes[particao].indices[int(motor.ordem[local])]
+
+    def _buscar_local(self, particoes: list, filters: dict, limite: int, aproximados: bool) -> list:
+        """
+        Busca nas partições informadas, no processo atual.
+
+        Returns:
+            list: Até `limite` tuplas (chave de ordem, partição, posição, violações),
+                  em ordem global
+        """
+        budget = filters.get('budget')
+        listas = []
+        for particao in particoes:
+            motor = self.particoes[particao].motor
+            if aproximados:
+                resultados = motor.posicoes_ranqueadas(filters, limite)
+            else:
+                resultados = [(local, []) for local in motor.posicoes(filters, limite)]
+            lista = []
+            for local, violacoes in resultados:
+                preco, indice = self._chave_global(particao, local)
+                # Mesma ordem do rank de um motor único: violações, estouro do orçamento, preço
+                chave = (len(violacoes), budget is not None and preco > budget, preco, indice)
+                lista.append((chave, particao, local, violacoes))
+            listas.append(lista)
+        return list(islice(heapq.merge(*listas, key=itemgetter(0)), limite))
+
+    def _paralelo(self) -> bool:
+        """Indica se as partições podem ser consultadas pelo pool de processos."""
+        return self.processos > 1 and len(self.particoes) > 1 and FORK_DISPONIVEL
+
+    def _obter_executor(self, criar: bool = False) -> ProcessPoolExecutor:
+        """
+        Pool de processos deste processo.
+
+        Args:
+            criar (bool): Cria o pool mesmo com outras threads rodando
+
+        Returns:
+            ProcessPoolExecutor: Pool, ou None se ainda não existe e há outras threads
+        """
+        with self._lock:
+            executor = self._pools.get(os.getpid())
+            if executor is None and (criar or threading.active_count() == 1):
+                executor = self._pools[os.getpid()] = ProcessPoolExecutor(
+                    self.processos, mp_context=multiprocessing.get_context('fork'),
+                    initializer=_iniciar_worker, initargs=(self._token,)
+                )
+            return executor
+
+    def usa_processos(self) -> bool:
+        """Indica se as buscas grandes deste catálogo dependem do pool de processos."""
+        return self._paralelo() and self.total >= MINIMO_PARALELO
+
+    def iniciar_processos(self) -> bool:
+        """
+        Cria agora o pool de processos deste processo, antes de iniciar outras threads.
+
+        Returns:
+            bool: True se as buscas grandes vão usar o pool
+        """
+        if not self.usa_processos():
+            return False
+        # Com fork, todos os processos do pool nascem na primeira tarefa
+        self._obter_executor(criar=True).submit(_pronto).result()
+        return True
+
+    def _buscar(self, filters: dict, limite: int, aproximados: bool) -> list:
+        """Busca nas partições selecionadas, em paralelo quando compensa."""
+        particoes = self._selecionadas(filters)
+        itens = sum(len(self.particoes[particao].indices) for particao in particoes)
+        if not self._paralelo() or len(particoes) < 2 or itens < MINIMO_PARALELO:
+            return self._buscar_local(particoes, filters, limite, aproximados)
+
+        grupos = min(self.processos, len(particoes))
+        try:
+            executor = self._obter_executor()
+            if executor is None:
+                self._avisar_sem_pool()
+                return self._buscar_local(particoes, filters, limite, aproximados)
+            futuros = [executor.submit(_buscar_grupo, particoes[grupo::grupos], filters, limite, aproximados)
+                       for grupo in range(grupos)]
+            listas = [futuro.result() for futuro in futuros]
+        except BrokenProcessPool:
+            # Um processo do pool morreu: esta busca roda aqui e a próxima recria o
+            # pool, se o processo ainda só tiver uma thread
+            with self._lock:
+                self._pools.pop(os.getpid(), None)
+            _contar("pool_quebrado")
+            return self._buscar_local(particoes, filters, limite, aproximados)
+        _contar("pool")
+        return list(islice(heapq.merge(*listas, key=itemgetter(0)), limite))
+
+    def _avisar_sem_pool(self):
+        """Conta uma busca grande feita sem o pool e avisa na primeira deste catálogo."""
+        _contar("sem_pool")
+        with self._lock:
+            avisar, self._avisou_sem_pool = not self._avisou_sem_pool, True
+        if avisar:
+            print(f"Aviso: catálogo particionado sem pool de processos no pid {os.getpid()} (o processo já tem "
+                  f"outras threads); as buscas grandes rodam no próprio processo. Chame "
+                  f"start_search_processes antes de iniciar threads.")
+
+    def posicoes(self, filters: dict, limite: int = 10) -> list:
+        """
+        Mesma busca de `search`, devolvendo as posições em vez dos itens.
+
+        Args:
+            filters (dict): Filtros de `search_catalog`, com "redes" opcional
+            limite (int): Quantidade máxima de resultados
+
+        Returns:
+            list: Até `limite` posições (partição, posição), em ordem de preço
+        """
+        return [(particao, local) for _, particao, local, _ in self._buscar(filters, limite, False)]
+
+    def posicoes_ranqueadas(self, filters: dict, limite: int = 10) -> list:
+        """
+        Itens mais próximos dos filtros, na ordem de CatalogIndex.posicoes_ranqueadas.
+
+        Args:
+            filters (dict): Filtros de `search_catalog`, com "redes" opcional
+            limite (int): Quantidade máxima de resultados
+
+        Returns:
+            list: Até `limite` pares ((partição, posição), violacoes)
+        """
+        return [((particao, local), violacoes)
+                for _, particao, local, violacoes in self._buscar(filters, limite, True)]
+
+    def search(self, filters: dict, limite: int = 10) -> list:
+        """
+        Aplica os filtros de `search_catalog` em todas as partições selecionadas.
+
+        Args:
+            filters (dict): Filtros de `search_catalog`, com "redes" opcional
+            limite (int): Quantidade máxima de resultados
+
+        Returns:
+            list: Até `limite` refeições ordenadas por preço
+        """
+        return [self.item(posicao) for posicao in self.posicoes(filters, limite)]
+
+    def rank(self, filters: dict, limite: int = 10) -> list:
+        """
+        Ordena os itens pelo quanto se afastam dos filtros (veja `posicoes_ranqueadas`).
+
+        Returns:
+            list: Até `limite` pares (item, violacoes); violacoes vazia = item exato
+        """
+        return [(self.item(posicao), violacoes) for posicao, violacoes in self.posicoes_ranqueadas(filters, limite)]
+
+    def _extremo(self, mais_caro: bool) -> dict:
+        """Item mais barato ou mais caro; empates ficam com o primeiro do catálogo."""
+        candidatos = []
+        for numero, particao in enumerate(self.particoes):
+            precos = particao.motor.precos
+            if not len(precos):
+                continue
+            # Entre empates, a primeira posição é a do item que vem antes no catálogo
+            local = bisect_left(precos, precos[-1]) if mais_caro else 0
+            preco, indice = self._chave_global(numero, local)
+            candidatos.append((-preco if mais_caro else preco, indice, numero, local))
+        if not candidatos:
+            return None
+        _, _, numero, local = min(candidatos)
+        return self.item((numero, local))
+
+    def cheapest_item(self) -> dict:
+        """
+        Retorna o prato mais barato (o primeiro do catálogo em caso de empate).
+
+        Returns:
+            dict: Prato mais barato ou None se o catálogo estiver vazio
+        """
+        return self._extremo(False)
+
+    def most_expensive_item(self) -> dict:
+        """
+        Retorna o prato mais caro (o primeiro do catálogo em caso de empate).
+
+        Returns:
+            dict: Prato mais caro ou None se o catálogo estiver vazio
+        """
+        return self._extremo(True)
+
+    def price_range(self) -> dict:
+        """
+        Retorna informações sobre a faixa de preços do catálogo.
+
+        Returns:
+            dict: Informações de preços (min, max, média)
+        """
+        faixas = [particao.motor.price_range() for particao in self.particoes if len(particao.motor)]
+        if not faixas:
+            return {"min_price": 0, "max_price": 0, "avg_price": 0, "total_items": 0}
+
+        return {
+            "min_price": min(faixa["min_price"] for faixa in faixas),
+            "max_price": max(faixa["max_price"] for faixa in faixas),
+            "avg_price": round(self.soma_precos / self.total, 2),
+            "total_items": self.total
+        }
+
+    def fechar(self):
+        """Encerra o pool de processos deste processo (veja `iniciar_processos` para criar outro)."""
+        with self._lock:
+            executor = self._pools.pop(os.getpid(), None)
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -1,23 +1,20 @@
-import json
 import os
 
+try:
+    from .carrega_catalogo import ler_catalogo
+except ImportError:
+    from carrega_catalogo import ler_catalogo
+
 def extrai_tags(arquivo_json):
     """
-    Extrai tags únicas de um arquivo JSON.
+    Extrai tags únicas de um arquivo JSON ou NDJSON.
     
-    :arquivo_json: Caminho para o arquivo JSON.
+    :arquivo_json: Caminho para o arquivo do catálogo.
     :return: Conjunto de tags únicas.
     """
-    with open(arquivo_json, 'r', encoding='utf-8') as file:
-        catalogo = json.load(file)
-
-    tags_unicas = set()
-
-    for item in catalogo:
-        for tag in item.get('tags', []):
-            tags_unicas.add(tag)
+    _, colunas = ler_catalogo(arquivo_json)
 
-    return tags_unicas
+    return {tag for tags_item in colunas['tags'] for tag in tags_item}
 
 # Para compatibilidade, carrega as tags se executado diretamente
 if __name__ == "__main__":
@@ -0,0 +1,323 @@
+from bisect import bisect_left, bisect_right
+from itertools import islice
+
+from .carrega_catalogo import extrair_colunas
+from .indice_texto import MODO_QUALQUER, IndiceTexto
+from .restricoes import (RESTRICAO_BUDGET, RESTRICAO_EXCLUIR, RESTRICAO_INCLUIR, descrever_violacao,
+                         listar_restricoes, requisitos_normalizados)
+
+
+class CatalogIndex:
+    """
+    Índice do catálogo construído uma única vez por carga.
+
+    Os itens são mantidos na ordem crescente de preço (ordenação estável, então
+    empates preservam a ordem original do catálogo). Cada tag aponta para um
+    bitset (int do Python) sobre essas posições, de modo que os filtros de tags
+    viram operações de conjunto e o orçamento vira um corte por bisect.
+    """
+
+    def __init__(self, itens, normalizados: dict = None, colunas: dict = None):
+        """
+        Constrói o índice a partir da lista de itens do catálogo.
+
+        Args:
+            itens (list): Lista de dicionários do catálogo (ou sequência
+                preguiçosa, acessada apenas para os itens devolvidos)
+            normalizados (dict): Textos normalizados de uma carga anterior
+            colunas (dict): Colunas já extraídas pelo carregador do catálogo
+        """
+        if colunas is None:
+            colunas = extrair_colunas(itens)
+        precos = colunas['preco']
+
+        self.fonte = itens
+        # Posição (ordem de preço) → índice do item na fonte
+        self.ordem = sorted(range(len(precos)), key=precos.__getitem__)
+        self.precos = [precos[indice] for indice in self.ordem]
+        # Soma na ordem original do catálogo para manter a média idêntica
+        self.soma_precos = sum(precos)
+        self.todos = (1 << len(self.ordem)) - 1
+
+        self.bitsets_tags = {}
+        for posicao, indice in enumerate(self.ordem):
+            bit = 1 << posicao
+            for tag in colunas['tags'][indice]:
+                self.bitsets_tags[tag] = self.bitsets_tags.get(tag, 0) | bit
+
+        textos = [colunas['nome'][indice] + ' ' + colunas['descricao'][indice] for indice in self.ordem]
+        self.indice_texto = IndiceTexto(textos, normalizados)
+
+    def __len__(self) -> int:
+        return len(self.ordem)
+
+    def item(self, posicao: int) -> dict:
+        """
+        Item na posição informada (ordem de preço).
+
+        Args:
+            posicao (int): Posição no índice
+
+        Returns:
+            dict: Item no formato do catálogo
+        """
+        return self.fonte[self.ordem[posicao]]
+
+    def textos_busca(self):
+        """
+        Texto pesquisável (`nome + descricao`) de cada item, na ordem das posições.
+
+        Yields:
+            str: Texto original do item
+        """
+        for posicao in range(len(self)):
+            item = self.item(posicao)
+            yield item['nome'] + ' ' + item['descricao']
+
+    def texto_normalizado(self, posicao: int) -> str:
+        """Texto pesquisável já normalizado do item na posição (veja `normalizar_texto`)."""
+        return self.indice_texto.textos[posicao]
+
+    def corte_orcamento(self, budget) -> int:
+        """
+        Quantidade de itens com preço menor ou igual ao orçamento.
+
+        Args:
+            budget (float): Preço máximo ou None para não limitar
+
+        Returns:
+            int: As posições abaixo do corte são as que cabem no orçamento
+        """
+        if budget is None:
+            return len(self)
+        return bisect_right(self.precos, budget)
+
+    def mascara_orcamento(self, budget) -> int:
+        """
+        Bitset dos itens com preço menor ou igual ao orçamento.
+
+        Args:
+            budget (float): Preço máximo ou None para não limitar
+
+        Returns:
+            int: Bitset sobre as posições ordenadas por preço
+        """
+        return (1 << self.corte_orcamento(budget)) - 1
+
+    def mascara_tags(self, incluir, excluir) -> int:
+        """
+        Bitset dos itens que têm todas as tags de `incluir` e nenhuma de `excluir`.
+
+        Args:
+            incluir (iterable): Tags obrigatórias
+            excluir (iterable): Tags proibidas
+
+        Returns:
+            int: Bitset sobre as posições ordenadas por preço
+        """
+        mascara = self.todos
+        for tag in incluir:
+            mascara &= self.bitsets_tags.get(tag, 0)
+            if not mascara:
+                return 0
+        for tag in excluir:
+            mascara &= ~self.bitsets_tags.get(tag, 0)
+        return mascara
+
+    def bitset_posicoes(self, posicoes: list) -> int:
+        """
+        Converte uma lista de posições em bitset.
+
+        Args:
+            posicoes (list): Posições no índice
+
+        Returns:
+            int: Bitset com as posições marcadas
+        """
+        buffer = bytearray((len(self) + 7) // 8)
+        for posicao in posicoes:
+            buffer[posicao >> 3] |= 1 << (posicao & 7)
+        return int.from_bytes(buffer, 'little')
+
+    def iterar_posicoes(self, mascara: int):
+        """
+        Percorre as posições presentes no bitset, da mais barata para a mais cara.
+
+        Args:
+            mascara (int): Bitset de posições
+
+        Yields:
+            int: Posição do item no índice
+        """
+        if not mascara:
+            return
+        # Operar no inteiro inteiro custaria O(n/64) por posição: o bitset é
+        # convertido uma vez em bytes e percorrido em palavras de 64 bits
+        dados = mascara.to_bytes((mascara.bit_length() + 7) // 8, 'little')
+        for inicio in range(0, len(dados), 8):
+            palavra = int.from_bytes(dados[inicio:inicio + 8], 'little')
+            base = inicio * 8
+            while palavra:
+                menor_bit = palavra & -palavra
+                yield base + menor_bit.bit_length() - 1
+                palavra ^= menor_bit
+
+    def search(self, filters: dict, limite: int = 10) -> list:
+        """
+        Aplica os filtros de `search_catalog` usando o índice.
+
+        Args:
+            filters (dict): Mesmos filtros aceitos por `search_catalog`
+            limite (int): Quantidade máxima de resultados
+
+        Returns:
+            list: Até `limite` refeições ordenadas por preço
+        """
+        return [self.item(posicao) for posicao in self.posicoes(filters, limite)]
+
+    def posicoes(self, filters: dict, limite: int = 10) -> list:
+        """
+        Mesma busca de `search`, devolvendo as posições em vez dos itens.
+
+        Args:
+            filters (dict): Mesmos filtros aceitos por `search_catalog`
+            limite (int): Quantidade máxima de resultados
+
+        Returns:
+            list: Até `limite` posições, em ordem de preço
+        """
+        mascara = self.mascara_orcamento(filters.get('budget'))
+        if mascara:
+            mascara &= self.mascara_tags(filters.get('incluir_tags') or [], filters.get('excluir_tags') or [])
+
+        verificar = None
+        requisitos = filters.get('ingredientes_obrigatorios') or []
+        if mascara and requisitos:
+            modo = filters.get('modo_ingredientes', MODO_QUALQUER)
+            restricoes, verificar = self.indice_texto.plano(requisitos, modo)
+            for posicoes in restricoes:
+                mascara &= self.bitset_posicoes(posicoes)
+
+        resultados = []
+        for posicao in self.iterar_posicoes(mascara):
+            if verificar and not verificar(posicao):
+                continue
+            resultados.append(posicao)
+            if len(resultados) >= limite:
+                break
+
+        return resultados
+
+    def _violadores(self, restricao: tuple) -> int:
+        """Bitset dos itens que violam uma restrição de `listar_restricoes`."""
+        tipo, valor = restricao
+        if tipo == RESTRICAO_BUDGET:
+            return self.todos & ~self.mascara_orcamento(valor)
+        if tipo == RESTRICAO_INCLUIR:
+            return self.todos & ~self.bitsets_tags.get(valor, 0)
+        if tipo == RESTRICAO_EXCLUIR:
+            return self.bitsets_tags.get(valor, 0)
+        posicoes = self.indice_texto.todas_posicoes(requisitos_normalizados(restricao))
+        return self.todos & ~self.bitset_posicoes(posicoes)
+
+    def rank(self, filters: dict, limite: int = 10) -> list:
+        """
+        Ordena os itens pelo quanto se afastam dos filtros (veja `posicoes_ranqueadas`).
+
+        Args:
+            filters (dict): Mesmos filtros aceitos por `search_catalog`
+            limite (int): Quantidade máxima de resultados
+
+        Returns:
+            list: Até `limite` pares (item, violacoes); violacoes vazia = item exato
+        """
+        return [(self.item(posicao), violacoes) for posicao, violacoes in self.posicoes_ranqueadas(filters, limite)]
+
+    def posicoes_ranqueadas(self, filters: dict, limite: int = 10) -> list:
+        """
+        Ordena os itens pelo quanto se afastam dos filtros, em uma única passada.
+
+        Cada restrição vira um bitset de violadores, e um contador em bits
+        (somador sobre os bitsets) dá o número de violações de cada item. A
+        ordem é: menos violações, depois quem respeita o orçamento, depois o
+        preço (que, entre os que estouram o orçamento, é o tamanho do estouro).
+
+        Args:
+            filters (dict): Mesmos filtros aceitos por `search_catalog`
+            limite (int): Quantidade máxima de resultados
+
+        Returns:
+            list: Até `limite` pares (posicao, violacoes); violacoes vazia = item exato
+        """
+        restricoes = listar_restricoes(filters)
+        violadores = [self._violadores(restricao) for restricao in restricoes]
+
+        # contadores[b] = itens cujo número de violações tem o bit b ligado
+        contadores = []
+        for bitset in violadores:
+            vai_um = bitset
+            for bit in range(len(contadores)):
+                contadores[bit], vai_um = contadores[bit] ^ vai_um, contadores[bit] & vai_um
+                if not vai_um:
+                    break
+            if vai_um:
+                contadores.append(vai_um)
+
+        fora_orcamento = 0
+        if restricoes and restricoes[0][0] == RESTRICAO_BUDGET:
+            fora_orcamento = violadores[0]
+
+        def em_ordem():
+            # Contagens acima de 2**len(contadores) - 1 não existem
+            for quantidade in range(1 << len(contadores)):
+                grupo = self.todos
+                for bit, contador in enumerate(contadores):
+                    grupo &= contador if quantidade >> bit & 1 else ~contador
+                yield from self.iterar_posicoes(grupo & ~fora_orcamento)
+                yield from self.iterar_posicoes(grupo & fora_orcamento)
+
+        resultados = []
+        for posicao in islice(em_ordem(), limite):
+            violacoes = [descrever_violacao(restricao, self.precos[posicao])
+                         for restricao, bitset in zip(restricoes, violadores) if bitset >> posicao & 1]
+            resultados.append((posicao, violacoes))
+        return resultados
+
+    def cheapest_item(self) -> dict:
+        """
+        Retorna o prato mais barato (o primeiro do catálogo em caso de empate).
+
+        Returns:
+            dict: Prato mais barato ou None se o índice estiver vazio
+        """
+        if not len(self):
+            return None
+        return self.item(0)
+
+    def most_expensive_item(self) -> dict:
+        """
+        Retorna o prato mais caro (o primeiro do catálogo em caso de empate).
+
+        Returns:
+            dict: Prato mais caro ou None se o índice estiver vazio
+        """
+        if not len(self):
+            return None
+        return self.item(bisect_left(self.precos, self.precos[-1]))
+
+    def price_range(self) -> dict:
+        """
+        Retorna informações sobre a faixa de preços indexada.
+
+        Returns:
+            dict: Informações de preços (min, max, média)
+        """
+        if not len(self):
+            return {"min_price": 0, "max_price": 0, "avg_price": 0, "total_items": 0}
+
+        return {
+            "min_price": self.precos[0],
+            "max_price": self.precos[-1],
+            "avg_price": round(self.soma_precos / len(self), 2),
+            "total_items": len(self)
+        }
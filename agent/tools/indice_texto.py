@@ -0,0 +1,184 @@
+import re
+import unicodedata
+from array import array
+from bisect import bisect_right
+
+MODO_QUALQUER = 'qualquer'
+MODO_TODOS = 'todos'
+
+_TOKEN = re.compile(r'\w+')
+
+# Marca "fora do cache" (None é um valor válido no cache de fragmentos)
+_AUSENTE = object()
+
+
+def normalizar_texto(texto: str) -> str:
+    """
+    Normaliza um texto para comparação: minúsculas e sem acentos.
+
+    Args:
+        texto (str): Texto original
+
+    Returns:
+        str: Texto normalizado ("Brócolis" → "brocolis")
+    """
+    decomposto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(char for char in decomposto if not unicodedata.combining(char))
+
+
+def tokenizar(texto: str) -> list:
+    """
+    Divide um texto já normalizado em tokens alfanuméricos.
+
+    Args:
+        texto (str): Texto normalizado
+
+    Returns:
+        list: Tokens na ordem em que aparecem
+    """
+    return _TOKEN.findall(texto)
+
+
+class IndiceTexto:
+    """
+    Índice invertido de tokens sobre o texto normalizado de `nome + descricao`.
+
+    As posições são as mesmas do motor que o constrói (ordem de preço). Um
+    requisito casa por substring, como antes; o índice só restringe os
+    candidatos aos itens cujos tokens contêm cada fragmento do requisito.
+    """
+
+    # Acima deste número de candidatos é mais barato verificar item a item,
+    # já que a busca para nos 10 primeiros resultados
+    LIMITE_SELETIVIDADE = 4096
+    LIMITE_CACHE_FRAGMENTOS = 1024
+
+    def __init__(self, textos: list, normalizados: dict = None):
+        """
+        Args:
+            textos (list): Texto de cada item, na ordem das posições do motor
+            normalizados (dict): Textos já normalizados em uma carga anterior
+                (original → normalizado), reaproveitados em recargas
+        """
+        normalizados = normalizados or {}
+        self.textos = [normalizados.get(texto) or normalizar_texto(texto) for texto in textos]
+        postings = {}
+        for posicao, texto in enumerate(self.textos):
+            for token in set(tokenizar(texto)):
+                postings.setdefault(token, []).append(posicao)
+        # O vocabulário fica num único texto ("tok1\ntok2\n...") para achar os
+        # tokens que contêm um fragmento com str.find, sem visitar token a token.
+        # As posições de cada token ficam em arrays, sem um objeto por posição:
+        # assim uma busca não escreve nas páginas herdadas pelos workers pré-fork.
+        self.tokens = list(postings)
+        self.postings = [array('i', postings[token]) for token in self.tokens]
+        self._vocabulario = '\n'.join(self.tokens)
+        self._inicios = array('q', [0])
+        for token in self.tokens[:-1]:
+            self._inicios.append(self._inicios[-1] + len(token) + 1)
+        self._cache_fragmentos = {}
+
+    def _listas_fragmento(self, fragmento: str) -> list:
+        """Listas de posições de todos os tokens que contêm o fragmento."""
+        listas = []
+        inicio = self._vocabulario.find(fragmento)
+        while inicio >= 0:
+            indice = bisect_right(self._inicios, inicio) - 1
+            listas.append(self.postings[indice])
+            # Próximo token: um token com duas ocorrências entra uma vez só
+            if indice + 1 >= len(self._inicios):
+                break
+            inicio = self._vocabulario.find(fragmento, self._inicios[indice + 1])
+        return listas
+
+    def _posicoes_fragmento(self, fragmento: str):
+        """Posições com algum token que contém o fragmento, ou None se forem muitas."""
+        # Uma única leitura: entre um `in` e o índice, outra thread pode limpar o cache
+        posicoes = self._cache_fragmentos.get(fragmento, _AUSENTE)
+        if posicoes is not _AUSENTE:
+            return posicoes
+
+        listas = self._listas_fragmento(fragmento)
+        if sum(len(lista) for lista in listas) > self.LIMITE_SELETIVIDADE:
+            posicoes = None
+        else:
+            posicoes = set().union(*listas)
+
+        if len(self._cache_fragmentos) >= self.LIMITE_CACHE_FRAGMENTOS:
+            self._cache_fragmentos.clear()
+        self._cache_fragmentos[fragmento] = posicoes
+        return posicoes
+
+    def posicoes(self, requisito: str):
+        """
+        Posições cujo texto contém o requisito.
+
+        Args:
+            requisito (str): Requisito já normalizado
+
+        Returns:
+            list: Posições ordenadas, ou None quando o requisito é pouco seletivo
+                  e deve ser verificado item a item
+        """
+        conjuntos = [self._posicoes_fragmento(fragmento) for fragmento in set(tokenizar(requisito))]
+        conjuntos = sorted((conjunto for conjunto in conjuntos if conjunto is not None), key=len)
+        if not conjuntos:
+            return None
+
+        candidatos = conjuntos[0].intersection(*conjuntos[1:])
+        return sorted(posicao for posicao in candidatos if requisito in self.textos[posicao])
+
+    def todas_posicoes(self, requisitos: list) -> list:
+        """
+        Posições cujo texto contém algum dos requisitos, mesmo os pouco seletivos.
+
+        Args:
+            requisitos (list): Requisitos já normalizados
+
+        Returns:
+            list: Posições ordenadas
+        """
+        encontradas = set()
+        for requisito in requisitos:
+            fragmentos = set(tokenizar(requisito))
+            if not fragmentos:
+                encontradas.update(posicao for posicao, texto in enumerate(self.textos) if requisito in texto)
+                continue
+            candidatos = None
+            for fragmento in fragmentos:
+                # Sem o limite de seletividade de _posicoes_fragmento: aqui todas importam
+                conjunto = set().union(*self._listas_fragmento(fragmento))
+                candidatos = conjunto if candidatos is None else candidatos & conjunto
+            if len(fragmentos) == 1 and requisito in fragmentos:
+                encontradas |= candidatos
+            else:
+                encontradas.update(posicao for posicao in candidatos if requisito in self.textos[posicao])
+        return sorted(encontradas)
+
+    def plano(self, requisitos: list, modo: str = MODO_QUALQUER) -> tuple:
+        """
+        Prepara a filtragem por ingredientes para um motor de busca.
+
+        Args:
+            requisitos (list): Ingredientes/palavras pedidos pelo usuário
+            modo (str): MODO_QUALQUER (basta um) ou MODO_TODOS (todos presentes)
+
+        Returns:
+            tuple: (restricoes, verificar) — listas de posições que o motor deve
+                   intersectar com a sua máscara e uma função `verificar(posicao)`
+                   para os candidatos restantes, ou None se não for necessária
+        """
+        normalizados = [normalizar_texto(requisito) for requisito in requisitos]
+        seletivos = [self.posicoes(requisito) for requisito in normalizados]
+        textos = self.textos
+
+        if modo == MODO_TODOS:
+            pendentes = [req for req, lista in zip(normalizados, seletivos) if lista is None]
+            restricoes = [lista for lista in seletivos if lista is not None]
+            if not pendentes:
+                return restricoes, None
+            return restricoes, lambda posicao: all(req in textos[posicao] for req in pendentes)
+
+        if all(lista is not None for lista in seletivos):
+            return [sorted(set().union(*seletivos))], None
+        return [], lambda posicao: any(req in textos[posicao] for req in normalizados)
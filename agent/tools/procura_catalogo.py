@@ -1,16 +1,121 @@
-import json
 import os
 
+from .cache_resultados import ResultCache
+from .catalogo_colunar import ColumnarCatalog, np
+from .catalogo_particionado import ShardedCatalog
+from .catalogo_particionado import estatisticas as _estatisticas_particionado
+from .indice_catalogo import CatalogIndex
+from .repositorio_catalogo import CatalogStore
+from .restricoes import descrever_violacao, listar_restricoes, violadas
+
 current_dir = os.path.dirname(os.path.abspath(__file__))
-catalogo_path = os.path.join(current_dir, '..', '..', 'catalogo.json')
+catalogo_path = os.getenv('CATALOGO_PATH', os.path.join(current_dir, '..', '..', 'catalogo.json'))
+
+# "indice" (padrão, Python puro) ou "colunar" (NumPy, para catálogos muito grandes)
+CATALOGO_BACKEND = os.getenv('CATALOGO_BACKEND', 'indice')
+# Segundos entre verificações do arquivo do catálogo (0 desativa a recarga automática)
+CATALOGO_INTERVALO_RECARGA = float(os.getenv('CATALOGO_INTERVALO_RECARGA', '0'))
+# Partições do catálogo e campo dos pratos com a rede: com mais de uma partição, ou
+# com o campo definido, as buscas usam o ShardedCatalog (filtro "redes" opcional)
+CATALOGO_PARTICOES = int(os.getenv('CATALOGO_PARTICOES', '1'))
+CATALOGO_CAMPO_REDE = os.getenv('CATALOGO_CAMPO_REDE') or None
+# Processos que consultam as partições em paralelo (padrão: número de CPUs)
+CATALOGO_PROCESSOS = int(os.getenv('CATALOGO_PROCESSOS', '0')) or None
+# Buscas guardadas no cache de resultados (0 desativa)
+CACHE_RESULTADOS_MAX = int(os.getenv('CACHE_RESULTADOS_MAX', '2048'))
+
+def _criar_motor(itens, normalizados: dict = None, colunas: dict = None):
+    """
+    Cria o motor de busca configurado em CATALOGO_BACKEND, particionado quando
+    CATALOGO_PARTICOES ou CATALOGO_CAMPO_REDE pedem.
+
+    Args:
+        itens (list): Sequência de itens do catálogo
+        normalizados (dict): Textos normalizados de uma carga anterior
+        colunas (dict): Colunas já extraídas pelo carregador do catálogo
+
+    Returns:
+        CatalogIndex | ColumnarCatalog | ShardedCatalog: Motor usado pelas funções de busca
+    """
+    if CATALOGO_PARTICOES > 1 or CATALOGO_CAMPO_REDE:
+        return ShardedCatalog(itens, normalizados, colunas, particoes=CATALOGO_PARTICOES,
+                              campo_rede=CATALOGO_CAMPO_REDE, processos=CATALOGO_PROCESSOS,
+                              criar_motor=_criar_motor_particao)
+    return _criar_motor_particao(itens, normalizados, colunas)
+
+def _criar_motor_particao(itens, normalizados: dict = None, colunas: dict = None):
+    """Motor de CATALOGO_BACKEND para o catálogo inteiro ou para uma partição."""
+    if CATALOGO_BACKEND == 'colunar':
+        if np is not None:
+            return ColumnarCatalog(itens, normalizados, colunas)
+        print("Aviso: numpy não instalado, usando o índice padrão do catálogo.")
+    return CatalogIndex(itens, normalizados, colunas)
+
+repositorio = CatalogStore(catalogo_path, _criar_motor, ResultCache(CACHE_RESULTADOS_MAX))
+if CATALOGO_INTERVALO_RECARGA > 0:
+    repositorio.observar(CATALOGO_INTERVALO_RECARGA)
+
+def __getattr__(nome):
+    # `catalogo` e `motor` sempre refletem a versão publicada mais recente
+    if nome == 'catalogo':
+        return repositorio.snapshot.itens
+    if nome == 'motor':
+        return repositorio.snapshot.motor
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+
+def reload_catalog(force: bool = False) -> bool:
+    """
+    Recarrega o catálogo do disco e publica uma nova versão se ele mudou.
+
+    Args:
+        force (bool): Relê o arquivo mesmo sem mudança de mtime/tamanho
+
+    Returns:
+        bool: True se uma nova versão foi publicada
+    """
+    return repositorio.reload(force)
+
+def start_search_processes(snapshot=None) -> bool:
+    """
+    Cria o pool de processos do catálogo particionado. Chame antes de o
+    processo iniciar outras threads (o pool é criado por fork).
 
-try:
-    with open(catalogo_path, 'r', encoding='utf-8') as file:
-        catalogo = json.load(file)
-except (FileNotFoundError, json.JSONDecodeError):
-    catalogo = []
+    Args:
+        snapshot (CatalogSnapshot): Versão do catálogo a usar (padrão: a atual)
+
+    Returns:
+        bool: True se as buscas grandes vão usar o pool
+    """
+    snapshot = snapshot or repositorio.snapshot
+    if not isinstance(snapshot.motor, ShardedCatalog):
+        return False
+    return snapshot.motor.iniciar_processos()
+
+def uses_search_processes(snapshot=None) -> bool:
+    """
+    Indica se as buscas grandes do catálogo dependem do pool de processos, que
+    só nasce antes de o processo ter outras threads (veja start_search_processes).
+
+    Args:
+        snapshot (CatalogSnapshot): Versão do catálogo a usar (padrão: a atual)
+
+    Returns:
+        bool: True para um catálogo particionado grande, com fork e mais de um processo
+    """
+    snapshot = snapshot or repositorio.snapshot
+    return isinstance(snapshot.motor, ShardedCatalog) and snapshot.motor.usa_processos()
 
-def search_catalog(filters: dict) -> list:
+def search_process_stats() -> dict:
+    """
+    Buscas grandes do catálogo particionado neste processo: pelo pool, sem pool
+    (o processo já tinha outras threads) e refeitas aqui depois de o pool quebrar.
+
+    Returns:
+        dict: buscas_pool, buscas_sem_pool e buscas_pool_quebrado
+    """
+    return _estatisticas_particionado()
+
+def search_catalog(filters: dict, snapshot=None, aproximados: bool = False, limite: int = 10) -> list:
     """
     Busca no catálogo de refeições baseado nos filtros fornecidos.
     
@@ -20,85 +125,179 @@ def search_catalog(filters: dict) -> list:
             - incluir_tags (list): Tags que devem estar presentes
             - excluir_tags (list): Tags que devem ser excluídas
             - ingredientes_obrigatorios (list): Ingredientes/palavras que devem estar no nome ou descrição
+              (comparação sem acentos e sem diferenciar maiúsculas)
+            - modo_ingredientes (str): "qualquer" (padrão, basta um ingrediente) ou "todos"
+            - redes (list): Só pratos destas redes (catálogo particionado por CATALOGO_CAMPO_REDE;
+              ignorado nos demais)
+        snapshot (CatalogSnapshot): Versão do catálogo a usar (padrão: a atual)
+        aproximados (bool): Sem resultado exato, devolve os itens mais próximos
+            (menos filtros violados, depois menor estouro do orçamento), cada um com
+            a chave "violacoes" listando os filtros que ele não atende
+        limite (int): Máximo de refeições devolvidas
     
     Returns:
-        list: Lista de até 10 refeições ordenadas por preço
+        list: Lista de até `limite` refeições ordenadas por preço (ou por proximidade)
     """
-    if not catalogo:
-        return []
-    
-    budget = filters.get('budget')
-    incluir = set(filters.get('incluir_tags', []))
-    excluir = set(filters.get('excluir_tags', []))
-    requisitos = filters.get('ingredientes_obrigatorios', [])
+    snapshot = snapshot or repositorio.snapshot
+    posicoes, exatos = search_positions(filters, snapshot, aproximados, limite)
+    return items_at(posicoes, exatos, filters, snapshot)
 
-    resultados = []
-    
-    for item in catalogo:
-        if budget is not None and item['preco'] > budget:
-            continue
-        
-        item_tags = set(item['tags'])
-        if incluir and not incluir.issubset(item_tags):
-            continue
-        
-        if excluir and excluir.intersection(item_tags):
-            continue
-        
-        if requisitos:
-            text = (item['nome'] + ' ' + item['descricao']).lower()
-            # Verifica se ALGUMAS das palavras requisitadas estão no texto
-            if not any(requisito.lower() in text for requisito in requisitos):
-                continue
+def search_positions(filters: dict, snapshot=None, aproximados: bool = False, limite: int = 10) -> tuple:
+    """
+    Mesma busca de `search_catalog`, devolvendo as posições dos itens no motor.
 
-        resultados.append(item)
+    As posições só valem para o motor do snapshot usado (veja `items_at`).
 
-    resultados.sort(key=lambda x: x['preco'])
-    
-    return resultados[:10]
+    Args:
+        filters (dict): Filtros de `search_catalog`
+        snapshot (CatalogSnapshot): Versão do catálogo a usar (padrão: a atual)
+        aproximados (bool): Sem resultado exato, devolve os itens mais próximos
+        limite (int): Máximo de posições devolvidas
 
-def get_cheapest_item() -> dict:
+    Returns:
+        tuple: (posições em ordem de preço ou de proximidade, exatos) — exatos é
+               False quando as posições são de itens aproximados
+    """
+    snapshot = snapshot or repositorio.snapshot
+    if not snapshot.itens:
+        return [], True
+
+    motor, cache = snapshot.motor, snapshot.resultados
+    chave = cache.chave(snapshot, filters, aproximados, limite)
+    guardado = cache.get(chave)
+    if guardado is not None:
+        posicoes, exatos = guardado
+        return list(posicoes), exatos
+
+    if not aproximados:
+        posicoes = motor.posicoes(filters, limite)
+        cache.put(chave, posicoes, True)
+        return posicoes, True
+
+    ranqueados = motor.posicoes_ranqueadas(filters, limite)
+    exatos = [posicao for posicao, violacoes in ranqueados if not violacoes]
+    if exatos:
+        cache.put(chave, exatos, True)
+        return exatos, True
+    posicoes = [posicao for posicao, _ in ranqueados]
+    cache.put(chave, posicoes, False)
+    return posicoes, False
+
+def items_at(posicoes: list, exatos: bool = True, filters: dict = None, snapshot=None) -> list:
+    """
+    Monta os itens de posições devolvidas por `search_positions`.
+
+    Args:
+        posicoes (list): Posições no motor do snapshot
+        exatos (bool): False para itens aproximados, que recebem a chave "violacoes"
+        filters (dict): Filtros da busca (usados só para descrever as violações)
+        snapshot (CatalogSnapshot): A mesma versão do catálogo da busca
+
+    Returns:
+        list: Itens no formato do catálogo
+    """
+    motor = (snapshot or repositorio.snapshot).motor
+    itens = [motor.item(posicao) for posicao in posicoes]
+    if exatos:
+        return itens
+    # As violações dependem dos valores pedidos (ex.: o excesso sobre este orçamento)
+    restricoes = listar_restricoes(filters or {})
+    return [{**item, "violacoes": [descrever_violacao(restricao, item['preco'])
+                                   for restricao in violadas(restricoes, item, motor.texto_normalizado(posicao))]}
+            for posicao, item in zip(posicoes, itens)]
+
+def get_cheapest_item(snapshot=None) -> dict:
     """
     Retorna o prato mais barato do catálogo.
     
+    Args:
+        snapshot (CatalogSnapshot): Versão do catálogo a usar (padrão: a atual)
+    
     Returns:
         dict: Prato mais barato ou None se catálogo vazio
     """
-    if not catalogo:
+    snapshot = snapshot or repositorio.snapshot
+    if not snapshot.itens:
         return None
     
-    return min(catalogo, key=lambda x: x['preco'])
+    return snapshot.motor.cheapest_item()
 
 
-def get_most_expensive_item() -> dict:
+def get_most_expensive_item(snapshot=None) -> dict:
     """
     Retorna o prato mais caro do catálogo.
     
+    Args:
+        snapshot (CatalogSnapshot): Versão do catálogo a usar (padrão: a atual)
+    
     Returns:
         dict: Prato mais caro ou None se catálogo vazio
     """
-    if not catalogo:
+    snapshot = snapshot or repositorio.snapshot
+    if not snapshot.itens:
         return None
     
-    return max(catalogo, key=lambda x: x['preco'])
+    return snapshot.motor.most_expensive_item()
 
 
-def get_price_range() -> dict:
+def get_price_range(snapshot=None) -> dict:
     """
     Retorna informações sobre a faixa de preços do catálogo.
     
+    Args:
+        snapshot (CatalogSnapshot): Versão do catálogo a usar (padrão: a atual)
+    
     Returns:
         dict: Informações de preços (min, max, média)
     """
-    if not catalogo:
+    snapshot = snapshot or repositorio.snapshot
+    if not snapshot.itens:
         return {"min_price": 0, "max_price": 0, "avg_price": 0, "total_items": 0}
     
-    precos = [item['preco'] for item in catalogo]
+    return snapshot.motor.price_range()
+
+
+def get_cheapest_item_by_tags(tags: list, snapshot=None) -> dict:
+    """
+    Retorna o prato mais barato entre os que têm todas as tags informadas.
+    
+    Args:
+        tags (list): Tags exigidas (ex.: ["vegano"])
+        snapshot (CatalogSnapshot): Versão do catálogo a usar (padrão: a atual)
+    
+    Returns:
+        dict: Prato mais barato ou None se nenhum prato tiver as tags
+    """
+    snapshot = snapshot or repositorio.snapshot
+    return snapshot.agregados.estatisticas(tags)["cheapest"]
+
+
+def get_most_expensive_item_by_tags(tags: list, snapshot=None) -> dict:
+    """
+    Retorna o prato mais caro entre os que têm todas as tags informadas.
+    
+    Args:
+        tags (list): Tags exigidas
+        snapshot (CatalogSnapshot): Versão do catálogo a usar (padrão: a atual)
     
-    return {
-        "min_price": min(precos),
-        "max_price": max(precos),
-        "avg_price": round(sum(precos) / len(precos), 2),
-        "total_items": len(catalogo)
-    }
+    Returns:
+        dict: Prato mais caro ou None se nenhum prato tiver as tags
+    """
+    snapshot = snapshot or repositorio.snapshot
+    return snapshot.agregados.estatisticas(tags)["most_expensive"]
 
+
+def get_price_range_by_tags(tags: list, snapshot=None) -> dict:
+    """
+    Retorna a faixa de preços dos pratos que têm todas as tags informadas.
+    
+    Args:
+        tags (list): Tags exigidas
+        snapshot (CatalogSnapshot): Versão do catálogo a usar (padrão: a atual)
+    
+    Returns:
+        dict: Informações de preços (min, max, média, total)
+    """
+    snapshot = snapshot or repositorio.snapshot
+    estatisticas = snapshot.agregados.estatisticas(tags)
+    return {chave: estatisticas[chave] for chave in ("min_price", "max_price", "avg_price", "total_items")}
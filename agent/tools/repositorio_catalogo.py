@@ -0,0 +1,173 @@
+import hashlib
+import os
+import threading
+
+from .agregados_catalogo import CatalogAggregates
+from .cache_resultados import ResultCache
+from .carrega_catalogo import em_memoria, ler_catalogo
+
+TAMANHO_BLOCO_HASH = 1 << 20
+
+
+class CatalogSnapshot:
+    """
+    Versão imutável do catálogo: itens, motor de busca, tags, agregados de preço
+    e o cache de resultados de busca.
+
+    Uma conversa deve pegar o snapshot uma vez e usá-lo até o fim, assim uma
+    recarga no meio do caminho nunca mistura duas versões do catálogo.
+    """
+
+    def __init__(self, versao: int, itens: list, motor, tags: frozenset, hash_conteudo: str = None,
+                 agregados: CatalogAggregates = None, resultados: ResultCache = None):
+        """
+        Args:
+            versao (int): Número da versão (0 = catálogo vazio inicial)
+            itens (list): Itens do catálogo (lista, ItensCompactos ou ItensNDJSON)
+            motor: Motor de busca construído sobre os itens
+            tags (frozenset): Tags únicas do catálogo
+            hash_conteudo (str): SHA-1 do arquivo que originou a versão
+            agregados (CatalogAggregates): Preços agregados global e por tag
+            resultados (ResultCache): Cache de resultados de busca, compartilhado entre
+                as versões de um mesmo repositório (a chave inclui a versão)
+        """
+        self.versao = versao
+        self.itens = itens
+        self.motor = motor
+        self.tags = tags
+        self.hash_conteudo = hash_conteudo
+        self.agregados = agregados if agregados is not None else CatalogAggregates(itens)
+        self.resultados = resultados if resultados is not None else ResultCache()
+
+
+class CatalogStore:
+    """
+    Repositório único do catálogo, com versão e troca atômica.
+
+    `reload` relê o arquivo, reconstrói motor e tags fora do lock de leitura e
+    só então publica o novo snapshot com uma única atribuição. Leitores nunca
+    veem um catálogo pela metade.
+    """
+
+    def __init__(self, caminho: str, criar_motor, cache_resultados: ResultCache = None):
+        """
+        Args:
+            caminho (str): Caminho do catálogo (JSON ou NDJSON)
+            criar_motor (callable): Função `criar_motor(itens, normalizados, colunas)`
+                que devolve o motor de busca para uma sequência de itens
+            cache_resultados (ResultCache): Cache de resultados de busca de todas as versões
+        """
+        self.caminho = caminho
+        self.criar_motor = criar_motor
+        self.cache_resultados = cache_resultados if cache_resultados is not None else ResultCache()
+        self._lock = threading.Lock()
+        self._assinatura = None
+        self._assinatura_invalida = None
+        self._parar = threading.Event()
+        self._observador = None
+
+        self.snapshot = CatalogSnapshot(0, [], criar_motor([]), frozenset(), resultados=self.cache_resultados)
+        self.reload()
+
+    @property
+    def versao(self) -> int:
+        return self.snapshot.versao
+
+    def _assinatura_arquivo(self):
+        """(mtime, tamanho) do arquivo, ou None se ele não existir."""
+        try:
+            stat = os.stat(self.caminho)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _hash_arquivo(self) -> str:
+        """SHA-1 do arquivo, lido em blocos para não carregá-lo inteiro."""
+        sha1 = hashlib.sha1()
+        with open(self.caminho, 'rb') as file:
+            for bloco in iter(lambda: file.read(TAMANHO_BLOCO_HASH), b''):
+                sha1.update(bloco)
+        return sha1.hexdigest()
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Recarrega o catálogo se o arquivo mudou.
+
+        Args:
+            force (bool): Relê o arquivo mesmo sem mudança de mtime/tamanho
+
+        Returns:
+            bool: True se uma nova versão foi publicada
+        """
+        with self._lock:
+            assinatura = self._assinatura_arquivo()
+            if not force and assinatura is not None and assinatura in (self._assinatura, self._assinatura_invalida):
+                return False
+
+            atual = self.snapshot
+            try:
+                hash_conteudo = self._hash_arquivo()
+                if hash_conteudo == atual.hash_conteudo:
+                    self._assinatura = assinatura
+                    return False
+                itens, colunas = ler_catalogo(self.caminho)
+                # Reaproveita a normalização de textos que não mudaram (catálogos
+                # preguiçosos exigiriam reler cada item, então são normalizados de novo)
+                normalizados = None
+                if em_memoria(atual.itens):
+                    normalizados = dict(zip(atual.motor.textos_busca(), atual.motor.indice_texto.textos))
+                motor = self.criar_motor(itens, normalizados, colunas)
+                tags = frozenset(tag for tags_item in colunas['tags'] for tag in tags_item)
+                # Só as inclusões e remoções desde a versão anterior mexem nos agregados
+                agregados = atual.agregados.atualizado(itens, colunas)
+            except Exception as e:
+                # Um item malformado (ex.: preço nulo) não derruba quem recarrega; o
+                # mesmo arquivo só é lido de novo quando mudar ou com force
+                self._assinatura_invalida = assinatura
+                if atual.versao or not isinstance(e, FileNotFoundError):
+                    print(f"Aviso: Não foi possível recarregar o catálogo, mantendo a versão {atual.versao}: {e!r}")
+                return False
+
+            self.snapshot = CatalogSnapshot(atual.versao + 1, itens, motor, tags, hash_conteudo, agregados,
+                                            self.cache_resultados)
+            self._assinatura = assinatura
+            return True
+
+    def reload_em_segundo_plano(self, force: bool = False) -> threading.Thread:
+        """
+        Dispara `reload` em uma thread, sem bloquear quem chamou.
+
+        Returns:
+            threading.Thread: Thread da recarga
+        """
+        thread = threading.Thread(target=self.reload, kwargs={"force": force}, daemon=True)
+        thread.start()
+        return thread
+
+    def observar(self, intervalo: float = 2.0):
+        """
+        Verifica o arquivo periodicamente e recarrega quando ele muda.
+
+        Args:
+            intervalo (float): Segundos entre verificações
+        """
+        if self._observador is not None:
+            return
+        self._parar.clear()
+
+        def _loop():
+            while not self._parar.wait(intervalo):
+                try:
+                    self.reload()
+                except Exception as e:
+                    print(f"Aviso: Falha ao verificar o catálogo: {e!r}")
+
+        self._observador = threading.Thread(target=_loop, name="catalogo-observador", daemon=True)
+        self._observador.start()
+
+    def parar_observacao(self):
+        """Interrompe a verificação periódica iniciada por `observar`."""
+        self._parar.set()
+        if self._observador is not None:
+            self._observador.join()
+            self._observador = None
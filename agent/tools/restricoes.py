@@ -0,0 +1,148 @@
+from functools import lru_cache
+
+from .indice_texto import MODO_TODOS, normalizar_texto
+
+RESTRICAO_BUDGET = 'budget'
+RESTRICAO_INCLUIR = 'incluir_tags'
+RESTRICAO_EXCLUIR = 'excluir_tags'
+RESTRICAO_INGREDIENTES = 'ingredientes_obrigatorios'
+
+# Os mesmos poucos requisitos são comparados com muitos itens
+_normalizar_requisito = lru_cache(maxsize=1024)(normalizar_texto)
+
+
+def listar_restricoes(filters: dict) -> list:
+    """
+    Quebra os filtros de `search_catalog` em restrições independentes.
+
+    Cada tag incluída ou excluída é uma restrição; os ingredientes são uma
+    única restrição no modo "qualquer" e uma por ingrediente no modo "todos".
+
+    Args:
+        filters (dict): Filtros de `search_catalog`
+
+    Returns:
+        list: Tuplas (tipo, valor), com valor = orçamento, tag ou lista de
+              requisitos já normalizados
+    """
+    restricoes = []
+    if filters.get('budget') is not None:
+        restricoes.append((RESTRICAO_BUDGET, filters['budget']))
+    for tag in filters.get('incluir_tags') or []:
+        restricoes.append((RESTRICAO_INCLUIR, tag))
+    for tag in filters.get('excluir_tags') or []:
+        restricoes.append((RESTRICAO_EXCLUIR, tag))
+
+    requisitos = filters.get('ingredientes_obrigatorios') or []
+    if requisitos:
+        if filters.get('modo_ingredientes') == MODO_TODOS:
+            restricoes.extend((RESTRICAO_INGREDIENTES, [req]) for req in requisitos)
+        else:
+            restricoes.append((RESTRICAO_INGREDIENTES, list(requisitos)))
+    return restricoes
+
+
+def descrever_violacao(restricao: tuple, preco: float) -> dict:
+    """
+    Descrição pública de uma restrição violada por um item.
+
+    Args:
+        restricao (tuple): (tipo, valor) de `listar_restricoes`
+        preco (float): Preço do item
+
+    Returns:
+        dict: Ex.: {"filtro": "budget", "limite": 40.0, "excesso": 5.0}
+    """
+    tipo, valor = restricao
+    if tipo == RESTRICAO_BUDGET:
+        return {"filtro": tipo, "limite": valor, "excesso": round(preco - valor, 2)}
+    if tipo == RESTRICAO_INGREDIENTES:
+        return {"filtro": tipo, "ingredientes": valor}
+    return {"filtro": tipo, "tag": valor}
+
+
+def resumir_violacao(violacao: dict) -> str:
+    """
+    Texto curto de uma violação, para prompts e templates.
+
+    Args:
+        violacao (dict): Saída de `descrever_violacao`
+
+    Returns:
+        str: Ex.: "R$ 5,00 acima do orçamento", "sem a tag vegano"
+    """
+    filtro = violacao["filtro"]
+    if filtro == RESTRICAO_BUDGET:
+        return f"R$ {violacao['excesso']:.2f}".replace('.', ',') + " acima do orçamento"
+    if filtro == RESTRICAO_INCLUIR:
+        return f"sem a tag {violacao['tag']}"
+    if filtro == RESTRICAO_EXCLUIR:
+        return f"tem a tag {violacao['tag']}"
+    return "sem " + " ou ".join(violacao["ingredientes"])
+
+
+def requisitos_normalizados(restricao: tuple) -> list:
+    """Requisitos de uma restrição de ingredientes, normalizados para o índice de texto."""
+    return [_normalizar_requisito(req) for req in restricao[1]]
+
+
+def viola(restricao: tuple, item: dict) -> bool:
+    """
+    Indica se um item viola uma restrição, olhando só o próprio item.
+
+    Usado para filtrar poucos itens já em mãos (ex.: o resultado anterior de
+    uma conversa) sem passar pelo motor de busca.
+
+    Args:
+        restricao (tuple): (tipo, valor) de `listar_restricoes`
+        item (dict): Item no formato do catálogo
+
+    Returns:
+        bool: True se o item não atende à restrição
+    """
+    return bool(violadas([restricao], item))
+
+
+def violadas(restricoes: list, item: dict, texto: str = None) -> list:
+    """
+    Restrições que um item viola, normalizando o texto do item no máximo uma vez.
+
+    Args:
+        restricoes (list): Restrições de `listar_restricoes`
+        item (dict): Item no formato do catálogo
+        texto (str): `nome + descricao` do item já normalizado (ex.: do índice
+            de texto do motor), para não normalizar de novo
+
+    Returns:
+        list: As restrições violadas, na ordem recebida
+    """
+    resultado = []
+    for restricao in restricoes:
+        tipo, valor = restricao
+        if tipo == RESTRICAO_BUDGET:
+            violada = item['preco'] > valor
+        elif tipo == RESTRICAO_INCLUIR:
+            violada = valor not in item.get('tags', [])
+        elif tipo == RESTRICAO_EXCLUIR:
+            violada = valor in item.get('tags', [])
+        else:
+            if texto is None:
+                texto = normalizar_texto(item['nome'] + ' ' + item['descricao'])
+            violada = not any(req in texto for req in requisitos_normalizados(restricao))
+        if violada:
+            resultado.append(restricao)
+    return resultado
+
+
+def atende(item: dict, filters: dict) -> bool:
+    """
+    Indica se um item atende a todos os filtros de `search_catalog`.
+
+    Args:
+        item (dict): Item no formato do catálogo
+        filters (dict): Filtros de `search_catalog`
+
+    Returns:
+        bool: True se nenhuma restrição é violada
+    """
+    return not violadas(listar_restricoes(filters), item)
@@ -7,6 +7,7 @@ Interface Streamlit para o assistente de recomendação de refeições
 import streamlit as st
 import os
 import sys
+import uuid
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,6 +15,7 @@ load_dotenv()
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from agent.agent_executor import MealRecommendationAgent
+from agent.agente_offline import OfflineMealAgent
 
 st.set_page_config(
     page_title="Assistente de Refeições",
@@ -29,7 +31,57 @@ def initialize_agent():
         return MealRecommendationAgent()
     except Exception as e:
         st.warning(f"API da OpenAI não disponível: {e}")
+        return OfflineMealAgent()
+
+
+def render_stream(partes):
+    """Mostra a resposta conforme os trechos chegam e devolve o texto completo"""
+    with st.spinner("Analisando sua solicitação..."):
+        # O spinner cobre a decisão e a busca, até o primeiro trecho da resposta
+        primeira = next(partes, "")
+    
+    placeholder = st.empty()
+    response = primeira
+    placeholder.markdown(response + "▌")
+    for parte in partes:
+        response += parte
+        placeholder.markdown(response + "▌")
+    placeholder.markdown(response)
+    return response
+
+def render_debug_panel(agent, sessao_id: str = None):
+    """Painel lateral com o rastro do último turno desta sessão e as métricas agregadas"""
+    if agent is None or not hasattr(agent, "metricas_snapshot"):
+        return
+    
+    with st.sidebar:
+        if not st.checkbox("Painel de depuração", value=False):
+            return
+        metricas = agent.metricas_snapshot()
+        # O agente é compartilhado entre os usuários: só os turnos desta conversa aparecem
+        metricas.pop("ultimos")
+        ultimos = agent.metricas.ultimos_da_sessao(sessao_id)
+        
+        st.subheader("Último turno")
+        if ultimos:
+            ultimo = ultimos[-1]
+            col1, col2 = st.columns(2)
+            col1.metric("Total", f"{ultimo['tempos'].get('total_ms', 0):.0f} ms")
+            col2.metric("Tokens", ultimo["tokens"]["prompt"] + ultimo["tokens"]["completion"])
+            st.json(ultimo, expanded=False)
+        else:
+            st.caption("Nenhum turno processado ainda.")
         
+        st.subheader("Métricas")
+        col1, col2 = st.columns(2)
+        col1.metric("Turnos", metricas["turnos"])
+        col2.metric("Chamadas ao LLM", metricas["chamadas_llm"])
+        if metricas["etapas"]:
+            st.table({etapa: {"p50 (ms)": valores["p50_ms"], "p95 (ms)": valores["p95_ms"]}
+                      for etapa, valores in metricas["etapas"].items()})
+        st.json(metricas, expanded=False)
+        st.download_button("Exportar (Prometheus)", agent.metricas_prometheus(),
+                           file_name="metricas.prom", mime="text/plain")
 
 def main():
     """Interface principal do Streamlit"""
@@ -64,6 +116,7 @@ def main():
         st.header("Configurações")
         if st.button("Reiniciar conversa"):
             st.session_state.messages = []
+            st.session_state.sessao_id = str(uuid.uuid4())
             st.rerun()
     agent = initialize_agent()
     
@@ -78,6 +131,11 @@ def main():
     else:
         st.success("**Modo Online:** Conectado à API da OpenAI")
     
+    # Id da conversa: o agente lembra o último resultado para responder refinamentos
+    if "sessao_id" not in st.session_state:
+        st.session_state.sessao_id = str(uuid.uuid4())
+    sessao_id = st.session_state.sessao_id
+
     if "messages" not in st.session_state:
         st.session_state.messages = [
             {
@@ -96,18 +154,20 @@ def main():
         with st.chat_message("user"):
             st.markdown(prompt)
         with st.chat_message("assistant"):
-            with st.spinner("Analisando sua solicitação..."):
-                try:
-                    response = agent.chat(prompt)
-                    
+            try:
+                if hasattr(agent, "chat_stream"):
+                    response = render_stream(agent.chat_stream(prompt, sessao_id))
+                else:
+                    with st.spinner("Analisando sua solicitação..."):
+                        response = agent.chat(prompt, sessao_id)
                     st.markdown(response)
-                    
-                    st.session_state.messages.append({"role": "assistant", "content": response})
-                    
-                except Exception as e:
-                    error_msg = f"Ocorreu um erro: {str(e)}"
-                    st.error(error_msg)
-                    st.session_state.messages.append({"role": "assistant", "content": error_msg})
+                
+                st.session_state.messages.append({"role": "assistant", "content": response})
+                
+            except Exception as e:
+                error_msg = f"Ocorreu um erro: {str(e)}"
+                st.error(error_msg)
+                st.session_state.messages.append({"role": "assistant", "content": error_msg})
 
 def demo_page():
     """Página com casos de demonstração"""
@@ -162,6 +222,9 @@ def main_app():
         main()
     elif page == "Demonstração":
         demo_page()
+    
+    # Depois da página, para incluir o turno que acabou de ser processado
+    render_debug_panel(initialize_agent(), st.session_state.get("sessao_id"))
 
 if __name__ == "__main__":
     main_app()
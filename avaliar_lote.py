@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reexecuta um arquivo JSONL de consultas no agente, em paralelo
+
+Cada linha da entrada é um objeto JSON com a consulta (campo "query" por
+padrão) e, opcionalmente, um "id"; linhas que são apenas uma string JSON
+também são aceitas. Sem id, o número da linha é usado. Os resultados são
+gravados em JSONL à medida que terminam, e `--retomar` pula os ids que já
+estão na saída sem erro, permitindo continuar uma execução interrompida e
+refazer as consultas que falharam.
+
+Exemplo:
+    python avaliar_lote.py consultas.jsonl resultados.jsonl --workers 8 --taxa 20 --retomar
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+class LimitadorTaxa:
+    """
+    Token bucket simples: no máximo `taxa` requisições por segundo, com
+    rajadas de até `rajada` requisições. Seguro entre threads.
+    """
+
+    def __init__(self, taxa: float, rajada: int = 1):
+        """
+        Args:
+            taxa (float): Requisições por segundo (0 ou None = sem limite)
+            rajada (int): Requisições que podem sair de uma vez
+        """
+        self.taxa = taxa
+        self.rajada = max(1, rajada)
+        self._fichas = float(self.rajada)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reservar(self) -> float:
+        """Consome uma ficha e devolve quanto tempo esperar por ela."""
+        with self._lock:
+            agora = time.monotonic()
+            self._fichas = min(self.rajada, self._fichas + (agora - self._ultimo) * self.taxa)
+            self._ultimo = agora
+            self._fichas -= 1
+            return 0.0 if self._fichas >= 0 else -self._fichas / self.taxa
+
+    def aguardar(self):
+        """Bloqueia até a próxima requisição poder sair."""
+        if self.taxa:
+            espera = self._reservar()
+            if espera:
+                time.sleep(espera)
+
+    async def aguardar_async(self):
+        """Versão para event loop de `aguardar`."""
+        if self.taxa:
+            espera = self._reservar()
+            if espera:
+                await asyncio.sleep(espera)
+
+
+def ler_consultas(caminho: str, campo: str):
+    """
+    Lê as consultas do arquivo JSONL, uma por linha.
+
+    Args:
+        caminho (str): Arquivo de entrada
+        campo (str): Campo com o texto da consulta
+
+    Yields:
+        tuple: (id, consulta)
+    """
+    with open(caminho, 'r', encoding='utf-8') as file:
+        for numero, linha in enumerate(file, start=1):
+            linha = linha.strip()
+            if not linha:
+                continue
+            try:
+                registro = json.loads(linha)
+            except json.JSONDecodeError as e:
+                print(f"Aviso: linha {numero} ignorada (JSON inválido: {e})", file=sys.stderr)
+                continue
+            if isinstance(registro, str):
+                yield str(numero), registro
+            elif isinstance(registro, dict) and isinstance(registro.get(campo), str):
+                yield str(registro.get("id", numero)), registro[campo]
+            else:
+                print(f"Aviso: linha {numero} ignorada (sem o campo '{campo}')", file=sys.stderr)
+
+
+def ids_concluidos(caminho: str) -> set:
+    """
+    Ids já gravados com sucesso em uma saída anterior.
+
+    Consultas com "erro" (qualquer valor além de null, mesmo vazio) não
+    contam e são refeitas (a linha nova fica depois da antiga). Uma última
+    linha truncada (execução interrompida no meio da escrita) é ignorada, e a
+    consulta correspondente também é refeita.
+    """
+    concluidos = set()
+    if not os.path.exists(caminho):
+        return concluidos
+    with open(caminho, 'r', encoding='utf-8') as file:
+        for linha in file:
+            try:
+                registro = json.loads(linha)
+                if registro.get("erro") is None:
+                    concluidos.add(str(registro["id"]))
+            except (json.JSONDecodeError, KeyError, TypeError, AttributeError):
+                continue
+    return concluidos
+
+
+def montar_registro(id_consulta: str, consulta: str, turno: dict) -> dict:
+    """Linha de saída a partir do turno devolvido por chat_detalhado."""
+    resultado = turno.get("function_result") or {}
+    trace = turno.get("trace") or {}
+    return {
+        "id": id_consulta,
+        "query": consulta,
+        "resposta": turno.get("resposta"),
+        "action": turno.get("action"),
+        "search_params": turno.get("search_params"),
+        "relaxado": turno.get("relaxado"),
+        "origem_decisao": turno.get("origem_decisao"),
+        "count": resultado.get("count"),
+        "tempos": turno.get("tempos"),
+        "tokens": trace.get("tokens"),
+        "cache_decisao": trace.get("cache_decisao"),
+        "erro": turno.get("erro"),
+        "etapa_erro": trace.get("etapa_erro"),
+    }
+
+
+def descartar_linha_incompleta(caminho: str):
+    """Corta uma última linha sem quebra de linha, deixada por uma escrita interrompida."""
+    if not os.path.exists(caminho):
+        return
+    with open(caminho, 'rb+') as file:
+        conteudo = file.read()
+        if conteudo and not conteudo.endswith(b'\n'):
+            file.truncate(conteudo.rfind(b'\n') + 1)
+
+
+class SaidaJSONL:
+    """Grava registros em JSONL, uma linha por vez e com flush imediato."""
+
+    def __init__(self, caminho: str, anexar: bool):
+        if anexar:
+            descartar_linha_incompleta(caminho)
+        self._file = open(caminho, 'a' if anexar else 'w', encoding='utf-8')
+        self._lock = threading.Lock()
+        self.gravados = 0
+        self.erros = 0
+        self.latencias_ms = []
+
+    def gravar(self, registro: dict):
+        linha = json.dumps(registro, ensure_ascii=False)
+        with self._lock:
+            self._file.write(linha + '\n')
+            self._file.flush()
+            self.gravados += 1
+            if registro.get("erro") is not None:
+                self.erros += 1
+            self.latencias_ms.append((registro.get("tempos") or {}).get("total_ms", 0.0))
+
+    def percentis(self) -> dict:
+        """p50/p95/p99 da latência total das consultas gravadas, em milissegundos."""
+        with self._lock:
+            latencias = sorted(self.latencias_ms)
+        if not latencias:
+            return {}
+        return {f"p{p}": latencias[min(len(latencias) - 1, int(len(latencias) * p / 100))] for p in (50, 95, 99)}
+
+    def fechar(self):
+        self._file.close()
+
+
+def executar_threads(consultas, saida: SaidaJSONL, limitador: LimitadorTaxa, workers: int):
+    """
+    Processa as consultas em um pool de threads com o agente síncrono.
+
+    No máximo 2 × workers consultas ficam pendentes, então arquivos grandes não
+    são carregados inteiros em memória.
+    """
+    from agent.agent_executor import MealRecommendationAgent
+
+    agente = MealRecommendationAgent()
+
+    def processar(id_consulta, consulta):
+        limitador.aguardar()
+        saida.gravar(montar_registro(id_consulta, consulta, agente.chat_detalhado(consulta)))
+
+    pendentes = set()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for id_consulta, consulta in consultas:
+            if len(pendentes) >= workers * 2:
+                _, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+            pendentes.add(executor.submit(processar, id_consulta, consulta))
+        wait(pendentes)
+
+
+async def executar_async(consultas, saida: SaidaJSONL, limitador: LimitadorTaxa, workers: int):
+    """
+    Processa as consultas com o agente assíncrono e `workers` tarefas
+    consumindo uma fila limitada.
+    """
+    from agent.agente_async import AsyncMealRecommendationAgent
+
+    agente = AsyncMealRecommendationAgent(concorrencia=workers)
+    fila = asyncio.Queue(maxsize=workers * 2)
+
+    async def consumidor():
+        while True:
+            item = await fila.get()
+            if item is None:
+                return
+            id_consulta, consulta = item
+            await limitador.aguardar_async()
+            turno = await agente.achat_detalhado(consulta)
+            saida.gravar(montar_registro(id_consulta, consulta, turno))
+
+    tarefas = [asyncio.create_task(consumidor()) for _ in range(workers)]
+    for item in consultas:
+        await fila.put(item)
+    for _ in tarefas:
+        await fila.put(None)
+    await asyncio.gather(*tarefas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reexecuta um arquivo JSONL de consultas no agente de refeições")
+    parser.add_argument("entrada", help="Arquivo JSONL com as consultas")
+    parser.add_argument("saida", help="Arquivo JSONL de resultados")
+    parser.add_argument("--workers", type=int, default=8, help="Consultas simultâneas (padrão: 8)")
+    parser.add_argument("--modo", choices=("thread", "async"), default="thread",
+                        help="Pool de threads com o agente síncrono ou event loop com o agente assíncrono")
+    parser.add_argument("--taxa", type=float, default=0,
+                        help="Máximo de consultas iniciadas por segundo (padrão: sem limite)")
+    parser.add_argument("--campo", default="query", help="Campo com o texto da consulta (padrão: query)")
+    parser.add_argument("--retomar", action="store_true",
+                        help="Mantém a saída existente e pula os ids que já foram concluídos sem erro")
+    args = parser.parse_args(argv)
+
+    concluidos = ids_concluidos(args.saida) if args.retomar else set()
+    if concluidos:
+        print(f"Retomando: {len(concluidos)} consultas já concluídas serão puladas", file=sys.stderr)
+    consultas = ((id_consulta, consulta) for id_consulta, consulta in ler_consultas(args.entrada, args.campo)
+                 if id_consulta not in concluidos)
+
+    workers = max(1, args.workers)
+    limitador = LimitadorTaxa(args.taxa, rajada=workers)
+    saida = SaidaJSONL(args.saida, anexar=args.retomar)
+    inicio = time.perf_counter()
+    try:
+        if args.modo == "async":
+            asyncio.run(executar_async(consultas, saida, limitador, workers))
+        else:
+            executar_threads(consultas, saida, limitador, workers)
+    except KeyboardInterrupt:
+        print("\nInterrompido; use --retomar para continuar de onde parou", file=sys.stderr)
+        return 130
+    finally:
+        saida.fechar()
+        duracao = time.perf_counter() - inicio
+        vazao = saida.gravados / duracao if duracao else 0.0
+        print(f"{saida.gravados} consultas em {duracao:.1f}s ({vazao:.1f}/s, {saida.erros} com erro)", file=sys.stderr)
+        percentis = saida.percentis()
+        if percentis:
+            print("Latência (ms): " + ", ".join(f"{nome}={valor:.1f}" for nome, valor in percentis.items()),
+                  file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
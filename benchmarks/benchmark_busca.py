@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark do caminho de busca sobre catálogos sintéticos
+
+Para cada tamanho de catálogo e cada motor (índice e colunar), um processo
+separado mede:
+    - carga: leitura do arquivo (ler_catalogo)
+    - motor: construção do motor de busca
+    - agregados: construção dos agregados de preço
+    - extrai_tags: extração das tags do arquivo
+    - memória: pico de RSS do processo e quanto a carga acrescentou a ele
+    - consultas: latência (p50, p95, p99) de search_catalog por formato de
+      filtro — só tags, só orçamento, ingredientes, ingredientes pouco
+      seletivos (verificados item a item), combinados, resultado
+      vazio e vazio com itens aproximados —, dos agregados por tag e de
+      buscas respondidas pelo cache de resultados (cache_acerto); os demais
+      formatos medem o motor, com o cache desligado
+
+Os catálogos são gerados por gerar_catalogo.py (mesma semente, mesmos
+pratos) e guardados em benchmarks/dados. Com --baseline, cada métrica é
+comparada com a gravada: piorar além da tolerância (e de uma folga absoluta,
+para números muito pequenos) é uma regressão, listada no fim, e o processo
+termina com código 1. --gravar-baseline grava as medições atuais.
+
+Para tolerar ruído, os tempos de carga e construção são o menor de
+--rodadas execuções, e a tolerância padrão só acusa o que ficou duas vezes
+mais lento: em máquinas compartilhadas, latências abaixo de 1 ms variam 50%
+entre execuções sem mudança no código. As medições dependem da máquina:
+grave a baseline no mesmo tipo de máquina em que ela será comparada.
+
+Exemplos:
+    python benchmarks/benchmark_busca.py
+    python benchmarks/benchmark_busca.py --tamanhos 1000 10000 100000 1000000 --motores colunar
+    python benchmarks/benchmark_busca.py --gravar-baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.dirname(DIRETORIO)
+sys.path.insert(0, RAIZ)
+
+from gerar_catalogo import COZINHAS, escrever_catalogo  # noqa: E402
+
+BASELINE_PADRAO = os.path.join(DIRETORIO, "baseline.json")
+DADOS_PADRAO = os.path.join(DIRETORIO, "dados")
+
+# Consultas de cada formato de filtro, com o vocabulário de gerar_catalogo
+CONSULTAS = {
+    "tags": [
+        {"incluir_tags": ["vegano"]},
+        {"incluir_tags": ["sem lactose", "sem gluten"]},
+        {"incluir_tags": ["picante"], "excluir_tags": ["vegano"]},
+        {"incluir_tags": [COZINHAS[3], "coleção 7"]},
+    ],
+    "orcamento": [{"budget": 15}, {"budget": 30}, {"budget": 45}, {"budget": 90}],
+    "ingredientes": [
+        {"ingredientes_obrigatorios": ["frango", "arroz", "brócolis"]},
+        {"ingredientes_obrigatorios": ["frango", "carne", "peixe", "ovo", "tofu", "camarão"]},
+        {"ingredientes_obrigatorios": ["quinoa", "tahine"], "modo_ingredientes": "todos"},
+        {"ingredientes_obrigatorios": ["legumes", "brocolis", "cenoura"]},
+        {"ingredientes_obrigatorios": ["abóbora"]},
+    ],
+    # Fragmentos comuns, combinação rara: o índice não restringe os candidatos e
+    # cada item é verificado, então a busca percorre a máscara inteira
+    "ingredientes_pouco_seletivos": [
+        {"ingredientes_obrigatorios": ["com frango"]},
+        {"ingredientes_obrigatorios": ["arroz de carne"]},
+        {"ingredientes_obrigatorios": ["frango", "molho"], "modo_ingredientes": "todos"},
+    ],
+    "combinado": [
+        {"budget": 45, "incluir_tags": ["sem gluten"], "ingredientes_obrigatorios": ["frango", "peixe"]},
+        {"budget": 35, "incluir_tags": ["vegano", "picante"], "excluir_tags": ["sem açucar"]},
+        {"budget": 60, "excluir_tags": ["picante"], "ingredientes_obrigatorios": ["salmão"]},
+    ],
+    "vazio": [
+        {"budget": 1},
+        {"incluir_tags": ["vegano"], "ingredientes_obrigatorios": ["camarão"], "modo_ingredientes": "todos"},
+        {"ingredientes_obrigatorios": ["xyzzy"]},
+        {"incluir_tags": ["vegano", "picante", "kids"], "budget": 9},
+    ],
+}
+# Os mesmos filtros de "vazio", pelo caminho que ranqueia os mais próximos
+CONSULTAS_APROXIMADAS = "vazio_aproximados"
+
+TAGS_AGREGADOS = [["vegano"], ["sem lactose", "sem gluten"], ["picante", COZINHAS[0]], ["coleção 3", "fit"]]
+
+# Folga absoluta por tipo de métrica: abaixo dela uma diferença é ruído
+FOLGAS = {"_ms": 0.1, "_mb": 4.0}
+METRICAS_COMPARADAS = ("carga_ms", "motor_ms", "agregados_ms", "extrai_tags_ms",
+                       "memoria_catalogo_mb", "p50_ms", "p95_ms")
+
+
+def _rss_maximo_mb() -> float:
+    # ru_maxrss vem em KiB no Linux e em bytes no macOS
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maximo / (1024 * 1024) if sys.platform == "darwin" else maximo / 1024
+
+
+def _percentis(amostras: list) -> dict:
+    ordenadas = sorted(amostras)
+    def percentil(p):
+        return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p / 100))] * 1000
+    return {
+        "p50_ms": round(percentil(50), 4),
+        "p95_ms": round(percentil(95), 4),
+        "p99_ms": round(percentil(99), 4),
+        "media_ms": round(sum(ordenadas) / len(ordenadas) * 1000, 4),
+        "amostras": len(ordenadas),
+    }
+
+
+def _menor_tempo(funcao, rodadas: int) -> tuple:
+    """(resultado da última execução, menor tempo em ms entre as rodadas)"""
+    melhor = float("inf")
+    for _ in range(rodadas):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return resultado, round(melhor * 1000, 2)
+
+
+def _medir(funcoes: list, repeticoes: int, tempo_max: float) -> dict:
+    """Chama as funções em rodízio até `repeticoes` rodadas ou `tempo_max` segundos."""
+    for funcao in funcoes:
+        funcao()  # aquecimento (caches de fragmentos, combinações de tags)
+    amostras = []
+    limite = time.perf_counter() + tempo_max
+    for _ in range(repeticoes):
+        for funcao in funcoes:
+            inicio = time.perf_counter()
+            funcao()
+            amostras.append(time.perf_counter() - inicio)
+        if time.perf_counter() > limite:
+            break
+    return _percentis(amostras)
+
+
+def executar_caso(caminho: str, motor: str, repeticoes: int, tempo_max: float, rodadas: int = 1) -> dict:
+    """
+    Mede um catálogo com um motor, no processo atual.
+
+    Args:
+        caminho (str): Catálogo gerado
+        motor (str): "indice" ou "colunar"
+        repeticoes (int): Rodadas máximas por formato de consulta
+        tempo_max (float): Segundos máximos por formato de consulta
+        rodadas (int): Execuções de carga e construção (vale a mais rápida)
+
+    Returns:
+        dict: Tempos de carga e construção, memória e latências por formato
+    """
+    os.environ["CATALOGO_BACKEND"] = motor
+    # O repositório global carrega o catálogo pequeno; o medido é montado abaixo
+    os.environ["CATALOGO_PATH"] = os.path.join(RAIZ, "catalogo.json")
+    from agent.tools import procura_catalogo
+    from agent.tools.agregados_catalogo import CatalogAggregates
+    from agent.tools.cache_resultados import ResultCache
+    from agent.tools.carrega_catalogo import ler_catalogo
+    from agent.tools.extrai_filtro import extrai_tags
+    from agent.tools.repositorio_catalogo import CatalogSnapshot
+
+    resultado = {}
+    rss_inicial = _rss_maximo_mb()
+
+    # A primeira rodada define o pico de memória: as seguintes só substituem objetos iguais
+    (itens, colunas), resultado["carga_ms"] = _menor_tempo(lambda: ler_catalogo(caminho), 1)
+    motor_busca, resultado["motor_ms"] = _menor_tempo(
+        lambda: procura_catalogo._criar_motor(itens, colunas=colunas), 1)
+    agregados, resultado["agregados_ms"] = _menor_tempo(lambda: CatalogAggregates(itens, colunas), 1)
+    resultado["memoria_pico_mb"] = round(_rss_maximo_mb(), 1)
+    resultado["memoria_catalogo_mb"] = round(_rss_maximo_mb() - rss_inicial, 1)
+
+    for _ in range(rodadas - 1):
+        for chave, funcao in (("carga_ms", lambda: ler_catalogo(caminho)),
+                              ("motor_ms", lambda: procura_catalogo._criar_motor(itens, colunas=colunas)),
+                              ("agregados_ms", lambda: CatalogAggregates(itens, colunas))):
+            resultado[chave] = min(resultado[chave], _menor_tempo(funcao, 1)[1])
+    _, resultado["extrai_tags_ms"] = _menor_tempo(lambda: extrai_tags(caminho), rodadas)
+
+    tags = frozenset(tag for tags_item in colunas["tags"] for tag in tags_item)
+    snapshot = CatalogSnapshot(1, itens, motor_busca, tags, agregados=agregados, resultados=ResultCache(0))
+    com_cache = CatalogSnapshot(1, itens, motor_busca, tags, agregados=agregados, resultados=ResultCache())
+    resultado["itens"] = len(itens)
+    resultado["tags"] = len(tags)
+
+    consultas = {}
+    for formato, filtros in CONSULTAS.items():
+        consultas[formato] = _medir(
+            [lambda f=f: procura_catalogo.search_catalog(f, snapshot) for f in filtros], repeticoes, tempo_max
+        )
+    consultas[CONSULTAS_APROXIMADAS] = _medir(
+        [lambda f=f: procura_catalogo.search_catalog(f, snapshot, aproximados=True) for f in CONSULTAS["vazio"]],
+        repeticoes, tempo_max
+    )
+    consultas["cache_acerto"] = _medir(
+        [lambda f=f: procura_catalogo.search_catalog(f, com_cache) for filtros in CONSULTAS.values() for f in filtros],
+        repeticoes, tempo_max
+    )
+    consultas["agregados_tags"] = _medir(
+        [lambda t=t: procura_catalogo.get_price_range_by_tags(t, snapshot) for t in TAGS_AGREGADOS],
+        repeticoes, tempo_max
+    )
+    resultado["consultas"] = consultas
+    return resultado
+
+
+def _catalogo(diretorio: str, tamanho: int, semente: int) -> str:
+    """Caminho do catálogo sintético, gerado na primeira vez."""
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = os.path.join(diretorio, f"catalogo_{tamanho}_{semente}.ndjson")
+    if not os.path.exists(caminho):
+        # A extensão decide o formato: o temporário também termina em .ndjson
+        temporario = caminho[:-len(".ndjson")] + ".tmp.ndjson"
+        escrever_catalogo(temporario, tamanho, semente)
+        os.replace(temporario, caminho)
+    return caminho
+
+
+def _metricas_planas(resultados: dict) -> dict:
+    """{"10000/indice/tags/p95_ms": 0.12, "10000/indice/carga_ms": 85.0, ...}"""
+    planas = {}
+    for caso, resultado in resultados.items():
+        for chave, valor in resultado.items():
+            if chave in METRICAS_COMPARADAS:
+                planas[f"{caso}/{chave}"] = valor
+        for formato, latencias in resultado.get("consultas", {}).items():
+            for chave, valor in latencias.items():
+                if chave in METRICAS_COMPARADAS:
+                    planas[f"{caso}/{formato}/{chave}"] = valor
+    return planas
+
+
+def comparar(atual: dict, baseline: dict, tolerancia: float) -> list:
+    """
+    Compara as métricas com a baseline.
+
+    Args:
+        atual (dict): Métricas planas desta execução
+        baseline (dict): Métricas planas gravadas
+        tolerancia (float): Piora relativa aceita (1.0 = duas vezes mais lento)
+
+    Returns:
+        list: (métrica, baseline, atual) de cada regressão
+    """
+    regressoes = []
+    for chave, valor in sorted(atual.items()):
+        referencia = baseline.get(chave)
+        if referencia is None:
+            continue
+        folga = next((f for sufixo, f in FOLGAS.items() if chave.endswith(sufixo)), 0.0)
+        if valor > referencia * (1 + tolerancia) and valor - referencia > folga:
+            regressoes.append((chave, referencia, valor))
+    return regressoes
+
+
+def _ambiente() -> dict:
+    return {"python": platform.python_version(), "plataforma": platform.platform(),
+            "processador": platform.processor() or platform.machine(), "cpus": os.cpu_count()}
+
+
+def _imprimir(caso: str, resultado: dict):
+    print(f"\n== {caso}: {resultado['itens']} pratos, {resultado['tags']} tags ==")
+    print(f"carga {resultado['carga_ms']} ms | motor {resultado['motor_ms']} ms | "
+          f"agregados {resultado['agregados_ms']} ms | extrai_tags {resultado['extrai_tags_ms']} ms | "
+          f"memória +{resultado['memoria_catalogo_mb']} MB (pico {resultado['memoria_pico_mb']} MB)")
+    print(f"{'consulta':<20}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'amostras':>10}")
+    for formato, latencias in resultado["consultas"].items():
+        print(f"{formato:<20}{latencias['p50_ms']:>10.3f}{latencias['p95_ms']:>10.3f}"
+              f"{latencias['p99_ms']:>10.3f}{latencias['amostras']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do caminho de busca sobre catálogos sintéticos")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Tamanhos de catálogo (10³ a 10⁷)")
+    parser.add_argument("--motores", nargs="+", default=["indice", "colunar"], choices=["indice", "colunar"])
+    parser.add_argument("--semente", type=int, default=42, help="Semente dos catálogos gerados")
+    parser.add_argument("--repeticoes", type=int, default=300, help="Rodadas máximas por formato de consulta")
+    parser.add_argument("--tempo-max", type=float, default=3.0, help="Segundos máximos por formato de consulta")
+    parser.add_argument("--rodadas", type=int, default=3, help="Execuções de carga e construção (vale a mais rápida)")
+    parser.add_argument("--dados", default=DADOS_PADRAO, help="Diretório dos catálogos gerados")
+    parser.add_argument("--baseline", default=BASELINE_PADRAO, help="Arquivo de baseline")
+    parser.add_argument("--gravar-baseline", action="store_true", help="Grava as medições como nova baseline")
+    parser.add_argument("--tolerancia", type=float, default=1.0, help="Piora relativa aceita antes de falhar")
+    parser.add_argument("--saida", help="Grava os resultados completos em JSON")
+    parser.add_argument("--caso", nargs=2, metavar=("CATALOGO", "MOTOR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.caso:
+        # Processo filho: um caso por processo, para o pico de memória ser só dele
+        print(json.dumps(executar_caso(args.caso[0], args.caso[1], args.repeticoes, args.tempo_max, args.rodadas)))
+        return
+
+    resultados = {}
+    for tamanho in args.tamanhos:
+        caminho = _catalogo(args.dados, tamanho, args.semente)
+        for motor in args.motores:
+            caso = f"{tamanho}/{motor}"
+            processo = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--caso", caminho, motor,
+                 "--repeticoes", str(args.repeticoes), "--tempo-max", str(args.tempo_max),
+                 "--rodadas", str(args.rodadas)],
+                capture_output=True, text=True, cwd=RAIZ
+            )
+            if processo.returncode != 0:
+                print(f"\n== {caso}: falhou ==\n{processo.stderr.strip()}")
+                sys.exit(2)
+            resultados[caso] = json.loads(processo.stdout.strip().splitlines()[-1])
+            _imprimir(caso, resultados[caso])
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as file:
+            json.dump({"ambiente": _ambiente(), "resultados": resultados}, file, ensure_ascii=False, indent=2)
+
+    metricas = _metricas_planas(resultados)
+    if args.gravar_baseline:
+        gravadas = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as file:
+                gravadas = json.load(file).get("metricas", {})
+        gravadas.update(metricas)
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump({"ambiente": _ambiente(), "semente": args.semente, "metricas": gravadas},
+                      file, ensure_ascii=False, indent=2, sort_keys=True)
+            file.write("\n")
+        print(f"\nBaseline gravada em {args.baseline} ({len(metricas)} métricas).")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nSem baseline em {args.baseline}; use --gravar-baseline para criar uma.")
+        return
+    with open(args.baseline, encoding="utf-8") as file:
+        baseline = json.load(file)
+    if baseline.get("ambiente", {}).get("plataforma") != _ambiente()["plataforma"]:
+        print("\nAviso: a baseline foi gravada em outro ambiente; as comparações podem não valer.")
+    if baseline.get("semente") != args.semente:
+        print("\nAviso: a baseline foi gravada com outra semente; as comparações podem não valer.")
+
+    regressoes = comparar(metricas, baseline.get("metricas", {}), args.tolerancia)
+    comparadas = len(set(metricas) & set(baseline.get("metricas", {})))
+    if regressoes:
+        print(f"\nREGRESSÕES ({len(regressoes)} de {comparadas} métricas, tolerância {args.tolerancia:.0%}):")
+        for chave, referencia, valor in regressoes:
+            variacao = f"{valor / referencia - 1:+.0%}" if referencia else "nova"
+            print(f"  {chave}: {referencia} → {valor} ({variacao})")
+        sys.exit(1)
+    print(f"\nSem regressões em {comparadas} métricas (tolerância {args.tolerancia:.0%}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gera catálogos sintéticos de pratos, reproduzíveis pela semente
+
+Os pratos combinam formas de preparo, proteínas, acompanhamentos e molhos
+de vocabulários fixos, então nomes e descrições têm as palavras que os
+usuários buscam ("frango", "arroz", "brócolis"). As tags seguem os
+ingredientes (um prato com queijo nunca é "sem lactose", um molho de
+pimenta é "picante") e cobrem também cozinhas, ocasiões e uma cauda longa
+de coleções com frequência decrescente (Zipf), para simular vocabulários de
+tags grandes. Os preços partem do custo da proteína e da forma, com
+dispersão log-normal e terminações comuns (",90", ",50").
+
+Arquivos .ndjson/.jsonl são escritos em streaming, um prato por linha, o
+que permite gerar de 10³ a 10⁷ pratos sem montar a lista em memória.
+
+Exemplo:
+    python benchmarks/gerar_catalogo.py 1000000 /tmp/catalogo_1m.ndjson --semente 7
+"""
+
+import argparse
+import json
+import math
+import random
+
+# (forma, multiplicador de preço, tem glúten, tem lactose)
+FORMAS = [
+    ("Bowl", 1.0, False, False), ("Salada", 0.85, False, False), ("Risoto", 1.15, False, True),
+    ("Wrap", 0.9, True, False), ("Marmita", 0.95, False, False), ("Espaguete", 1.0, True, False),
+    ("Curry", 1.1, False, False), ("Moqueca", 1.25, False, False), ("Strogonoff", 1.05, False, True),
+    ("Poke", 1.2, False, False), ("Yakissoba", 1.0, True, False), ("Tacos", 0.9, True, False),
+    ("Lasanha", 1.1, True, True), ("Escondidinho", 1.0, False, True), ("Caldo", 0.75, False, False),
+    ("Espetinho", 0.9, False, False), ("Quiche", 0.95, True, True), ("Panqueca", 0.85, True, True),
+]
+
+# (proteína, preço base, vegana)
+PROTEINAS = [
+    ("frango", 36.0, False), ("carne", 46.0, False), ("peixe", 50.0, False), ("camarão", 62.0, False),
+    ("salmão", 68.0, False), ("ovo", 28.0, False), ("porco", 42.0, False), ("tofu", 34.0, True),
+    ("grão-de-bico", 30.0, True), ("lentilha", 28.0, True), ("cogumelos", 38.0, True),
+    ("feijão branco", 27.0, True), ("proteína de soja", 30.0, True), ("atum", 44.0, False),
+]
+
+ACOMPANHAMENTOS = [
+    "arroz integral", "arroz branco", "quinoa", "batata-doce", "legumes no vapor", "brócolis",
+    "purê de abóbora", "feijão preto", "salada verde", "farofa", "cuscuz marroquino", "mandioca",
+    "cenoura e abobrinha", "espinafre refogado", "couve", "batata rústica", "macarrão de arroz",
+]
+
+# (molho, picante, tem lactose, tem açúcar)
+MOLHOS = [
+    ("molho de tomate", False, False, False), ("pimenta dedo-de-moça", True, False, False),
+    ("molho de gengibre", False, False, False), ("molho chipotle", True, False, False),
+    ("curry vermelho", True, False, False), ("pesto de manjericão", False, True, False),
+    ("tahine", False, False, False), ("molho de iogurte", False, True, False),
+    ("limão e ervas", False, False, False), ("mostarda e mel", False, False, True),
+    ("molho teriyaki", False, False, True), ("leite de coco", False, False, False),
+    ("molho de queijo", False, True, False), ("sriracha", True, False, True),
+    ("chimichurri", False, False, False), ("molho barbecue", False, False, True),
+]
+
+# (sobremesa, preço base, tem glúten, tem lactose, vegana)
+SOBREMESAS = [
+    ("Mousse de chocolate", 22.0, False, True, False), ("Bowl de açaí", 26.0, False, False, True),
+    ("Salada de frutas", 18.0, False, False, True), ("Torta de limão", 24.0, True, True, False),
+    ("Pudim de coco", 20.0, False, True, False), ("Panqueca de banana", 21.0, True, False, True),
+    ("Brownie de cacau", 19.0, True, True, False), ("Sorbet de manga", 17.0, False, False, True),
+]
+
+COZINHAS = [
+    "brasileira", "italiana", "japonesa", "mexicana", "indiana", "tailandesa", "árabe", "nordestina",
+    "mineira", "peruana", "chinesa", "coreana", "grega", "portuguesa", "vietnamita",
+]
+
+OCASIOES = ["fit", "low carb", "proteico", "almoço executivo", "comfort food", "kids", "para compartilhar"]
+
+FINAIS = [
+    "Finalizado com ervas frescas.", "Acompanha limão.", "Servido bem quente.", "Porção individual.",
+    "Com castanhas tostadas.", "Finalizado com gergelim.", "Receita da casa.", "Com toque de azeite.",
+]
+
+PROPORCAO_SOBREMESAS = 0.08
+
+
+def _preco(base: float, rng: random.Random) -> float:
+    """Preço com dispersão log-normal e terminação comum de cardápio."""
+    valor = max(8.0, base * rng.lognormvariate(0.0, 0.22))
+    terminacao = rng.random()
+    if terminacao < 0.45:
+        return round(math.floor(valor) + 0.9, 2)
+    if terminacao < 0.7:
+        return round(valor * 2) / 2
+    return float(round(valor))
+
+
+def _zipf(rng: random.Random, pesos_acumulados: list) -> int:
+    """Índice sorteado com peso 1/(k+1), pela soma acumulada dos pesos."""
+    alvo = rng.random() * pesos_acumulados[-1]
+    inicio, fim = 0, len(pesos_acumulados) - 1
+    while inicio < fim:
+        meio = (inicio + fim) // 2
+        if pesos_acumulados[meio] < alvo:
+            inicio = meio + 1
+        else:
+            fim = meio
+    return inicio
+
+
+def gerar_itens(quantidade: int, semente: int = 42, cauda_tags: int = 50):
+    """
+    Gera pratos sintéticos, sempre os mesmos para a mesma semente.
+
+    Args:
+        quantidade (int): Número de pratos
+        semente (int): Semente do gerador
+        cauda_tags (int): Tamanho da cauda longa de tags de coleção ("coleção 17"),
+            sorteadas com frequência Zipf; 0 desativa
+
+    Yields:
+        dict: Prato no formato do catálogo (nome, preco, descricao, tags)
+    """
+    rng = random.Random(semente)
+    acumulados = []
+    for k in range(cauda_tags):
+        acumulados.append((acumulados[-1] if acumulados else 0.0) + 1.0 / (k + 1))
+
+    for _ in range(quantidade):
+        if rng.random() < PROPORCAO_SOBREMESAS:
+            nome, base, gluten, lactose, vegano = rng.choice(SOBREMESAS)
+            acucar = rng.random() < 0.7
+            if not acucar:
+                nome += " sem açúcar"
+            descricao = f"{nome}, preparado na hora. {rng.choice(FINAIS)}"
+            picante = False
+        else:
+            forma, multiplicador, gluten, lactose_forma = rng.choice(FORMAS)
+            proteina, base, vegano = rng.choice(PROTEINAS)
+            acompanhamento = rng.choice(ACOMPANHAMENTOS)
+            molho, picante, lactose_molho, acucar = rng.choice(MOLHOS)
+            lactose = lactose_forma or lactose_molho
+            vegano = vegano and not lactose
+            base *= multiplicador
+            nome = f"{forma} de {proteina} com {acompanhamento if rng.random() < 0.5 else molho}"
+            descricao = f"{forma} de {proteina} com {acompanhamento} e {molho}. {rng.choice(FINAIS)}"
+
+        tags = []
+        if vegano and rng.random() < 0.9:
+            tags.append("vegano")
+        if not lactose and rng.random() < 0.7:
+            tags.append("sem lactose")
+        if not gluten and rng.random() < 0.6:
+            tags.append("sem gluten")
+        if picante:
+            tags.append("picante")
+        if not acucar and rng.random() < 0.35:
+            tags.append("sem açucar")
+        if rng.random() < 0.6:
+            tags.append(rng.choice(COZINHAS))
+        if rng.random() < 0.3:
+            tags.append(rng.choice(OCASIOES))
+        if cauda_tags and rng.random() < 0.3:
+            tags.append(f"coleção {_zipf(rng, acumulados) + 1}")
+
+        yield {"nome": nome, "preco": _preco(base, rng), "descricao": descricao, "tags": tags}
+
+
+def escrever_catalogo(caminho: str, quantidade: int, semente: int = 42, cauda_tags: int = 50) -> str:
+    """
+    Grava um catálogo sintético em JSON (array) ou NDJSON (pela extensão).
+
+    Args:
+        caminho (str): Arquivo de saída (.json, .ndjson ou .jsonl)
+        quantidade (int): Número de pratos
+        semente (int): Semente do gerador
+        cauda_tags (int): Tamanho da cauda longa de tags (veja gerar_itens)
+
+    Returns:
+        str: O caminho gravado
+    """
+    ndjson = caminho.lower().endswith(('.ndjson', '.jsonl'))
+    with open(caminho, 'w', encoding='utf-8') as file:
+        if not ndjson:
+            file.write("[\n")
+        for indice, item in enumerate(gerar_itens(quantidade, semente, cauda_tags)):
+            linha = json.dumps(item, ensure_ascii=False)
+            if ndjson:
+                file.write(linha + "\n")
+            else:
+                file.write(("" if indice == 0 else ",\n") + linha)
+        if not ndjson:
+            file.write("\n]\n")
+    return caminho
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera um catálogo sintético de pratos")
+    parser.add_argument("quantidade", type=int, help="Número de pratos (ex.: 1000, 1000000)")
+    parser.add_argument("saida", help="Arquivo de saída (.json, .ndjson ou .jsonl)")
+    parser.add_argument("--semente", type=int, default=42, help="Semente do gerador")
+    parser.add_argument("--cauda-tags", type=int, default=50, help="Tags de coleção na cauda longa (0 desativa)")
+    args = parser.parse_args()
+    escrever_catalogo(args.saida, args.quantidade, args.semente, args.cauda_tags)
+    print(f"{args.quantidade} pratos gravados em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
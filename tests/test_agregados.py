@@ -0,0 +1,117 @@
+import random
+
+import pytest
+
+from agent.tools.agregados_catalogo import CatalogAggregates
+from agent.tools.carrega_catalogo import ItensCompactos, Prato, TabelaTags, extrair_colunas
+
+TAGS = ["vegano", "sem lactose", "picante", "kids", "sem gluten"]
+CONSULTAS = [(), ("vegano",), ("picante",), ("vegano", "sem lactose"), ("kids", "picante")]
+
+
+def item(nome: str, preco: float, tags=(), **extras) -> dict:
+    return {"nome": nome, "preco": preco, "descricao": "d", "tags": list(tags), **extras}
+
+
+def compactos(itens: list) -> ItensCompactos:
+    tabela = TabelaTags()
+    return ItensCompactos([Prato.de_dict(item, tabela) for item in itens])
+
+
+def estatisticas(agregados: CatalogAggregates) -> list:
+    return [agregados.estatisticas(tags) for tags in CONSULTAS]
+
+
+def atualizar(agregados: CatalogAggregates, itens) -> CatalogAggregates:
+    return agregados.atualizado(itens, extrair_colunas(itens))
+
+
+def test_campo_extra_alterado_troca_o_item():
+    itens = [item("a", 10.0, ["vegano"], rede="sul"), item("b", 20.0, ["vegano"], rede="sul")]
+    agregados = CatalogAggregates(itens)
+    novos = [dict(itens[0], rede="norte"), itens[1]]
+    atualizados = atualizar(agregados, novos)
+    assert atualizados.estatisticas(["vegano"])["cheapest"]["rede"] == "norte"
+    # A versão anterior continua como estava
+    assert agregados.estatisticas(["vegano"])["cheapest"]["rede"] == "sul"
+
+
+def test_campo_extra_alterado_em_itens_compactos():
+    itens = [item("a", 10.0, rede="sul", destaque=["almoço"]), item("b", 20.0)]
+    agregados = CatalogAggregates(compactos(itens))
+    atualizados = atualizar(agregados, compactos([dict(itens[0], destaque=["jantar"]), itens[1]]))
+    assert atualizados.estatisticas()["cheapest"]["destaque"] == ["jantar"]
+
+
+def test_empate_fica_com_o_primeiro_do_catalogo_novo():
+    itens = [item(f"p{numero}", 20.0 + numero, ["vegano"]) for numero in range(10)]
+    agregados = CatalogAggregates(itens)
+    # Um item novo, no meio do catálogo, empata com o mais barato e com o mais caro
+    novos = itens[:5] + [item("novo", 20.0, ["vegano"]), item("novo caro", 29.0, ["vegano"])] + itens[5:]
+    atualizados = atualizar(agregados, novos)
+    # Aplicada como diferença: os itens novos recebem os próximos ids
+    assert [atualizados.itens[id_item]["nome"] for id_item in (10, 11)] == ["novo", "novo caro"]
+    assert atualizados.estatisticas(["vegano"])["cheapest"]["nome"] == "p0"
+    assert atualizados.estatisticas(["vegano"])["most_expensive"]["nome"] == "novo caro"
+    # Sem o p0, o novo (antes dos demais de 20.0) passa a ser o mais barato
+    novos = [item("p0b", 20.0, ["vegano"])] + novos[1:]
+    assert atualizar(atualizados, novos).estatisticas(["vegano"])["cheapest"]["nome"] == "p0b"
+
+
+def test_versao_anterior_nao_muda():
+    itens = [item(f"p{numero}", float(numero % 7 + 10), TAGS[numero % 5:numero % 5 + 2]) for numero in range(40)]
+    agregados = CatalogAggregates(itens)
+    antes = estatisticas(agregados)
+    novos = [dict(item_atual, preco=5.0) if numero % 9 == 0 else item_atual for numero, item_atual in enumerate(itens)]
+    atualizados = atualizar(agregados, novos)
+    assert estatisticas(agregados) == antes
+    assert estatisticas(atualizados) == estatisticas(CatalogAggregates(novos))
+
+
+@pytest.mark.parametrize("compacto", [False, True], ids=["dicts", "compactos"])
+def test_diferenca_igual_a_recalcular(compacto):
+    rng = random.Random(5)
+
+    def sortear(numero: int) -> dict:
+        extras = {"rede": rng.choice(["sul", "norte"])} if rng.random() < 0.3 else {}
+        return item(f"p{numero % 50}", float(rng.choice([10, 12, 15, 20, 25])), rng.sample(TAGS, rng.randint(0, 3)),
+                    **extras)
+
+    def versao(itens: list):
+        return compactos(itens) if compacto else itens
+
+    for rodada in range(20):
+        itens = [sortear(numero) for numero in range(200)]
+        agregados = CatalogAggregates(versao(itens))
+        estatisticas(agregados)
+        for passo in range(10):
+            itens = [dict(item_atual) for item_atual in itens]
+            for _ in range(rng.randint(0, 8)):
+                posicao = rng.randrange(len(itens))
+                operacao = rng.random()
+                if operacao < 0.3:
+                    itens.insert(posicao, sortear(1000 + passo))
+                elif operacao < 0.5:
+                    del itens[posicao]
+                elif operacao < 0.75:
+                    itens[posicao]["rede"] = rng.choice(["sul", "norte", "leste"])
+                else:
+                    itens[posicao]["preco"] = float(rng.choice([10, 12, 15, 20, 25]))
+            agregados = atualizar(agregados, versao(itens))
+            assert estatisticas(agregados) == estatisticas(CatalogAggregates(versao(itens))), (rodada, passo)
+
+
+def test_adicionar_e_remover():
+    agregados = CatalogAggregates([item("a", 10.0, ["vegano"]), item("b", 30.0, ["picante"])])
+    id_item = agregados.adicionar(item("c", 5.0, ["vegano", "picante"]))
+    assert agregados.estatisticas(["vegano", "picante"])["cheapest"]["nome"] == "c"
+    agregados.remover(id_item)
+    assert agregados.estatisticas(["vegano", "picante"])["total_items"] == 0
+    assert agregados.estatisticas()["cheapest"]["nome"] == "a"
+
+
+def test_tag_repetida_conta_uma_vez():
+    agregados = CatalogAggregates([item("a", 10.0, ["vegano", "vegano"]), item("b", 30.0, ["vegano"])])
+    agregados.adicionar(item("c", 20.0, ["vegano", "vegano"]))
+    resumo = agregados.estatisticas(["vegano"])
+    assert resumo["total_items"] == 3 and resumo["avg_price"] == 20.0
@@ -0,0 +1,205 @@
+import random
+import threading
+
+import pytest
+
+from agent.tools import catalogo_particionado, procura_catalogo
+from agent.tools.carrega_catalogo import extrair_colunas
+from agent.tools.catalogo_colunar import ColumnarCatalog, np
+from agent.tools.catalogo_particionado import ShardedCatalog
+from agent.tools.indice_catalogo import CatalogIndex
+from agent.tools.indice_texto import MODO_TODOS, normalizar_texto
+
+TAGS = ["vegano", "sem lactose", "sem gluten", "picante", "sem açucar", "kids", "fit"]
+INGREDIENTES = ["frango", "Arroz integral", "brócolis", "tofu", "queijo", "grão-de-bico", "salmão"]
+REDES = ["norte", "sul", "leste"]
+
+
+def gerar_itens(quantidade: int, semente: int) -> list:
+    """Catálogo sintético com muitos empates de preço, acentos e o campo extra "rede"."""
+    rng = random.Random(semente)
+    itens = []
+    for numero in range(quantidade):
+        ingredientes = rng.sample(INGREDIENTES, rng.randint(1, 3))
+        itens.append({
+            "nome": f"Prato {numero} com {ingredientes[0]}",
+            "preco": float(rng.randint(10, 60)) + rng.choice([0.0, 0.5, 0.9]),
+            "descricao": "Feito com " + " e ".join(ingredientes[1:] or ["ervas"]) + ".",
+            "tags": rng.sample(TAGS, rng.randint(0, 3)),
+            "rede": rng.choice(REDES),
+        })
+    return itens
+
+
+def busca_linear(itens: list, filters: dict, limite: int = 10) -> list:
+    """A busca original de search_catalog: percorre o catálogo inteiro e ordena por preço."""
+    budget = filters.get("budget")
+    incluir = set(filters.get("incluir_tags") or [])
+    excluir = set(filters.get("excluir_tags") or [])
+    requisitos = [normalizar_texto(requisito) for requisito in filters.get("ingredientes_obrigatorios") or []]
+    combinar = all if filters.get("modo_ingredientes") == MODO_TODOS else any
+    redes = filters.get("redes")
+
+    resultados = []
+    for item in itens:
+        if budget is not None and item["preco"] > budget:
+            continue
+        if not incluir.issubset(item["tags"]) or excluir.intersection(item["tags"]):
+            continue
+        if requisitos:
+            texto = normalizar_texto(item["nome"] + " " + item["descricao"])
+            if not combinar(requisito in texto for requisito in requisitos):
+                continue
+        if redes is not None and item["rede"] not in redes:
+            continue
+        resultados.append(item)
+    resultados.sort(key=lambda item: item["preco"])
+    return resultados[:limite]
+
+
+def sortear_filtros(rng: random.Random) -> dict:
+    filtros = {}
+    if rng.random() < 0.6:
+        filtros["budget"] = rng.choice([9, 15, 20.5, 30, 42.9, 60])
+    if rng.random() < 0.5:
+        filtros["incluir_tags"] = rng.sample(TAGS, rng.randint(1, 2))
+    if rng.random() < 0.4:
+        filtros["excluir_tags"] = rng.sample(TAGS, 1)
+    if rng.random() < 0.5:
+        filtros["ingredientes_obrigatorios"] = rng.sample(INGREDIENTES + ["BROCOLIS", "inexistente"], rng.randint(1, 2))
+        filtros["modo_ingredientes"] = rng.choice(["qualquer", "todos"])
+    return filtros
+
+
+def _indice_particionado(itens, normalizados=None, colunas=None):
+    return ShardedCatalog(itens, normalizados, colunas, particoes=4, campo_rede="rede", processos=1)
+
+
+def _colunar_particionado(itens, normalizados=None, colunas=None):
+    return ShardedCatalog(itens, normalizados, colunas, particoes=4, campo_rede="rede", processos=1,
+                          criar_motor=ColumnarCatalog)
+
+
+MOTORES = [
+    pytest.param(CatalogIndex, id="indice"),
+    pytest.param(ColumnarCatalog, id="colunar",
+                 marks=pytest.mark.skipif(np is None, reason="numpy não instalado")),
+    pytest.param(_indice_particionado, id="particionado"),
+    pytest.param(_colunar_particionado, id="particionado-colunar",
+                 marks=pytest.mark.skipif(np is None, reason="numpy não instalado")),
+]
+
+
+@pytest.fixture(scope="module")
+def itens():
+    return gerar_itens(3000, semente=11)
+
+
+@pytest.mark.parametrize("criar_motor", MOTORES)
+def test_busca_igual_a_varredura_linear(criar_motor, itens):
+    motor = criar_motor(itens, None, extrair_colunas(itens))
+    rng = random.Random(5)
+    for _ in range(300):
+        filtros = sortear_filtros(rng)
+        limite = rng.choice([1, 10, 50])
+        assert motor.search(filtros, limite) == busca_linear(itens, filtros, limite), filtros
+
+
+@pytest.mark.parametrize("criar_motor", MOTORES)
+def test_itens_devolvidos_mantem_campos_extras(criar_motor, itens):
+    motor = criar_motor(itens, None, extrair_colunas(itens))
+    resultados = motor.search({"incluir_tags": ["vegano"]}, 20)
+    assert resultados
+    assert all("rede" in item for item in resultados)
+
+
+@pytest.mark.parametrize("criar_motor", MOTORES)
+def test_extremos_e_faixa_de_precos(criar_motor, itens):
+    motor = criar_motor(itens, None, extrair_colunas(itens))
+    menor = min(item["preco"] for item in itens)
+    maior = max(item["preco"] for item in itens)
+    # Nos empates vale o primeiro do catálogo
+    assert motor.cheapest_item() is next(item for item in itens if item["preco"] == menor)
+    assert motor.most_expensive_item() is next(item for item in itens if item["preco"] == maior)
+    faixa = motor.price_range()
+    assert (faixa["min_price"], faixa["max_price"], faixa["total_items"]) == (menor, maior, len(itens))
+    assert faixa["avg_price"] == round(sum(item["preco"] for item in itens) / len(itens), 2)
+
+
+@pytest.mark.parametrize("criar_motor", MOTORES[1:])
+def test_ranking_igual_ao_do_indice(criar_motor, itens):
+    colunas = extrair_colunas(itens)
+    referencia = CatalogIndex(itens, None, colunas)
+    motor = criar_motor(itens, None, colunas)
+    rng = random.Random(8)
+    for _ in range(100):
+        filtros = sortear_filtros(rng)
+        assert motor.rank(filtros, 15) == referencia.rank(filtros, 15), filtros
+
+
+@pytest.mark.skipif(np is None, reason="numpy não instalado")
+def test_colunar_le_os_textos_dos_itens(itens):
+    colunas = extrair_colunas(itens)
+    motor = ColumnarCatalog(itens, None, colunas)
+    # Os textos saem dos próprios itens, na mesma ordem das posições do índice
+    assert list(motor.textos_busca()) == list(CatalogIndex(itens, None, colunas).textos_busca())
+
+
+def test_particionado_filtra_por_rede(itens):
+    motor = _indice_particionado(itens, None, extrair_colunas(itens))
+    rng = random.Random(2)
+    for _ in range(100):
+        filtros = dict(sortear_filtros(rng), redes=rng.sample(REDES, rng.randint(1, 2)))
+        assert motor.search(filtros, 10) == busca_linear(itens, filtros, 10), filtros
+
+
+@pytest.mark.skipif(not catalogo_particionado.FORK_DISPONIVEL, reason="pool de busca exige fork")
+def test_particionado_sem_pool_conta_e_avisa_uma_vez(itens, monkeypatch, capsys):
+    monkeypatch.setattr(catalogo_particionado, "MINIMO_PARALELO", 1)
+    motor = ShardedCatalog(itens, None, extrair_colunas(itens), particoes=4, campo_rede="rede", processos=2)
+    filtros = {"incluir_tags": ["vegano"]}
+    antes = procura_catalogo.search_process_stats()
+    liberar = threading.Event()
+    # Como depois de uma recarga num processo com threads: o pool não pode nascer por fork
+    outra = threading.Thread(target=liberar.wait)
+    outra.start()
+    try:
+        for _ in range(3):
+            assert motor.search(filtros, 10) == busca_linear(itens, filtros, 10)
+    finally:
+        liberar.set()
+        outra.join()
+    depois = procura_catalogo.search_process_stats()
+    assert depois["buscas_sem_pool"] - antes["buscas_sem_pool"] == 3
+    assert capsys.readouterr().out.count("sem pool de processos") == 1
+
+    try:
+        assert motor.iniciar_processos()
+        assert motor.search(filtros, 10) == busca_linear(itens, filtros, 10)
+        assert procura_catalogo.search_process_stats()["buscas_pool"] == depois["buscas_pool"] + 1
+    finally:
+        motor.fechar()
+
+
+def test_search_catalog_igual_a_varredura_linear():
+    snapshot = procura_catalogo.repositorio.snapshot
+    itens = list(snapshot.itens)
+    rng = random.Random(3)
+    for _ in range(100):
+        filtros = sortear_filtros(rng)
+        esperado = busca_linear(itens, filtros, 10)
+        # A segunda chamada sai do cache de resultados
+        assert procura_catalogo.search_catalog(filtros, snapshot) == esperado, filtros
+        assert procura_catalogo.search_catalog(filtros, snapshot) == esperado, filtros
+
+
+def test_aproximados_descrevem_as_mesmas_violacoes_do_motor():
+    snapshot = procura_catalogo.repositorio.snapshot
+    rng = random.Random(4)
+    for _ in range(100):
+        filtros = sortear_filtros(rng)
+        ranqueados = snapshot.motor.rank(filtros, 10)
+        exatos = [item for item, violacoes in ranqueados if not violacoes]
+        # Com algum resultado exato, só eles; senão, os mais próximos com as violações
+        esperado = exatos or [dict(item, violacoes=violacoes) for item, violacoes in ranqueados]
+        assert procura_catalogo.search_catalog(filtros, snapshot, aproximados=True) == esperado, filtros
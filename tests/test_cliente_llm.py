@@ -0,0 +1,81 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from agent.agente_async import AsyncMealRecommendationAgent
+from agent.cliente_llm import ETAPA_DECISAO, HedgedClient, TempoEsgotadoLLM, criar_cliente_openai
+
+
+class ClienteLento:
+    """Backend assíncrono cujas requisições levam `latencias` (uma por chamada, a última se repete)."""
+
+    def __init__(self, *latencias: float):
+        self.latencias = list(latencias)
+        self.chamadas = 0
+        self.canceladas = 0
+        self.timeouts = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        latencia = self.latencias[min(self.chamadas, len(self.latencias) - 1)]
+        self.chamadas += 1
+        self.timeouts.append(kwargs.get("timeout"))
+        try:
+            await asyncio.sleep(latencia)
+        except asyncio.CancelledError:
+            self.canceladas += 1
+            raise
+        return f"resposta {self.chamadas}"
+
+
+def test_hedge_assincrono_fica_com_a_primeira_resposta():
+    llm = HedgedClient(None, timeouts={ETAPA_DECISAO: 5}, atrasos_hedge={ETAPA_DECISAO: 0.05}, taxa_hedge=1.0)
+    cliente = ClienteLento(1.0, 0.01)
+
+    async def chamar():
+        inicio = time.monotonic()
+        resposta = await llm.acriar(cliente, ETAPA_DECISAO, time.monotonic() + 5, model="m")
+        return resposta, time.monotonic() - inicio
+
+    resposta, duracao = asyncio.run(chamar())
+    assert resposta == "resposta 2" and duracao < 0.5
+    assert cliente.canceladas == 1
+    # Cada requisição leva o tempo que falta do prazo
+    assert all(0 < timeout <= 5 for timeout in cliente.timeouts)
+    estatisticas = llm.estatisticas()
+    assert estatisticas["hedges_decisao"] == 1 and estatisticas["hedges_vencedores"] == 1
+
+
+def test_prazo_da_etapa_inclui_as_novas_tentativas():
+    cliente = ClienteLento(10.0)
+    agente = AsyncMealRecommendationAgent(aclient=cliente, tentativas=5, backoff_base=0.01,
+                                          llm=HedgedClient(None, timeouts={ETAPA_DECISAO: 0.2}))
+
+    async def chamar():
+        inicio = time.monotonic()
+        with pytest.raises(TempoEsgotadoLLM):
+            await agente._chamar_llm(ETAPA_DECISAO, model="m")
+        return time.monotonic() - inicio
+
+    assert asyncio.run(chamar()) < 1.0
+    assert cliente.chamadas == 1 and cliente.canceladas == 1
+    assert agente.llm.estatisticas()["timeouts_decisao"] == 1
+
+
+def test_etapa_sem_prazo_usa_o_timeout_por_tentativa():
+    cliente = ClienteLento(10.0, 0.01)
+    agente = AsyncMealRecommendationAgent(aclient=cliente, timeout=0.1, tentativas=2, backoff_base=0.01,
+                                          llm=HedgedClient(None))
+    assert asyncio.run(agente._chamar_llm(ETAPA_DECISAO, model="m")) == "resposta 2"
+
+
+def test_cliente_openai_mantem_os_padroes_do_sdk():
+    pytest.importorskip("httpx")
+    from openai import DefaultHttpxClient
+
+    cliente = criar_cliente_openai("sk-teste", timeout=15, conexoes=7)
+    assert isinstance(cliente._client, DefaultHttpxClient)
+    assert cliente._client.follow_redirects
+    assert cliente._client._transport._pool._max_connections == 7
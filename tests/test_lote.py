@@ -0,0 +1,24 @@
+import json
+
+from agent.agente_offline import OfflineMealAgent
+from avaliar_lote import ids_concluidos, montar_registro
+
+
+def test_erro_sem_mensagem_registra_o_tipo(monkeypatch):
+    agente = OfflineMealAgent()
+
+    def falhar(*args, **kwargs):
+        raise KeyError()
+
+    monkeypatch.setattr(agente, "_preparar_turno", falhar)
+    turno = agente.chat_detalhado("pratos veganos")
+    assert turno["erro"] == "KeyError"
+    assert montar_registro("1", "pratos veganos", turno)["erro"] == "KeyError"
+
+
+def test_retomar_refaz_qualquer_erro(tmp_path):
+    saida = tmp_path / "resultados.jsonl"
+    registros = [{"id": "ok"}, {"id": "nulo", "erro": None}, {"id": "vazio", "erro": ""},
+                 {"id": "falhou", "erro": "TimeoutError"}]
+    saida.write_text("".join(json.dumps(registro) + "\n" for registro in registros) + '{"id": "trunc', encoding="utf-8")
+    assert ids_concluidos(str(saida)) == {"ok", "nulo"}
@@ -0,0 +1,44 @@
+from agent.agente_offline import OfflineMealAgent
+from agent.parser_intencao import TagsCatalogo, interpretar_mensagem, interpretar_refinamento
+
+TAGS = ["caseiro", "da casa", "fit", "fitness", "picante", "sem gluten", "sem lactose", "vegano"]
+
+
+def params(mensagem: str, tags) -> dict:
+    return interpretar_mensagem(mensagem, tags)[0]["search_params"]
+
+
+def test_lista_e_tags_catalogo_interpretam_igual():
+    tags = TagsCatalogo(TAGS)
+    for mensagem in ["quero pratos veganos até 30 reais", "algo caseiro e sem lactose", "nada picante, só fit",
+                     "o prato da casa mais barato", "comida saudável"]:
+        assert interpretar_mensagem(mensagem, TAGS) == interpretar_mensagem(mensagem, tags), mensagem
+
+
+def test_tag_mais_longa_vence_o_prefixo():
+    assert params("pratos fitness", TAGS)["incluir_tags"] == ["fitness"]
+    assert params("pratos fit", TAGS)["incluir_tags"] == ["fit"]
+
+
+def test_tag_com_acento_e_flexao():
+    tags = TagsCatalogo(["sem açucar", "caseiro"])
+    assert params("doces caseiros sem açúcar", tags)["incluir_tags"] == ["sem açucar", "caseiro"]
+
+
+def test_pertinencia_usa_o_conjunto():
+    tags = TagsCatalogo(TAGS)
+    assert "vegano" in tags and "carne" not in tags
+    assert list(tags) == TAGS
+
+
+def test_refinamento_usa_as_tags_do_catalogo():
+    refinamento, _ = interpretar_refinamento("e os caseiros?", TagsCatalogo(TAGS))
+    assert refinamento["search_params"]["incluir_tags"] == ["caseiro"]
+
+
+def test_agente_constroi_as_tags_uma_vez_por_versao():
+    agente = OfflineMealAgent()
+    tags = agente.tags_disponiveis
+    assert isinstance(tags, TagsCatalogo)
+    agente.chat("pratos veganos")
+    assert agente.tags_disponiveis is tags
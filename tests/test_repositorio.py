@@ -0,0 +1,61 @@
+import json
+import os
+import time
+
+import pytest
+
+from agent.tools.indice_catalogo import CatalogIndex
+from agent.tools.repositorio_catalogo import CatalogStore
+
+PRATOS = [
+    {"nome": "Salada", "preco": 20.0, "descricao": "Folhas e tomate.", "tags": ["vegano"]},
+    {"nome": "Frango grelhado", "preco": 35.0, "descricao": "Com arroz integral.", "tags": ["sem lactose"]},
+]
+
+
+def gravar(caminho, itens: list, mtime: int):
+    with open(caminho, "w", encoding="utf-8") as file:
+        json.dump(itens, file, ensure_ascii=False)
+    # Garante uma assinatura (mtime, tamanho) diferente a cada gravação
+    os.utime(caminho, ns=(mtime * 10 ** 9, mtime * 10 ** 9))
+
+
+@pytest.fixture
+def caminho(tmp_path):
+    caminho = tmp_path / "catalogo.json"
+    gravar(caminho, PRATOS, 1)
+    return caminho
+
+
+@pytest.mark.parametrize("defeito", [{"preco": None}, {"preco": "barato"}, {"tags": None}],
+                         ids=["preco-nulo", "preco-texto", "tags-nulas"])
+def test_item_malformado_mantem_a_versao_atual(caminho, defeito):
+    repositorio = CatalogStore(str(caminho), CatalogIndex)
+    assert repositorio.versao == 1
+
+    gravar(caminho, [dict(PRATOS[0], **defeito), PRATOS[1]], 2)
+    assert not repositorio.reload()
+    assert repositorio.versao == 1
+    assert len(repositorio.snapshot.motor) == 2
+
+    # Um arquivo válido depois do defeituoso é publicado normalmente
+    gravar(caminho, PRATOS + [dict(PRATOS[0], nome="Salada grande", preco=25.0)], 3)
+    assert repositorio.reload()
+    assert repositorio.versao == 2
+    assert len(repositorio.snapshot.motor) == 3
+
+
+def test_observador_sobrevive_a_recarga_com_erro(caminho):
+    repositorio = CatalogStore(str(caminho), CatalogIndex)
+    repositorio.observar(0.01)
+    try:
+        gravar(caminho, [dict(PRATOS[0], preco=None)], 2)
+        time.sleep(0.1)
+        assert repositorio._observador.is_alive()
+        gravar(caminho, PRATOS[:1], 3)
+        limite = time.monotonic() + 5
+        while repositorio.versao == 1 and time.monotonic() < limite:
+            time.sleep(0.01)
+        assert repositorio.versao == 2
+    finally:
+        repositorio.parar_observacao()
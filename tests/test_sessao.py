@@ -0,0 +1,65 @@
+import pytest
+
+from agent.agente_offline import OfflineMealAgent
+from agent.sessao import combinar_filtros
+from agent.tools.procura_catalogo import search_catalog
+
+
+@pytest.fixture
+def agente():
+    return OfflineMealAgent()
+
+
+def conversar(agente, mensagens: list, sessao_id: str = "s1") -> list:
+    return [agente.chat_detalhado(mensagem, sessao_id=sessao_id) for mensagem in mensagens]
+
+
+def resultados(turno: dict) -> list:
+    return turno["function_result"]["results"]
+
+
+def test_refinamento_por_tag_sai_da_sessao(agente):
+    _, turno = conversar(agente, ["pratos veganos", "agora só os sem lactose"])
+    assert turno["origem_decisao"] == "sessao"
+    assert resultados(turno) == search_catalog({"incluir_tags": ["vegano", "sem lactose"]})
+
+
+def test_orcamento_menor_filtra_os_guardados(agente):
+    _, turno = conversar(agente, ["quero pratos até 40 reais", "e até 30 reais?"])
+    assert turno["origem_decisao"] == "sessao"
+    assert turno["search_params"]["budget"] == 30
+    assert resultados(turno) == search_catalog({"budget": 30})
+
+
+def test_orcamento_maior_volta_ao_catalogo(agente):
+    primeiro, turno = conversar(agente, ["quero pratos até 30 reais", "e até 40 reais?"])
+    assert turno["search_params"]["budget"] == 40
+    assert resultados(turno) == search_catalog({"budget": 40})
+    # Aparecem pratos que não estavam no resultado anterior
+    assert max(item["preco"] for item in resultados(turno)) > 30
+    assert len(resultados(turno)) > len(resultados(primeiro))
+
+
+def test_orcamento_maior_mantem_as_tags(agente):
+    _, _, turno = conversar(agente, ["pratos veganos", "e até 30 reais?", "e até 45 reais?"])
+    assert resultados(turno) == search_catalog({"incluir_tags": ["vegano"], "budget": 45})
+
+
+def test_mensagem_nova_nao_e_refinamento(agente):
+    _, turno = conversar(agente, ["quero pratos até 30 reais", "quero apenas pratos veganos"])
+    assert turno["origem_decisao"] != "sessao"
+    assert resultados(turno) == search_catalog({"incluir_tags": ["vegano"]})
+
+
+def test_sessoes_sao_independentes(agente):
+    conversar(agente, ["pratos veganos"], sessao_id="a")
+    conversar(agente, ["quero pratos até 30 reais"], sessao_id="b")
+    turno = agente.chat_detalhado("agora só os sem lactose", sessao_id="a")
+    assert resultados(turno) == search_catalog({"incluir_tags": ["vegano", "sem lactose"]})
+
+
+def test_combinar_filtros_usa_o_orcamento_mais_recente():
+    filtros, extras = combinar_filtros([{"budget": 30, "incluir_tags": ["vegano"]}, {"budget": 40},
+                                        {"incluir_tags": ["picante"]}])
+    assert filtros == {"budget": 40, "incluir_tags": ["vegano", "picante"]}
+    assert extras == []